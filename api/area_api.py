@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime
+from typing import List, Optional, Union
+from datetime import datetime, timedelta
 
 from database.database import get_db
-from database.models import Area, AreaType, AreaShape
+from database.models import Area, AreaType, AreaShape, GeofenceEvent, GeofenceEventType, Vehicle
 from api.schemas import (
     AreaCreate, AreaUpdate, AreaResponse, 
-    APIResponse, PaginatedResponse
+    APIResponse, PaginatedResponse, GeofenceEventResponse,
+    AreaOccupantResponse, ChangesResponse
 )
+from config.settings import settings
+from services.geofence import geofence_engine, bump_area_version, get_version, AREAS_VERSION_KEY
+from services.area_membership import area_membership
+from api.gps_api import build_geofence_event_response
+from api.sync import time_cursor, changed_after, make_etag, is_not_modified, not_modified, set_etag
 
 router = APIRouter(prefix="/api/areas", tags=["Areas"])
 
@@ -34,12 +40,17 @@ async def create_area(
             area_type=area_data.area_type,
             shape=area_data.shape,
             coordinates=area_data.coordinates,
-            buffer_distance=area_data.buffer_distance or 0.0,
+            buffer_distance=(
+                settings.default_area_buffer if area_data.buffer_distance is None
+                else area_data.buffer_distance
+            ),
             is_active=True
         )
         
         db.add(area)
+        bump_area_version(db)
         db.commit()
+        geofence_engine.invalidate()
         db.refresh(area)
         
         return AreaResponse(
@@ -63,17 +74,22 @@ async def create_area(
             detail=f"Error creating area: {str(e)}"
         )
 
-@router.get("/", response_model=PaginatedResponse)
+@router.get("/", response_model=Union[PaginatedResponse, ChangesResponse])
 async def get_areas(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     area_type: Optional[AreaType] = None,
     shape: Optional[AreaShape] = None,
     is_active: Optional[bool] = None,
     page: int = 1,
-    size: int = 50
+    size: int = 50,
+    since: Optional[int] = Query(None, ge=0, description="Change cursor from a previous response")
 ):
     """
-    Get list of areas with optional filtering
+    Get list of areas with optional filtering. With a change cursor only the
+    areas changed since then are returned, with the ids of all areas that
+    still exist so deleted ones can be dropped.
     """
     try:
         # Build query
@@ -88,6 +104,24 @@ async def get_areas(
         if is_active is not None:
             query = query.filter(Area.is_active == is_active)
         
+        if since is not None:
+            cursor = time_cursor()
+            areas = query.filter(Area.updated_at >= changed_after(since)).order_by(Area.id).all()
+            return ChangesResponse(
+                cursor=cursor,
+                items=[build_area_response(area) for area in areas],
+                ids=[area_id for area_id, in query.with_entities(Area.id).order_by(Area.id)]
+            )
+        
+        # Every area change bumps the version, so it identifies the list contents
+        etag = make_etag(
+            "areas", get_version(db, AREAS_VERSION_KEY),
+            area_type, shape, is_active, page, size
+        )
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+        
         # Get total count
         total = query.count()
         
@@ -96,23 +130,8 @@ async def get_areas(
             (page - 1) * size
         ).limit(size).all()
         
-        # Convert to response format
-        items = []
-        for area in areas:
-            items.append(AreaResponse(
-                id=area.id,
-                name=area.name,
-                area_type=area.area_type,
-                shape=area.shape,
-                coordinates=area.coordinates,
-                buffer_distance=area.buffer_distance,
-                is_active=area.is_active,
-                created_at=area.created_at,
-                updated_at=area.updated_at
-            ))
-        
         return PaginatedResponse(
-            items=items,
+            items=[build_area_response(area) for area in areas],
             total=total,
             page=page,
             size=size,
@@ -162,6 +181,106 @@ async def get_area(
             detail=f"Error retrieving area: {str(e)}"
         )
 
+@router.get("/{area_id}/events", response_model=List[GeofenceEventResponse])
+async def get_area_events(
+    area_id: int,
+    db: Session = Depends(get_db),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    event_type: Optional[GeofenceEventType] = None,
+    limit: int = 100
+):
+    """
+    Get the enter/exit/dwell timeline for a specific area
+    """
+    try:
+        area = db.query(Area.id).filter(Area.id == area_id).first()
+        
+        if not area:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Area {area_id} not found"
+            )
+        
+        query = db.query(GeofenceEvent).filter(GeofenceEvent.area_id == area_id)
+        
+        if start_date:
+            query = query.filter(GeofenceEvent.timestamp >= start_date)
+        if end_date:
+            query = query.filter(GeofenceEvent.timestamp <= end_date)
+        if event_type:
+            query = query.filter(GeofenceEvent.event_type == event_type)
+        
+        events = query.order_by(GeofenceEvent.timestamp.desc(), GeofenceEvent.id.desc()).limit(limit).all()
+        
+        return [build_geofence_event_response(event) for event in events]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error retrieving area events: {str(e)}"
+        )
+
+@router.get("/{area_id}/vehicles", response_model=List[AreaOccupantResponse])
+async def get_area_vehicles(
+    area_id: int,
+    db: Session = Depends(get_db),
+    max_age_minutes: Optional[int] = None
+):
+    """
+    Get vehicles currently inside an area, optionally only those reporting recently
+    """
+    try:
+        geofence_engine.ensure_fresh(db)
+        if area_id not in geofence_engine.by_id:
+            if not db.query(Area.id).filter(Area.id == area_id).first():
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Area {area_id} not found"
+                )
+            # Inactive areas are not tracked, so nothing is inside them
+            return []
+        
+        since = datetime.utcnow() - timedelta(minutes=max_age_minutes) if max_age_minutes else None
+        occupants = area_membership.occupants(db, area_id, since=since)
+        if not occupants:
+            return []
+        
+        vehicles = {
+            vehicle.id: vehicle
+            for vehicle in db.query(Vehicle).filter(
+                Vehicle.id.in_([occupant.vehicle_id for occupant in occupants])
+            ).all()
+        }
+        
+        now = datetime.utcnow()
+        items = []
+        for occupant in sorted(occupants, key=lambda occupant: occupant.entered_at):
+            vehicle = vehicles.get(occupant.vehicle_id)
+            if vehicle is None:
+                continue
+            items.append(AreaOccupantResponse(
+                vehicle_id=vehicle.vehicle_id,
+                license_plate=vehicle.license_plate,
+                vehicle_type=vehicle.vehicle_type,
+                status=vehicle.status,
+                entered_at=occupant.entered_at,
+                dwell_seconds=max(int(((occupant.last_seen or now) - occupant.entered_at).total_seconds()), 0),
+                last_seen=occupant.last_seen
+            ))
+        
+        return items
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error retrieving area vehicles: {str(e)}"
+        )
+
 @router.put("/{area_id}", response_model=AreaResponse)
 async def update_area(
     area_id: int,
@@ -204,7 +323,9 @@ async def update_area(
         
         area.updated_at = datetime.utcnow()
         
+        bump_area_version(db)
         db.commit()
+        geofence_engine.invalidate()
         db.refresh(area)
         
         return AreaResponse(
@@ -246,7 +367,9 @@ async def delete_area(
             )
         
         db.delete(area)
+        bump_area_version(db)
         db.commit()
+        geofence_engine.invalidate()
         
         return APIResponse(
             success=True,
@@ -301,6 +424,19 @@ async def get_areas_by_type(
             detail=f"Error retrieving areas by type: {str(e)}"
         )
 
+def build_area_response(area: Area) -> AreaResponse:
+    return AreaResponse(
+        id=area.id,
+        name=area.name,
+        area_type=area.area_type,
+        shape=area.shape,
+        coordinates=area.coordinates,
+        buffer_distance=area.buffer_distance,
+        is_active=area.is_active,
+        created_at=area.created_at,
+        updated_at=area.updated_at
+    )
+
 def validate_coordinates(coordinates: dict, shape: AreaShape) -> bool:
     """
     Validate coordinates based on area shape
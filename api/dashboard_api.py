@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import datetime, timedelta
+import asyncio
+import json
 
 from database.database import get_db
 from database.models import (
@@ -10,19 +13,44 @@ from database.models import (
     VehicleType, VehicleStatus, AreaType
 )
 from api.schemas import (
-    DashboardStats, VehicleLocation, APIResponse
+    DashboardStats, VehicleLocation, VehicleMapView, VehicleClusterResponse,
+    ChangesResponse, APIResponse
 )
+from services.geofence import geofence_engine, get_version, CompiledArea
+from services.area_membership import area_membership
+from services.position_store import position_store, VEHICLES_VERSION_KEY
+from services.alert_bus import alert_bus
+from services.live_feed import in_bbox
+from services.map_clusters import cluster_positions, parse_bbox_param
+from config.settings import settings
+from api.gps_api import build_vehicle_location
+from api.sync import time_cursor, changed_after, make_etag, is_not_modified, not_modified, set_etag
 
 router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
 
 @router.get("/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """
-    Get dashboard statistics
+    Get dashboard statistics; answers 304 when the If-None-Match ETag still matches
     """
     try:
+        # Every input moves one of these counters or falls in a new minute,
+        # so a matching client is answered before any statistics query runs
+        geofence_engine.ensure_fresh(db)
+        position_store.ensure_fresh(db)
+        etag = make_etag(
+            get_version(db, VEHICLES_VERSION_KEY),
+            geofence_engine.version,
+            position_store.revision,
+            datetime.utcnow().replace(second=0, microsecond=0)
+        )
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+        
         # Get vehicle counts by status
         vehicle_counts = db.query(
             Vehicle.status,
@@ -59,23 +87,15 @@ async def get_dashboard_stats(
         
         average_speed = float(avg_speed_result) if avg_speed_result else 0.0
         
-        # Get vehicles in checkpoint areas
-        checkpoint_areas = db.query(Area).filter(
-            Area.area_type == AreaType.CHECKPOINT,
-            Area.is_active == True
-        ).all()
-        
-        vehicles_in_checkpoint = 0
-        for area in checkpoint_areas:
-            # Get latest GPS logs for each vehicle
-            latest_logs = db.query(GPSLog).join(Vehicle).filter(
-                GPSLog.timestamp >= datetime.utcnow() - timedelta(minutes=5)
-            ).all()
-            
-            for log in latest_logs:
-                if is_point_in_area(log.latitude, log.longitude, area.coordinates, area.shape):
-                    vehicles_in_checkpoint += 1
-                    break
+        # Get vehicles in checkpoint areas from the live occupancy index
+        checkpoint_area_ids = [
+            area.id for area in geofence_engine.areas
+            if area.area_type == AreaType.CHECKPOINT
+        ]
+        
+        vehicles_in_checkpoint = len(area_membership.vehicles_in(
+            db, checkpoint_area_ids, since=datetime.utcnow() - timedelta(minutes=5)
+        ))
         
         # Get vehicles delivered (completed routes in last 24 hours)
         delivered_vehicles = db.query(Route).filter(
@@ -86,7 +106,7 @@ async def get_dashboard_stats(
         # Get vehicles loading (in checkpoint areas)
         vehicles_loading = vehicles_in_checkpoint
         
-        return DashboardStats(
+        stats = DashboardStats(
             total_vehicles=total_vehicles,
             active_vehicles=active_vehicles,
             inactive_vehicles=inactive_vehicles,
@@ -98,67 +118,107 @@ async def get_dashboard_stats(
             vehicles_loading=vehicles_loading
         )
         
+        set_etag(response, etag)
+        return stats
+        
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error retrieving dashboard stats: {str(e)}"
         )
 
-@router.get("/vehicle-locations", response_model=List[VehicleLocation])
+@router.get("/vehicle-locations", response_model=Union[VehicleMapView, ChangesResponse, List[VehicleLocation]])
 async def get_vehicle_locations(
     db: Session = Depends(get_db),
     vehicle_type: Optional[VehicleType] = None,
-    status: Optional[VehicleStatus] = None
+    status: Optional[VehicleStatus] = None,
+    bbox: Optional[str] = Query(None, description="Viewport as south,west,north,east"),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Map zoom; enables clustering"),
+    since: Optional[int] = Query(None, ge=0, description="Change cursor from a previous response")
 ):
     """
-    Get current vehicle locations for map display
+    Get current vehicle locations for map display. With a zoom level the
+    response is a map view, clustered when zoomed out over many vehicles.
+    With a change cursor only the vehicles whose position or details changed
+    since then are returned, unclustered, with the ids of vehicles deleted,
+    aged out of the map window or no longer matching the filters.
     """
     try:
-        # Build query for latest GPS logs
-        query = db.query(GPSLog).join(Vehicle).filter(
-            GPSLog.timestamp >= datetime.utcnow() - timedelta(hours=24)
-        )
-        
-        if vehicle_type:
-            query = query.filter(Vehicle.vehicle_type == vehicle_type)
+        try:
+            viewport = parse_bbox_param(bbox)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid bbox: {str(e)}")
+        
+        cursor = time_cursor()
+        
+        def shown(position) -> bool:
+            return (
+                (vehicle_type is None or position.vehicle_type == vehicle_type)
+                and (status is None or position.status == status)
+                and (viewport is None or in_bbox(viewport, position))
+            )
         
-        if status:
-            query = query.filter(Vehicle.status == status)
+        if since is not None:
+            after = changed_after(since)
+            changed = position_store.positions(db, changed_after=after)
+            removed = {position.vehicle_id for position in changed if not shown(position)}
+            removed.update(position_store.removed_since(after))
+            return ChangesResponse(
+                cursor=cursor,
+                items=[build_vehicle_location(position) for position in changed if shown(position)],
+                removed=sorted(removed)
+            )
         
-        # Get latest log for each vehicle
-        latest_logs = query.order_by(
-            Vehicle.id, GPSLog.timestamp.desc()
-        ).distinct(Vehicle.id).all()
+        # Served from the in-memory latest-position store, one entry per vehicle
+        positions = [position for position in position_store.positions(db) if shown(position)]
         
-        locations = []
-        for log in latest_logs:
-            locations.append(VehicleLocation(
-                vehicle_id=log.vehicle.vehicle_id,
-                latitude=log.latitude,
-                longitude=log.longitude,
-                speed=log.speed,
-                heading=log.heading,
-                timestamp=log.timestamp,
-                status=log.vehicle.status,
-                is_idle=log.is_idle
-            ))
+        if zoom is None:
+            return [build_vehicle_location(position) for position in positions]
         
-        return locations
+        clustered = (
+            zoom <= settings.vehicle_cluster_max_zoom
+            and len(positions) > settings.vehicle_cluster_min_vehicles
+        )
+        clusters = []
+        vehicles = positions
+        if clustered:
+            vehicles, clusters = cluster_positions(positions, zoom, settings.vehicle_cluster_cell_pixels)
+        
+        return VehicleMapView(
+            zoom=zoom,
+            clustered=clustered,
+            total=len(positions),
+            vehicles=[build_vehicle_location(position) for position in vehicles],
+            clusters=[
+                VehicleClusterResponse(
+                    latitude=cluster.latitude,
+                    longitude=cluster.longitude,
+                    count=cluster.count,
+                    statuses=cluster.statuses,
+                    bounds=list(cluster.bounds)
+                )
+                for cluster in clusters
+            ]
+        )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error retrieving vehicle locations: {str(e)}"
         )
 
-@router.get("/alerts", response_model=List[dict])
+@router.get("/alerts", response_model=Union[ChangesResponse, List[dict]])
 async def get_recent_alerts(
     db: Session = Depends(get_db),
     limit: int = 50,
-    resolved: Optional[bool] = None
+    resolved: Optional[bool] = None,
+    since: Optional[int] = Query(None, ge=0, description="Change cursor (alert id) from a previous response")
 ):
     """
-    Get recent alerts
+    Get recent alerts. With a change cursor the alerts created after it are
+    returned oldest first, up to limit; poll again with the new cursor for more.
     """
     try:
         query = db.query(Alert).join(Vehicle)
@@ -166,7 +226,11 @@ async def get_recent_alerts(
         if resolved is not None:
             query = query.filter(Alert.is_resolved == resolved)
         
-        alerts = query.order_by(Alert.created_at.desc()).limit(limit).all()
+        if since is not None:
+            # Alerts are immutable once created, so the id is the change cursor
+            alerts = query.filter(Alert.id > since).order_by(Alert.id).limit(limit).all()
+        else:
+            alerts = query.order_by(Alert.created_at.desc()).limit(limit).all()
         
         alert_list = []
         for alert in alerts:
@@ -183,6 +247,8 @@ async def get_recent_alerts(
                 "resolved_at": alert.resolved_at
             })
         
+        if since is not None:
+            return ChangesResponse(cursor=alerts[-1].id if alerts else since, items=alert_list)
         return alert_list
         
     except Exception as e:
@@ -191,6 +257,69 @@ async def get_recent_alerts(
             detail=f"Error retrieving alerts: {str(e)}"
         )
 
+@router.get("/alerts/stream")
+async def stream_alerts(
+    request: Request,
+    last_event_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Stream new alerts as Server-Sent Events; reconnecting clients resume after Last-Event-ID
+    """
+    header = request.headers.get("last-event-id")
+    if header:
+        try:
+            last_event_id = int(header)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid Last-Event-ID: {header}")
+    
+    # Subscribe before reading the backlog so nothing published in between is lost
+    subscription = alert_bus.subscribe()
+    try:
+        backlog = alert_bus.since(last_event_id, db) if last_event_id is not None else []
+    except Exception as e:
+        alert_bus.unsubscribe(subscription)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving alerts: {str(e)}"
+        )
+    finally:
+        db.close()
+    
+    async def events():
+        sent = {alert["id"] for alert in backlog}
+        try:
+            yield "retry: 3000\n\n"
+            for alert in backlog:
+                yield format_alert_event(alert)
+            
+            while not subscription.overflowed:
+                try:
+                    alert = await asyncio.wait_for(
+                        subscription.queue.get(), timeout=settings.alert_stream_heartbeat
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                
+                # The backlog may already have covered alerts queued meanwhile
+                if alert["id"] in sent:
+                    continue
+                yield format_alert_event(alert)
+        finally:
+            alert_bus.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def format_alert_event(alert: dict) -> str:
+    return f"id: {alert['id']}\nevent: alert\ndata: {json.dumps(alert)}\n\n"
+
 @router.get("/vehicle-types-stats", response_model=dict)
 async def get_vehicle_types_stats(
     db: Session = Depends(get_db)
@@ -263,26 +392,14 @@ async def get_area_stats(
         recent_time = datetime.utcnow() - timedelta(minutes=5)
         vehicles_in_areas = {}
         
+        geofence_engine.ensure_fresh(db)
+        
         for area_type, count in area_counts:
-            areas = db.query(Area).filter(
-                Area.area_type == area_type,
-                Area.is_active == True
-            ).all()
-            
-            vehicles_in_area = 0
-            for area in areas:
-                latest_logs = db.query(GPSLog).join(Vehicle).filter(
-                    GPSLog.timestamp >= recent_time
-                ).all()
-                
-                for log in latest_logs:
-                    if is_point_in_area(log.latitude, log.longitude, area.coordinates, area.shape):
-                        vehicles_in_area += 1
-                        break
+            area_ids = [area.id for area in geofence_engine.areas if area.area_type == area_type]
             
             vehicles_in_areas[area_type.value] = {
                 "total_areas": count,
-                "vehicles_inside": vehicles_in_area
+                "vehicles_inside": len(area_membership.vehicles_in(db, area_ids, since=recent_time))
             }
         
         return vehicles_in_areas
@@ -295,33 +412,9 @@ async def get_area_stats(
 
 def is_point_in_area(lat: float, lon: float, coordinates: dict, shape: str) -> bool:
     """
-    Check if a point is inside an area (simplified implementation)
+    Check if a point is inside an area
     """
     try:
-        if shape == "circle":
-            center_lat = coordinates.get("center", {}).get("lat", 0)
-            center_lon = coordinates.get("center", {}).get("lng", 0)
-            radius = coordinates.get("radius", 0)
-            
-            # Calculate distance (simplified)
-            distance = ((lat - center_lat) ** 2 + (lon - center_lon) ** 2) ** 0.5
-            return distance <= radius
-        
-        elif shape == "polygon":
-            # Implement polygon point-in-polygon algorithm
-            # For now, return False
-            return False
-        
-        elif shape == "rectangle":
-            bounds = coordinates.get("bounds", {})
-            min_lat = bounds.get("south", 0)
-            max_lat = bounds.get("north", 0)
-            min_lon = bounds.get("west", 0)
-            max_lon = bounds.get("east", 0)
-            
-            return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
-        
-        return False
-        
+        return CompiledArea(0, "", None, shape, coordinates).contains(lat, lon)
     except Exception:
         return False
@@ -1,19 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import false, insert, or_
+from typing import List, Optional, Tuple, Union
 from datetime import datetime, timedelta
+import base64
+import heapq
 import logging
 
-from database.database import get_db
-from database.models import GPSLog, Vehicle, Area, Alert
+import numpy as np
+
+from database.database import get_db, SessionLocal
+from database.models import (
+    GPSLog, Vehicle, Alert, AreaType, GeofenceEvent, GeofenceEventType,
+    VehicleType, VehicleStatus
+)
 from api.schemas import (
     GPSData, GPSDataResponse, APIResponse, 
-    VehicleLocation, PaginatedResponse
+    VehicleLocation, PaginatedResponse,
+    GPSBatchItemResult, GPSBatchResponse, GeofenceEventResponse,
+    CountMode, CursorPaginatedResponse, GPSRollupResponse, HistoryResolution,
+    HistoryFormat, TrackPoint, TrackResponse, ExportFormat
 )
 from config.settings import settings
+from services.ingest_buffer import IngestBuffer, IngestBufferFull, IngestBufferClosed
+from services.vehicle_cache import vehicle_registry
+from services.live_state import live_state, as_naive_utc, IdleUpdate
+from services.geofence import geofence_engine, CompiledArea
+from services.area_membership import area_membership
+from services.position_store import position_store, upsert_last_positions
+from services.live_feed import live_feed
+from services.alert_bus import alert_bus, build_alert_payloads
+from services.partitions import gps_log_partitioner
+from services.export import iter_gps_rows, ndjson_lines, csv_lines, chunked, gzipped
+from services import columnar_export
+from services.archive import gps_archive
+from services.track_store import track_store
+from services.simplify import (
+    douglas_peucker, encode_polyline, project, stop_boundaries, visvalingam_whyatt
+)
+from services.rollups import (
+    gps_rollup_job, RollupLevel, LEVELS_BY_NAME, bucket_start, choose_level, raw_history_start,
+    rolled_up_until, summarize_range
+)
 
 router = APIRouter(prefix="/api/gps", tags=["GPS"])
 
+# Track formats without a start_date cover this much time before end_date
+TRACK_DEFAULT_RANGE = timedelta(days=1)
+# Past raw retention, track formats draw rollups giving up to this many times max_points buckets
+TRACK_SOURCE_FACTOR = 10
+
 @router.post("/data", response_model=APIResponse)
 async def receive_gps_data(
     gps_data: GPSData,
@@ -24,29 +61,28 @@ async def receive_gps_data(
     """
     try:
         # Find vehicle by vehicle_id
-        vehicle = db.query(Vehicle).filter(Vehicle.vehicle_id == gps_data.vehicle_id).first()
+        vehicle = vehicle_registry.get(db, gps_data.vehicle_id)
         if not vehicle:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Vehicle {gps_data.vehicle_id} not found"
             )
         
-        # Check if vehicle is idle
-        is_idle = False
-        idle_duration = 0
+        # Idle time is measured from real timestamps held in the live state;
+        # a queued fix is committed by the flusher later, so its state applies at once
+        idle = live_state.update(db, vehicle.id, gps_data, defer=not ingest_buffer.running)
+        is_idle, idle_duration = idle.is_idle, idle.idle_duration
         
-        if gps_data.speed and gps_data.speed < 1.0:  # Less than 1 km/h
-            # Get last GPS log to check idle duration
-            last_log = db.query(GPSLog).filter(
-                GPSLog.vehicle_id == vehicle.id
-            ).order_by(GPSLog.timestamp.desc()).first()
-            
-            if last_log and last_log.is_idle:
-                idle_duration = last_log.idle_duration + settings.gps_update_interval
-            else:
-                idle_duration = settings.gps_update_interval
+        if ingest_buffer.running:
+            # Write-behind mode: the background flusher persists and checks alerts
+            await ingest_buffer.submit(build_gps_row(vehicle.id, gps_data, idle))
+            position_store.update(vehicle, gps_data, is_idle)
             
-            is_idle = idle_duration >= settings.gps_idle_timeout
+            return APIResponse(
+                success=True,
+                message="GPS data queued successfully",
+                data={"queued": True, "durability": ingest_buffer.durability}
+            )
         
         # Create GPS log entry
         gps_log = GPSLog(
@@ -63,14 +99,18 @@ async def receive_gps_data(
         )
         
         db.add(gps_log)
+        upsert_last_positions(db, [build_gps_row(vehicle.id, gps_data, idle)])
         db.commit()
         db.refresh(gps_log)
+        position_store.update(vehicle, gps_data, is_idle)
         
         # Check for area violations
-        await check_area_violations(vehicle.id, gps_data.latitude, gps_data.longitude, db)
+        await check_area_violations(
+            vehicle.id, gps_data.latitude, gps_data.longitude, db, timestamp=gps_data.timestamp
+        )
         
         # Check for idle alerts
-        if is_idle and idle_duration == settings.gps_idle_timeout:
+        if idle.alert_due:
             await create_idle_alert(vehicle.id, gps_data.latitude, gps_data.longitude, db)
         
         logging.info(f"GPS data received for vehicle {gps_data.vehicle_id}")
@@ -81,6 +121,14 @@ async def receive_gps_data(
             data={"log_id": gps_log.id}
         )
         
+    except HTTPException:
+        raise
+    except (IngestBufferFull, IngestBufferClosed) as e:
+        logging.warning(f"GPS data rejected by write-behind buffer: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         logging.error(f"Error receiving GPS data: {e}")
         db.rollback()
@@ -89,34 +137,107 @@ async def receive_gps_data(
             detail=f"Error processing GPS data: {str(e)}"
         )
 
+@router.post("/batch", response_model=GPSBatchResponse)
+async def receive_gps_batch(
+    fixes: List[GPSData],
+    db: Session = Depends(get_db)
+):
+    """
+    Receive a batch of buffered GPS fixes, possibly for many vehicles
+    """
+    if len(fixes) > settings.gps_batch_max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch contains {len(fixes)} fixes, maximum is {settings.gps_batch_max_size}"
+        )
+    
+    try:
+        # Resolve every vehicle referenced by the batch, querying only cache misses
+        vehicle_map = vehicle_registry.get_many(db, (fix.vehicle_id for fix in fixes))
+        
+        results = []
+        accepted = []
+        for index, fix in enumerate(fixes):
+            vehicle = vehicle_map.get(fix.vehicle_id)
+            if vehicle is None:
+                results.append(GPSBatchItemResult(
+                    index=index,
+                    vehicle_id=fix.vehicle_id,
+                    success=False,
+                    error=f"Vehicle {fix.vehicle_id} not found"
+                ))
+                continue
+            
+            results.append(GPSBatchItemResult(
+                index=index,
+                vehicle_id=fix.vehicle_id,
+                success=True
+            ))
+            accepted.append((vehicle.id, fix))
+        
+        # Replay fixes in time order per vehicle so idle state chains correctly
+        accepted.sort(key=lambda item: (item[0], as_naive_utc(item[1].timestamp)))
+        live_state.load_many(db, {vehicle_pk for vehicle_pk, _ in accepted})
+        
+        rows = []
+        for vehicle_pk, fix in accepted:
+            idle = live_state.update(db, vehicle_pk, fix)
+            rows.append(build_gps_row(vehicle_pk, fix, idle))
+        
+        payloads = build_alert_payloads(db, persist_gps_rows(rows, db))
+        db.commit()
+        alert_bus.publish(payloads)
+        
+        for (vehicle_pk, fix), row in zip(accepted, rows):
+            position_store.update(vehicle_map[fix.vehicle_id], fix, row["is_idle"])
+        
+        logging.info(f"GPS batch received: {len(rows)} accepted, {len(fixes) - len(rows)} rejected")
+        
+        return GPSBatchResponse(
+            accepted=len(rows),
+            rejected=len(fixes) - len(rows),
+            results=results
+        )
+        
+    except Exception as e:
+        logging.error(f"Error receiving GPS batch: {e}")
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing GPS batch: {str(e)}"
+        )
+
+@router.get("/ingest/metrics", response_model=dict)
+async def get_ingest_metrics():
+    """
+    Get write-behind ingest queue depth and flush statistics
+    """
+    metrics = ingest_buffer.metrics()
+    metrics["vehicle_cache"] = vehicle_registry.stats()
+    metrics["geofence"] = geofence_engine.stats()
+    metrics["area_membership"] = area_membership.stats()
+    metrics["latest_positions"] = position_store.stats()
+    metrics["live_feed"] = live_feed.stats()
+    metrics["alert_stream"] = alert_bus.stats()
+    metrics["gps_log_partitions"] = gps_log_partitioner.stats()
+    metrics["gps_rollups"] = gps_rollup_job.stats()
+    return metrics
+
 @router.get("/latest", response_model=List[VehicleLocation])
 async def get_latest_vehicle_locations(
     db: Session = Depends(get_db),
-    limit: int = 100
+    limit: int = 100,
+    vehicle_type: Optional[VehicleType] = None,
+    vehicle_status: Optional[VehicleStatus] = Query(None, alias="status")
 ):
     """
-    Get latest GPS locations for all vehicles
+    Get the latest GPS location of each vehicle, most recently reported first
     """
     try:
-        # Get latest GPS log for each vehicle
-        latest_logs = db.query(GPSLog).join(Vehicle).filter(
-            GPSLog.timestamp >= datetime.utcnow() - timedelta(hours=24)
-        ).order_by(GPSLog.timestamp.desc()).limit(limit).all()
-        
-        locations = []
-        for log in latest_logs:
-            locations.append(VehicleLocation(
-                vehicle_id=log.vehicle.vehicle_id,
-                latitude=log.latitude,
-                longitude=log.longitude,
-                speed=log.speed,
-                heading=log.heading,
-                timestamp=log.timestamp,
-                status=log.vehicle.status,
-                is_idle=log.is_idle
-            ))
+        positions = position_store.positions(db, vehicle_type=vehicle_type, status=vehicle_status)
+        positions.sort(key=lambda position: position.timestamp, reverse=True)
         
-        return locations
+        return [build_vehicle_location(position) for position in positions[:limit]]
         
     except Exception as e:
         logging.error(f"Error getting latest locations: {e}")
@@ -125,27 +246,73 @@ async def get_latest_vehicle_locations(
             detail=f"Error retrieving locations: {str(e)}"
         )
 
-@router.get("/vehicle/{vehicle_id}/history", response_model=PaginatedResponse)
+def build_vehicle_location(position) -> VehicleLocation:
+    return VehicleLocation(
+        vehicle_id=position.vehicle_id,
+        latitude=position.latitude,
+        longitude=position.longitude,
+        speed=position.speed,
+        heading=position.heading,
+        timestamp=position.timestamp,
+        status=position.status,
+        is_idle=position.is_idle
+    )
+
+@router.get("/vehicle/{vehicle_id}/history",
+            response_model=Union[CursorPaginatedResponse, PaginatedResponse, TrackResponse])
 async def get_vehicle_gps_history(
     vehicle_id: str,
     db: Session = Depends(get_db),
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     page: int = 1,
-    size: int = 100
+    size: int = 100,
+    cursor: Optional[str] = Query(
+        None, description="Keyset cursor from next_cursor; pass it empty for the first page"
+    ),
+    count: Optional[CountMode] = Query(
+        None, description="Total to report: exact (default for pages), approximate, or none (cursor pages only, their default)"
+    ),
+    resolution: Optional[HistoryResolution] = Query(
+        None,
+        description="raw fixes (default for pages), 1m or 15m rollups, or auto (default for tracks): the coarsest "
+                    "that still gives max_points over start_date..end_date. Rollup pages hold GPSRollupResponse items."
+    ),
+    max_points: int = Query(settings.history_max_points, ge=1, description="Point budget for resolution=auto"),
+    response_format: HistoryFormat = Query(
+        HistoryFormat.PAGE, alias="format",
+        description="page, or the whole range (default the last day) as a simplified track or encoded polyline"
+    ),
+    tolerance: Optional[float] = Query(
+        None, gt=0, description="Track formats: Douglas-Peucker tolerance in meters; without it the track is cut to max_points"
+    )
 ):
     """
-    Get GPS history for a specific vehicle
+    Get GPS history for a specific vehicle, newest first. With a cursor the
+    next page is read by seeking to (timestamp, id) instead of skipping rows,
+    so deep pages cost the same as the first. Long ranges are served from
+    1-minute or 15-minute rollups when resolution asks for them. The track and
+    polyline formats return the whole range simplified for drawing. Raw
+    fixes older than the live table are read from the cold archive.
     """
     try:
         # Find vehicle
-        vehicle = db.query(Vehicle).filter(Vehicle.vehicle_id == vehicle_id).first()
+        vehicle = vehicle_registry.get(db, vehicle_id)
         if not vehicle:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Vehicle {vehicle_id} not found"
             )
         
+        if response_format != HistoryFormat.PAGE:
+            return read_track(db, vehicle, start_date, end_date, resolution or HistoryResolution.AUTO,
+                              max_points, tolerance, response_format)
+        
+        # Pages keep their GPSDataResponse items unless a rollup resolution is asked for
+        level = resolve_history_level(db, resolution or HistoryResolution.RAW, start_date, end_date, max_points)
+        if level is not None:
+            return read_rollup_history(db, level, vehicle, start_date, end_date, page, size, cursor, count)
+        
         # Build query
         query = db.query(GPSLog).filter(GPSLog.vehicle_id == vehicle.id)
         
@@ -154,30 +321,29 @@ async def get_vehicle_gps_history(
         if end_date:
             query = query.filter(GPSLog.timestamp <= end_date)
         
+        # Older fixes come from the archive, the live table only answers from its boundary on
+        archived = archive_range(start_date, end_date)
+        if archived:
+            query = query.filter(GPSLog.timestamp >= archived[1])
+        
+        if cursor is not None:
+            return read_history_page(db, query, vehicle, cursor, size, count or CountMode.NONE, archived)
+        
         # Get total count
-        total = query.count()
+        total, _ = count_rows(db, query, count or CountMode.EXACT)
+        if archived:
+            total += gps_archive.count(vehicle.vehicle_id, *archived)
         
         # Get paginated results
-        logs = query.order_by(GPSLog.timestamp.desc()).offset(
-            (page - 1) * size
-        ).limit(size).all()
+        offset = (page - 1) * size
+        logs = query.order_by(GPSLog.timestamp.desc(), GPSLog.id.desc()).offset(offset).limit(size).all()
+        if archived and len(logs) < size:
+            # The page runs past the newest archived fix; skip what the live rows did not
+            skip = 0 if logs else max(0, offset - query.count())
+            logs += gps_archive.fetch(vehicle.vehicle_id, *archived, limit=size - len(logs), offset=skip)
         
         # Convert to response format
-        items = []
-        for log in logs:
-            items.append(GPSDataResponse(
-                id=log.id,
-                vehicle_id=vehicle.vehicle_id,
-                latitude=log.latitude,
-                longitude=log.longitude,
-                altitude=log.altitude,
-                speed=log.speed,
-                heading=log.heading,
-                accuracy=log.accuracy,
-                timestamp=log.timestamp,
-                is_idle=log.is_idle,
-                idle_duration=log.idle_duration
-            ))
+        items = [build_gps_data_response(log, vehicle.vehicle_id) for log in logs]
         
         return PaginatedResponse(
             items=items,
@@ -187,6 +353,8 @@ async def get_vehicle_gps_history(
             pages=(total + size - 1) // size
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error getting vehicle history: {e}")
         raise HTTPException(
@@ -194,81 +362,644 @@ async def get_vehicle_gps_history(
             detail=f"Error retrieving vehicle history: {str(e)}"
         )
 
-async def check_area_violations(vehicle_id: int, latitude: float, longitude: float, db: Session):
+def build_gps_data_response(log: GPSLog, vehicle_id: str) -> GPSDataResponse:
+    return GPSDataResponse(
+        id=log.id,
+        vehicle_id=vehicle_id,
+        latitude=log.latitude,
+        longitude=log.longitude,
+        altitude=log.altitude,
+        speed=log.speed,
+        heading=log.heading,
+        accuracy=log.accuracy,
+        timestamp=log.timestamp,
+        is_idle=log.is_idle,
+        idle_duration=log.idle_duration
+    )
+
+def encode_history_cursor(timestamp: datetime, key: int) -> str:
+    raw = f"{as_naive_utc(timestamp).isoformat()}|{key}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, log_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid history cursor"
+        )
+
+def archive_range(start_date: Optional[datetime],
+                  end_date: Optional[datetime]) -> Optional[Tuple[Optional[datetime], datetime]]:
     """
-    Check if vehicle is violating any area rules
+    (start, end) of the part of a raw history range held in the cold
+    archive, end exclusive; None when the range is all in the live table
+    """
+    boundary = gps_archive.archived_until()
+    if boundary is None:
+        return None
+    start = as_naive_utc(start_date) if start_date else None
+    if start is not None and start >= boundary:
+        return None
+    if end_date is None:
+        return start, boundary
+    return start, min(boundary, as_naive_utc(end_date) + timedelta(microseconds=1))
+
+def read_history_page(db: Session, query, vehicle, cursor: str, size: int, count: CountMode,
+                      archived: Optional[Tuple[Optional[datetime], datetime]] = None) -> CursorPaginatedResponse:
+    """
+    One page of history after a keyset cursor, newest first by (timestamp, id),
+    continuing into the archive once the live rows run out
+    """
+    total, estimated = (None, False) if count == CountMode.NONE else count_rows(db, query, count)
+    if total is not None and archived:
+        total += gps_archive.count(vehicle.vehicle_id, *archived)
+    
+    before = None
+    if cursor:
+        timestamp, log_id = decode_history_cursor(cursor)
+        before = (timestamp, log_id)
+        # The redundant bound lets the optimizer turn this into an index range scan
+        query = query.filter(
+            GPSLog.timestamp <= timestamp,
+            or_(GPSLog.timestamp < timestamp, GPSLog.id < log_id)
+        )
+    
+    logs = query.order_by(GPSLog.timestamp.desc(), GPSLog.id.desc()).limit(size + 1).all()
+    if archived and len(logs) <= size:
+        logs += gps_archive.fetch(vehicle.vehicle_id, *archived, limit=size + 1 - len(logs), before=before)
+    has_more = len(logs) > size
+    logs = logs[:size]
+    
+    return CursorPaginatedResponse(
+        items=[build_gps_data_response(log, vehicle.vehicle_id) for log in logs],
+        size=size,
+        next_cursor=encode_history_cursor(logs[-1].timestamp, logs[-1].id) if has_more else None,
+        total=total,
+        total_estimated=estimated
+    )
+
+def resolve_history_level(db: Session, resolution: HistoryResolution, start_date: Optional[datetime],
+                          end_date: Optional[datetime], max_points: int) -> Optional[RollupLevel]:
+    """
+    Rollup level to answer a history request from, None for raw fixes;
+    auto needs a start_date to know the range, and rollups that have
+    reached it
+    """
+    if resolution == HistoryResolution.RAW:
+        return None
+    if resolution != HistoryResolution.AUTO:
+        return LEVELS_BY_NAME[resolution.value]
+    if start_date is None:
+        return None
+    end = as_naive_utc(end_date) if end_date else datetime.utcnow()
+    # Archived fixes are still raw fixes, so only retention without an archive limits raw reads
+    raw_since = None if gps_archive.available else raw_history_start()
+    level = choose_level(as_naive_utc(start_date), end, max_points, raw_since)
+    if level is not None:
+        covered = rolled_up_until(db)
+        if covered is None or covered <= as_naive_utc(start_date):
+            return None
+    return level
+
+def rollup_boundary(db: Session, level: RollupLevel, start: Optional[datetime]) -> Optional[datetime]:
+    """
+    Start of the first bucket the rollup tables may not have complete yet;
+    buckets from there on are summarized from gps_logs. None when nothing
+    in the range is rolled up.
+    """
+    first = bucket_start(start, level.width) if start else None
+    covered = rolled_up_until(db)
+    if covered is None:
+        return first
+    boundary = bucket_start(covered, level.width)
+    return max(boundary, first) if first else boundary
+
+def recent_buckets(db: Session, level: RollupLevel, vehicle, boundary: Optional[datetime],
+                   end: Optional[datetime]) -> list:
+    """Buckets from the boundary to the one end falls in, newest first, summarized from gps_logs"""
+    until = bucket_start(end, level.width) + level.width if end else None
+    return [
+        level.model(vehicle_id=vehicle.id, **bucket)
+        for bucket in reversed(summarize_range(db, vehicle.id, boundary, until, level.width))
+    ]
+
+def read_rollup_history(db: Session, level: RollupLevel, vehicle, start_date: Optional[datetime],
+                        end_date: Optional[datetime], page: int, size: int, cursor: Optional[str],
+                        count: Optional[CountMode]) -> Union[CursorPaginatedResponse, PaginatedResponse]:
+    """
+    History from one rollup level, newest bucket first, paged like raw fixes;
+    the buckets the rollup job has not reached yet come first, summarized
+    from gps_logs
+    """
+    start = as_naive_utc(start_date) if start_date else None
+    end = as_naive_utc(end_date) if end_date else None
+    boundary = rollup_boundary(db, level, start)
+    recent = recent_buckets(db, level, vehicle, boundary, end)
+    
+    model = level.model
+    query = db.query(model).filter(model.vehicle_id == vehicle.id)
+    if start:
+        # Include the bucket the range starts in
+        query = query.filter(model.bucket_start >= bucket_start(start, level.width))
+    if end:
+        query = query.filter(model.bucket_start <= end)
+    query = query.filter(model.bucket_start < boundary if boundary else false())
+    
+    if cursor is not None:
+        count = count or CountMode.NONE
+        total, estimated = (None, False) if count == CountMode.NONE else count_rows(db, query, count)
+        if total is not None:
+            total += len(recent)
+        if cursor:
+            timestamp, _ = decode_history_cursor(cursor)
+            recent = [row for row in recent if row.bucket_start < timestamp]
+            query = query.filter(model.bucket_start < timestamp)
+        
+        rows = recent[:size + 1]
+        if len(rows) <= size:
+            rows += query.order_by(model.bucket_start.desc()).limit(size + 1 - len(rows)).all()
+        has_more = len(rows) > size
+        rows = rows[:size]
+        
+        return CursorPaginatedResponse(
+            items=[build_rollup_response(row, level, vehicle.vehicle_id) for row in rows],
+            size=size,
+            next_cursor=encode_history_cursor(rows[-1].bucket_start, 0) if has_more else None,
+            total=total,
+            total_estimated=estimated
+        )
+    
+    total, _ = count_rows(db, query, count or CountMode.EXACT)
+    total += len(recent)
+    offset = (page - 1) * size
+    rows = recent[offset:offset + size]
+    if len(rows) < size:
+        rows += query.order_by(model.bucket_start.desc()).offset(max(0, offset - len(recent))).limit(
+            size - len(rows)
+        ).all()
+    
+    return PaginatedResponse(
+        items=[build_rollup_response(row, level, vehicle.vehicle_id) for row in rows],
+        total=total,
+        page=page,
+        size=size,
+        pages=(total + size - 1) // size
+    )
+
+def build_rollup_response(row, level: RollupLevel, vehicle_id: str) -> GPSRollupResponse:
+    return GPSRollupResponse(
+        vehicle_id=vehicle_id,
+        resolution=level.name,
+        bucket_start=row.bucket_start,
+        fix_count=row.fix_count,
+        first_latitude=row.first_latitude,
+        first_longitude=row.first_longitude,
+        first_timestamp=row.first_timestamp,
+        last_latitude=row.last_latitude,
+        last_longitude=row.last_longitude,
+        last_timestamp=row.last_timestamp,
+        avg_speed=row.avg_speed,
+        max_speed=row.max_speed,
+        distance=row.distance or 0.0,
+        idle_seconds=row.idle_seconds or 0
+    )
+
+def read_track(db: Session, vehicle, start_date: Optional[datetime], end_date: Optional[datetime],
+               resolution: HistoryResolution, max_points: int, tolerance: Optional[float],
+               response_format: HistoryFormat) -> TrackResponse:
+    """
+    The whole range as one simplified line, oldest first, keeping the first
+    and last point and where every stop starts and ends. Douglas-Peucker
+    with a tolerance, otherwise Visvalingam-Whyatt down to max_points.
+    Raw fixes come from the archive, the track store and gps_logs; auto
+    only draws rollup buckets for the part of the range before raw
+    retention.
+    """
+    end = as_naive_utc(end_date) if end_date else datetime.utcnow()
+    start = as_naive_utc(start_date) if start_date else end - TRACK_DEFAULT_RANGE
+    level = None
+    if resolution == HistoryResolution.AUTO:
+        # Inside the raw window every fix is drawn so no stop is lost; rollups only stand in for dropped fixes
+        raw_since = None if gps_archive.available else raw_history_start()
+        if raw_since is not None and start < raw_since:
+            level = choose_level(start, min(end, raw_since), max_points * TRACK_SOURCE_FACTOR, raw_since)
+    elif resolution != HistoryResolution.RAW:
+        level = LEVELS_BY_NAME[resolution.value]
+    
+    rows, raw_from = [], start
+    if level is not None:
+        # A bucket stands for its last fix, idle when the vehicle stood still at any time in it
+        model = level.model
+        cut = rollup_boundary(db, level, start)
+        if resolution == HistoryResolution.AUTO:
+            cut = min(cut, bucket_start(raw_since, level.width))
+        rows = [
+            (lat, lon, timestamp, speed, (idle_seconds or 0) > 0)
+            for lat, lon, timestamp, speed, idle_seconds in db.query(
+                model.last_latitude, model.last_longitude, model.last_timestamp,
+                model.avg_speed, model.idle_seconds
+            ).filter(
+                model.vehicle_id == vehicle.id,
+                model.bucket_start >= bucket_start(start, level.width),
+                model.bucket_start < cut,
+                model.bucket_start <= end
+            ).order_by(model.bucket_start).all()
+        ]
+        raw_from = max(start, cut)
+    source = level.name if rows else HistoryResolution.RAW.value
+    # Fixes after the rolled-up part are drawn as they are
+    rows += read_raw_track(db, vehicle, raw_from, end)
+    
+    kept = []
+    if rows:
+        lat = np.array([row[0] for row in rows], dtype=np.float64)
+        lon = np.array([row[1] for row in rows], dtype=np.float64)
+        keep = stop_boundaries(np.array([bool(row[4]) for row in rows]))
+        x, y = project(lat, lon)
+        if tolerance is not None:
+            kept = douglas_peucker(x, y, tolerance, keep).tolist()
+        else:
+            kept = visvalingam_whyatt(x, y, max_points, keep).tolist()
+    
+    response = TrackResponse(
+        vehicle_id=vehicle.vehicle_id,
+        resolution=source,
+        source_points=len(rows),
+        point_count=len(kept)
+    )
+    if response_format == HistoryFormat.POLYLINE:
+        response.polyline = encode_polyline(lat[kept], lon[kept]) if kept else ""
+    else:
+        response.points = [
+            TrackPoint(
+                latitude=rows[i][0],
+                longitude=rows[i][1],
+                timestamp=rows[i][2],
+                speed=rows[i][3],
+                is_idle=bool(rows[i][4])
+            )
+            for i in kept
+        ]
+    return response
+
+def read_raw_track(db: Session, vehicle, start: datetime, end: datetime) -> List[tuple]:
+    """
+    (latitude, longitude, timestamp, speed, is_idle, ...) of every fix with
+    start <= timestamp <= end, oldest first, from the archive, the track
+    store and gps_logs
+    """
+    rows, live_start = [], start
+    archived = archive_range(start, end)
+    if archived:
+        rows = [
+            (fix.latitude, fix.longitude, fix.timestamp, fix.speed, fix.is_idle)
+            for fix in gps_archive.fetch(vehicle.vehicle_id, *archived, newest_first=False)
+        ]
+        live_start = archived[1]
+    live = db.query(
+        GPSLog.latitude, GPSLog.longitude, GPSLog.timestamp, GPSLog.speed, GPSLog.is_idle, GPSLog.id
+    ).filter(
+        GPSLog.vehicle_id == vehicle.id,
+        GPSLog.timestamp >= live_start,
+        GPSLog.timestamp <= end
+    ).order_by(GPSLog.timestamp, GPSLog.id)
+    if track_store.enabled:
+        # Fixes up to the store's watermark are decoded from its segments, only newer ones hit gps_logs
+        watermark = track_store.watermark()
+        stored = track_store.read(vehicle.id, live_start, end, max_id=watermark).rows()
+        rows += heapq.merge(stored, live.filter(GPSLog.id > watermark).all(), key=lambda row: (row[2], row[5]))
+    else:
+        rows += live.all()
+    return rows
+
+def count_rows(db: Session, query, count: CountMode) -> Tuple[int, bool]:
+    """
+    Exact count, or on MySQL/MariaDB the optimizer's row estimate for the
+    query, which is read from index statistics without scanning; the flag
+    tells whether the count is an estimate
+    """
+    dialect = db.get_bind().dialect
+    if count == CountMode.APPROXIMATE and dialect.name == "mysql":
+        compiled = query.statement.compile(dialect=dialect)
+        # The driver's placeholders are positional, so the parameters go in statement order
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        plan = db.connection().exec_driver_sql(f"EXPLAIN {compiled}", params).mappings().all()
+        return int(sum(row["rows"] or 0 for row in plan)), True
+    return query.count(), False
+
+@router.get("/export")
+async def export_gps_history(
+    start_date: datetime,
+    end_date: datetime,
+    db: Session = Depends(get_db),
+    vehicle_ids: Optional[List[str]] = Query(
+        None, alias="vehicle_id", description="Repeat for several vehicles; every vehicle when omitted"
+    ),
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+    gzip: bool = Query(False, description="Compress the download as .gz")
+):
+    """
+    Stream raw GPS fixes in [start_date, end_date) for bulk export, per
+    vehicle and oldest first. Rows are read over a server-side cursor and
+    written out as they arrive, so any number of rows fits in constant memory.
     """
     try:
-        # Get all active areas
-        areas = db.query(Area).filter(Area.is_active == True).all()
-        
-        for area in areas:
-            # Check if vehicle is in area (simplified check)
-            if is_point_in_area(latitude, longitude, area.coordinates, area.shape):
-                # Create alert if vehicle enters restricted area
-                if area.area_type in [AreaType.ALERT, AreaType.CRITICAL]:
-                    alert = Alert(
-                        vehicle_id=vehicle_id,
-                        area_id=area.id,
-                        alert_type=f"area_violation_{area.area_type.value}",
-                        message=f"Vehicle entered {area.area_type.value} area: {area.name}",
-                        latitude=latitude,
-                        longitude=longitude
+        start, end = as_naive_utc(start_date), as_naive_utc(end_date)
+        if start >= end:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="start_date must be before end_date"
+            )
+        
+        if vehicle_ids:
+            vehicles = []
+            for vehicle_id in vehicle_ids:
+                vehicle = vehicle_registry.get(db, vehicle_id)
+                if not vehicle:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail=f"Vehicle {vehicle_id} not found"
                     )
-                    db.add(alert)
+                vehicles.append((vehicle.id, vehicle.vehicle_id))
+        else:
+            vehicles = db.query(Vehicle.id, Vehicle.vehicle_id).order_by(Vehicle.vehicle_id).all()
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error preparing GPS export: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error exporting GPS history: {str(e)}"
+        )
+    
+    if export_format == ExportFormat.ARROW and columnar_export.pa is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Arrow export needs pyarrow installed on the server"
+        )
+    
+    rows = iter_gps_rows(vehicles, start, end, batch_size=settings.gps_export_batch_size)
+    if export_format == ExportFormat.ARROW:
+        body = columnar_export.arrow_stream(rows, batch_size=settings.analytics_export_batch_size)
+        media_type = "application/vnd.apache.arrow.stream"
+    elif export_format == ExportFormat.CSV:
+        body = chunked(csv_lines(rows))
+        media_type = "text/csv"
+    else:
+        body = chunked(ndjson_lines(rows))
+        media_type = "application/x-ndjson"
+    
+    filename = f"gps_{start:%Y%m%d}_{end:%Y%m%d}.{export_format.value}"
+    if gzip:
+        body = gzipped(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    # A sync generator, so Starlette pulls it from the threadpool without blocking the event loop
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/vehicle/{vehicle_id}/geofence-events", response_model=List[GeofenceEventResponse])
+async def get_vehicle_geofence_events(
+    vehicle_id: str,
+    db: Session = Depends(get_db),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    event_type: Optional[GeofenceEventType] = None,
+    limit: int = 100
+):
+    """
+    Get the enter/exit/dwell timeline for a specific vehicle
+    """
+    try:
+        vehicle = vehicle_registry.get(db, vehicle_id)
+        if not vehicle:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Vehicle {vehicle_id} not found"
+            )
+        
+        query = db.query(GeofenceEvent).filter(GeofenceEvent.vehicle_id == vehicle.id)
+        
+        if start_date:
+            query = query.filter(GeofenceEvent.timestamp >= start_date)
+        if end_date:
+            query = query.filter(GeofenceEvent.timestamp <= end_date)
+        if event_type:
+            query = query.filter(GeofenceEvent.event_type == event_type)
+        
+        events = query.order_by(GeofenceEvent.timestamp.desc(), GeofenceEvent.id.desc()).limit(limit).all()
+        
+        return [build_geofence_event_response(event) for event in events]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error getting geofence events: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error retrieving geofence events: {str(e)}"
+        )
+
+def build_geofence_event_response(event: GeofenceEvent) -> GeofenceEventResponse:
+    return GeofenceEventResponse(
+        id=event.id,
+        vehicle_id=event.vehicle_id,
+        area_id=event.area_id,
+        event_type=event.event_type.value,
+        latitude=event.latitude,
+        longitude=event.longitude,
+        timestamp=event.timestamp,
+        dwell_seconds=event.dwell_seconds or 0
+    )
+
+async def check_area_violations(vehicle_id: int, latitude: float, longitude: float, db: Session,
+                                timestamp: Optional[datetime] = None):
+    """
+    Check if vehicle is violating any area rules
+    """
+    try:
+        alerts = record_area_violations(vehicle_id, latitude, longitude, db, timestamp=timestamp)
+        payloads = build_alert_payloads(db, alerts)
         
         db.commit()
+        alert_bus.publish(payloads)
         
     except Exception as e:
         logging.error(f"Error checking area violations: {e}")
         db.rollback()
 
-async def create_idle_alert(vehicle_id: int, latitude: float, longitude: float, db: Session):
+def record_area_violations(vehicle_id: int, latitude: float, longitude: float, db: Session,
+                           areas: Optional[List[CompiledArea]] = None,
+                           timestamp: Optional[datetime] = None) -> List[Alert]:
     """
-    Create alert for vehicle being idle too long
+    Record geofence transitions for the point and alert on entering or
+    overstaying restricted areas, without committing; returns the new alerts
     """
-    try:
+    if areas is None:
+        areas = geofence_engine.areas_containing(db, latitude, longitude)
+    timestamp = as_naive_utc(timestamp) if timestamp else datetime.utcnow()
+    
+    alerts = []
+    transitions = area_membership.update(
+        db, vehicle_id, timestamp,
+        (area.id for area in areas),
+        geofence_engine.by_id.keys()
+    )
+    
+    for transition in transitions:
+        db.add(GeofenceEvent(
+            vehicle_id=vehicle_id,
+            area_id=transition.area_id,
+            event_type=transition.event_type,
+            latitude=latitude,
+            longitude=longitude,
+            timestamp=timestamp,
+            dwell_seconds=transition.dwell_seconds
+        ))
+        
+        area = geofence_engine.by_id.get(transition.area_id)
+        if area is None or area.area_type not in [AreaType.ALERT, AreaType.CRITICAL]:
+            continue
+        
+        # Restricted areas alert once on entry and once when the dwell limit is passed
+        if transition.event_type == GeofenceEventType.ENTER:
+            alert_type = f"area_violation_{area.area_type.value}"
+            message = f"Vehicle entered {area.area_type.value} area: {area.name}"
+        elif transition.event_type == GeofenceEventType.DWELL_EXCEEDED:
+            alert_type = f"area_dwell_{area.area_type.value}"
+            message = f"Vehicle has stayed in {area.area_type.value} area {area.name} for {transition.dwell_seconds} seconds"
+        else:
+            continue
+        
         alert = Alert(
             vehicle_id=vehicle_id,
-            alert_type="idle_timeout",
-            message=f"Vehicle has been idle for {settings.gps_idle_timeout} seconds",
+            area_id=area.id,
+            alert_type=alert_type,
+            message=message,
             latitude=latitude,
             longitude=longitude
         )
         db.add(alert)
+        alerts.append(alert)
+    
+    return alerts
+
+async def create_idle_alert(vehicle_id: int, latitude: float, longitude: float, db: Session):
+    """
+    Create alert for vehicle being idle too long
+    """
+    try:
+        alert = build_idle_alert(vehicle_id, latitude, longitude)
+        db.add(alert)
+        payloads = build_alert_payloads(db, [alert])
         db.commit()
+        alert_bus.publish(payloads)
         
     except Exception as e:
         logging.error(f"Error creating idle alert: {e}")
         db.rollback()
 
-def is_point_in_area(lat: float, lon: float, coordinates: dict, shape: str) -> bool:
+def build_idle_alert(vehicle_id: int, latitude: float, longitude: float) -> Alert:
     """
-    Check if a point is inside an area (simplified implementation)
+    Build (but do not persist) an idle timeout alert
     """
-    # This is a simplified implementation
-    # In production, you would use proper geometric calculations
-    if shape == "circle":
-        center_lat = coordinates.get("center", {}).get("lat", 0)
-        center_lon = coordinates.get("center", {}).get("lng", 0)
-        radius = coordinates.get("radius", 0)
-        
-        # Calculate distance (simplified)
-        distance = ((lat - center_lat) ** 2 + (lon - center_lon) ** 2) ** 0.5
-        return distance <= radius
+    return Alert(
+        vehicle_id=vehicle_id,
+        alert_type="idle_timeout",
+        message=f"Vehicle has been idle for {settings.gps_idle_timeout} seconds",
+        latitude=latitude,
+        longitude=longitude
+    )
+
+def persist_gps_rows(rows: List[dict], db: Session) -> List[Alert]:
+    """
+    Insert GPS log rows with one multi-row INSERT and add their alerts, without
+    committing; returns the new alerts
+    """
+    if not rows:
+        return []
     
-    elif shape == "polygon":
-        # Implement polygon point-in-polygon algorithm
-        # For now, return False
-        return False
+    db.execute(insert(GPSLog), [
+        {key: value for key, value in row.items() if key != "idle_alert"}
+        for row in rows
+    ])
+    upsert_last_positions(db, rows)
     
-    elif shape == "rectangle":
-        bounds = coordinates.get("bounds", {})
-        min_lat = bounds.get("south", 0)
-        max_lat = bounds.get("north", 0)
-        min_lon = bounds.get("west", 0)
-        max_lon = bounds.get("east", 0)
-        
-        return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+    # Test every row against the compiled areas in one vectorized pass
+    memberships = geofence_engine.areas_containing_many(
+        db,
+        [row["latitude"] for row in rows],
+        [row["longitude"] for row in rows]
+    )
+    alerts = []
+    for row, areas in zip(rows, memberships):
+        alerts.extend(record_area_violations(
+            row["vehicle_id"], row["latitude"], row["longitude"], db, areas,
+            timestamp=row["timestamp"]
+        ))
+        if row.get("idle_alert"):
+            alert = build_idle_alert(row["vehicle_id"], row["latitude"], row["longitude"])
+            db.add(alert)
+            alerts.append(alert)
     
-    return False
+    return alerts
+
+def flush_buffered_rows(rows: List[dict]):
+    """
+    Group-commit handler for the write-behind ingest buffer
+    """
+    db = SessionLocal()
+    try:
+        payloads = build_alert_payloads(db, persist_gps_rows(rows, db))
+        db.commit()
+        alert_bus.publish(payloads)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def build_gps_row(vehicle_id: int, gps_data: GPSData, idle: IdleUpdate) -> dict:
+    """
+    Build a gps_logs row for a fix; idle_alert marks rows that crossed the idle timeout
+    """
+    return {
+        "vehicle_id": vehicle_id,
+        "latitude": gps_data.latitude,
+        "longitude": gps_data.longitude,
+        "altitude": gps_data.altitude,
+        "speed": gps_data.speed,
+        "heading": gps_data.heading,
+        "accuracy": gps_data.accuracy,
+        "timestamp": gps_data.timestamp,
+        "is_idle": idle.is_idle,
+        "idle_duration": idle.idle_duration,
+        "idle_alert": idle.alert_due
+    }
+
+def is_point_in_area(lat: float, lon: float, coordinates: dict, shape: str) -> bool:
+    """
+    Check if a point is inside an area
+    """
+    try:
+        return CompiledArea(0, "", None, shape, coordinates).contains(lat, lon)
+    except Exception:
+        return False
+
+# Write-behind ingest buffer, started from main.py when enabled in settings
+ingest_buffer = IngestBuffer(
+    flush_handler=flush_buffered_rows,
+    max_queue_size=settings.gps_write_behind_queue_size,
+    batch_size=settings.gps_write_behind_batch_size,
+    flush_interval_ms=settings.gps_write_behind_flush_ms,
+    durability=settings.gps_write_behind_durability
+)
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+import enum
 from database.models import VehicleType, VehicleStatus, AreaType, AreaShape
 
 # GPS Data Schemas
@@ -27,6 +28,48 @@ class GPSDataResponse(BaseModel):
     is_idle: bool
     idle_duration: int
 
+class GPSRollupResponse(BaseModel):
+    vehicle_id: str
+    resolution: str = Field(..., description="Bucket width: 1m or 15m")
+    bucket_start: datetime
+    fix_count: int
+    first_latitude: float
+    first_longitude: float
+    first_timestamp: datetime
+    last_latitude: float
+    last_longitude: float
+    last_timestamp: datetime
+    avg_speed: Optional[float] = Field(None, description="km/h")
+    max_speed: Optional[float] = Field(None, description="km/h")
+    distance: float = Field(..., description="km travelled, including the leg from the previous fix")
+    idle_seconds: int
+
+class TrackPoint(BaseModel):
+    latitude: float
+    longitude: float
+    timestamp: datetime
+    speed: Optional[float] = None
+    is_idle: bool = False
+
+class TrackResponse(BaseModel):
+    vehicle_id: str
+    resolution: str = Field(..., description="raw, or the rollup level (1m, 15m) drawn for the part of the range before the raw fixes")
+    source_points: int = Field(..., description="Points in the range before simplification")
+    point_count: int
+    points: Optional[List[TrackPoint]] = Field(None, description="Simplified points, oldest first (format=track)")
+    polyline: Optional[str] = Field(None, description="Encoded polyline, precision 5 (format=polyline)")
+
+class GPSBatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the fix in the submitted batch")
+    vehicle_id: str
+    success: bool
+    error: Optional[str] = None
+
+class GPSBatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[GPSBatchItemResult]
+
 # Vehicle Schemas
 class VehicleCreate(BaseModel):
     vehicle_id: str = Field(..., description="Unique vehicle identifier")
@@ -59,7 +102,7 @@ class AreaCreate(BaseModel):
     area_type: AreaType = Field(..., description="Type of area")
     shape: AreaShape = Field(..., description="Shape of area")
     coordinates: Dict[str, Any] = Field(..., description="Area coordinates")
-    buffer_distance: Optional[float] = Field(0.0, description="Buffer distance in meters")
+    buffer_distance: Optional[float] = Field(None, ge=0, description="Buffer distance in meters (defaults to DEFAULT_AREA_BUFFER)")
 
 class AreaUpdate(BaseModel):
     name: Optional[str] = None
@@ -93,6 +136,26 @@ class AlertResponse(BaseModel):
     created_at: datetime
     resolved_at: Optional[datetime]
 
+# Geofence Event Schemas
+class GeofenceEventResponse(BaseModel):
+    id: int
+    vehicle_id: int
+    area_id: Optional[int]
+    event_type: str
+    latitude: float
+    longitude: float
+    timestamp: datetime
+    dwell_seconds: int
+
+class AreaOccupantResponse(BaseModel):
+    vehicle_id: str
+    license_plate: Optional[str]
+    vehicle_type: VehicleType
+    status: VehicleStatus
+    entered_at: datetime
+    dwell_seconds: int
+    last_seen: Optional[datetime]
+
 # Route Schemas
 class RouteResponse(BaseModel):
     id: int
@@ -131,6 +194,20 @@ class VehicleLocation(BaseModel):
     status: VehicleStatus
     is_idle: bool
 
+class VehicleClusterResponse(BaseModel):
+    latitude: float = Field(..., description="Centroid latitude of the vehicles in the cluster")
+    longitude: float = Field(..., description="Centroid longitude of the vehicles in the cluster")
+    count: int
+    statuses: Dict[str, int] = Field(..., description="Vehicle count per status")
+    bounds: List[float] = Field(..., description="[south, west, north, east] of the members")
+
+class VehicleMapView(BaseModel):
+    zoom: int
+    clustered: bool
+    total: int = Field(..., description="Vehicles inside the requested bounding box")
+    vehicles: List[VehicleLocation]
+    clusters: List[VehicleClusterResponse]
+
 # Report Schemas
 class ReportFilter(BaseModel):
     start_date: Optional[datetime] = None
@@ -159,3 +236,37 @@ class PaginatedResponse(BaseModel):
     page: int
     size: int
     pages: int
+
+class CountMode(str, enum.Enum):
+    EXACT = "exact"
+    APPROXIMATE = "approximate"  # planner row estimate, no scan
+    NONE = "none"
+
+class HistoryResolution(str, enum.Enum):
+    AUTO = "auto"  # coarsest level that still fits the point budget
+    RAW = "raw"
+    MINUTE = "1m"
+    QUARTER_HOUR = "15m"
+
+class HistoryFormat(str, enum.Enum):
+    PAGE = "page"  # paginated fixes or rollup buckets, newest first
+    TRACK = "track"  # whole range as simplified points
+    POLYLINE = "polyline"  # whole range as a simplified encoded polyline
+
+class ExportFormat(str, enum.Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+    ARROW = "arrow"  # Arrow IPC stream, needs pyarrow
+
+class CursorPaginatedResponse(BaseModel):
+    items: List[Any]
+    size: int
+    next_cursor: Optional[str] = Field(None, description="Pass as ?cursor= for the next page; null on the last page")
+    total: Optional[int] = None
+    total_estimated: bool = False
+
+class ChangesResponse(BaseModel):
+    cursor: int = Field(..., description="Pass as ?since= on the next poll")
+    items: List[Any] = Field(..., description="Records changed since the requested cursor")
+    ids: Optional[List[int]] = Field(None, description="Ids of every record that still exists, where deletions matter")
+    removed: Optional[List[Any]] = Field(None, description="Keys of records removed or no longer matching the filters since the cursor; apply before items")
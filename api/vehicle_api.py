@@ -4,11 +4,17 @@ from typing import List, Optional
 from datetime import datetime
 
 from database.database import get_db
-from database.models import Vehicle, VehicleType, VehicleStatus
+from database.models import Vehicle, GPSLog, GeofenceEvent, VehicleType, VehicleStatus
 from api.schemas import (
     VehicleCreate, VehicleUpdate, VehicleResponse, 
     APIResponse, PaginatedResponse
 )
+from services.vehicle_cache import vehicle_registry
+from services.live_state import live_state
+from services.area_membership import area_membership
+from services.position_store import position_store, VEHICLES_VERSION_KEY
+from services.geofence import bump_version
+from services.track_store import track_store
 
 router = APIRouter(prefix="/api/vehicles", tags=["Vehicles"])
 
@@ -55,9 +61,13 @@ async def create_vehicle(
         )
         
         db.add(vehicle)
+        bump_version(db, VEHICLES_VERSION_KEY)
         db.commit()
         db.refresh(vehicle)
         
+        # Replace any cached "unknown vehicle" entry for this ID
+        vehicle_registry.put(vehicle)
+        
         return VehicleResponse(
             id=vehicle.id,
             vehicle_id=vehicle.vehicle_id,
@@ -146,7 +156,7 @@ async def get_vehicle(
     Get a specific vehicle by vehicle_id
     """
     try:
-        vehicle = db.query(Vehicle).filter(Vehicle.vehicle_id == vehicle_id).first()
+        vehicle = vehicle_registry.get(db, vehicle_id)
         
         if not vehicle:
             raise HTTPException(
@@ -218,9 +228,12 @@ async def update_vehicle(
             vehicle.driver_phone = vehicle_data.driver_phone
         
         vehicle.updated_at = datetime.utcnow()
+        bump_version(db, VEHICLES_VERSION_KEY)
         
         db.commit()
         db.refresh(vehicle)
+        vehicle_registry.put(vehicle)
+        position_store.update_vehicle(vehicle)
         
         return VehicleResponse(
             id=vehicle.id,
@@ -260,8 +273,19 @@ async def delete_vehicle(
                 detail=f"Vehicle {vehicle_id} not found"
             )
         
+        vehicle_pk = vehicle.id
+        # Partitioned gps_logs cannot carry the cascading foreign key
+        db.query(GPSLog).filter(GPSLog.vehicle_id == vehicle_pk).delete(synchronize_session=False)
+        # Tables created before the cascade was declared (and SQLite) do not remove these themselves
+        db.query(GeofenceEvent).filter(GeofenceEvent.vehicle_id == vehicle_pk).delete(synchronize_session=False)
         db.delete(vehicle)
+        bump_version(db, VEHICLES_VERSION_KEY)
         db.commit()
+        vehicle_registry.invalidate(vehicle_id)
+        live_state.discard(vehicle_pk)
+        area_membership.discard(vehicle_pk)
+        position_store.discard(vehicle_pk)
+        track_store.discard(vehicle_pk)
         
         return APIResponse(
             success=True,
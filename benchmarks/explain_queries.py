@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Query plan audit
+
+Starts the app against the configured MariaDB/MySQL database, calls every
+read endpoint once, captures each distinct SELECT the API issues (startup
+warm-up included) and runs EXPLAIN on it. Plans that read a whole table
+(type ALL) or a whole index (type index) are flagged when the optimizer
+expects to touch at least --min-rows rows, so small lookup tables such as
+vehicles or areas do not raise noise. Run from the project root against a
+database with realistic data:
+
+    python -m benchmarks.explain_queries [--min-rows 1000]
+
+Exits with status 1 when any query is flagged.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from database.database import engine, SessionLocal
+from database.models import Area, Vehicle
+
+ENDPOINTS = [
+    "/api/gps/latest",
+    "/api/gps/vehicle/{vehicle_id}/history",
+    "/api/gps/vehicle/{vehicle_id}/history?page=50",
+    "/api/gps/vehicle/{vehicle_id}/history?cursor=&count=approximate",
+    "/api/gps/vehicle/{vehicle_id}/history?resolution=15m",
+    "/api/gps/vehicle/{vehicle_id}/geofence-events",
+    "/api/vehicles/",
+    "/api/vehicles/{vehicle_id}",
+    "/api/areas/",
+    "/api/areas/?since=0",
+    "/api/areas/{area_id}",
+    "/api/areas/{area_id}/events",
+    "/api/areas/{area_id}/vehicles",
+    "/api/dashboard/stats",
+    "/api/dashboard/vehicle-locations",
+    "/api/dashboard/alerts",
+    "/api/dashboard/alerts?resolved=false",
+    "/api/dashboard/alerts?since=0",
+    "/api/dashboard/vehicle-types-stats",
+    "/api/dashboard/area-stats",
+]
+
+FULL_SCAN_TYPES = {"ALL": "full table scan", "index": "full index scan"}
+
+class QueryRecorder:
+    def __init__(self):
+        self.source = "startup"
+        self.queries = {}  # statement -> (parameters, first endpoint that issued it)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith("SELECT"):
+            return
+        self.queries.setdefault(statement, (parameters, self.source))
+
+def sample_ids():
+    db = SessionLocal()
+    try:
+        vehicle = db.query(Vehicle.vehicle_id).first()
+        area = db.query(Area.id).first()
+        return (vehicle[0] if vehicle else None), (area[0] if area else None)
+    finally:
+        db.close()
+
+def explain(statement: str, parameters) -> list:
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).mappings().all()
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN every query the API issues and flag full scans")
+    parser.add_argument("--min-rows", type=int, default=1000, help="ignore scans expected to read fewer rows")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "mysql":
+        print(f"EXPLAIN audit needs MariaDB/MySQL, DATABASE_URL points at {engine.dialect.name}")
+        return 2
+
+    vehicle_id, area_id = sample_ids()
+    if vehicle_id is None or area_id is None:
+        print("Need at least one vehicle and one area in the database (python insert_sample_data.py)")
+        return 2
+
+    from main import app
+
+    recorder = QueryRecorder()
+    event.listen(engine, "before_cursor_execute", recorder)
+    try:
+        with TestClient(app) as client:
+            for endpoint in ENDPOINTS:
+                path = endpoint.format(vehicle_id=vehicle_id, area_id=area_id)
+                recorder.source = f"GET {path}"
+                response = client.get(path)
+                if response.status_code >= 400:
+                    print(f"! {recorder.source} -> {response.status_code}")
+    finally:
+        event.remove(engine, "before_cursor_execute", recorder)
+
+    flagged = 0
+    for statement, (parameters, source) in recorder.queries.items():
+        for row in explain(statement, parameters):
+            scan = FULL_SCAN_TYPES.get(row["type"])
+            rows = row["rows"] or 0
+            if scan is None or rows < args.min_rows:
+                continue
+            flagged += 1
+            print(f"\n{scan.upper()} on {row['table']} (~{rows} rows, key={row['key']}, extra={row['Extra']})")
+            print(f"  issued by: {source}")
+            print(f"  {' '.join(statement.split())}")
+
+    print(f"\n{len(recorder.queries)} distinct queries explained, {flagged} full scans flagged")
+    return 1 if flagged else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Geofence lookup benchmark
+
+Compares a linear scan over every compiled area with the STR-tree index for
+10 to 50,000 random areas around Bangkok. Run from the project root:
+
+    python -m benchmarks.geofence_benchmark
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.models import AreaShape, AreaType
+from services.geofence import CompiledArea
+from services.spatial_index import STRTree
+
+REGION = (13.0, 100.0, 14.5, 101.5)  # south, west, north, east
+AREA_COUNTS = [10, 100, 1000, 10000, 50000]
+INDEX_QUERIES = 20000
+LINEAR_QUERIES = 500
+
+def random_area(area_id: int, rng: random.Random) -> CompiledArea:
+    """Build a random depot/site-sized area (roughly 50 m to 2 km across)"""
+    south, west, north, east = REGION
+    lat = rng.uniform(south, north)
+    lon = rng.uniform(west, east)
+    size = rng.uniform(0.0005, 0.02)
+    shape = rng.choice([AreaShape.RECTANGLE, AreaShape.CIRCLE, AreaShape.POLYGON])
+
+    if shape == AreaShape.RECTANGLE:
+        coordinates = {"bounds": {"south": lat, "west": lon, "north": lat + size, "east": lon + size}}
+    elif shape == AreaShape.CIRCLE:
+        coordinates = {"center": {"lat": lat, "lng": lon}, "radius": size * 111000}  # meters
+    else:
+        coordinates = {"points": [
+            {"lat": lat, "lng": lon},
+            {"lat": lat + size, "lng": lon + size / 3},
+            {"lat": lat + size / 2, "lng": lon + size},
+            {"lat": lat - size / 4, "lng": lon + size / 2}
+        ]}
+
+    return CompiledArea(area_id, f"Area {area_id}", AreaType.CHECKPOINT, shape, coordinates)
+
+def random_points(count: int, rng: random.Random) -> list:
+    south, west, north, east = REGION
+    return [(rng.uniform(south, north), rng.uniform(west, east)) for _ in range(count)]
+
+def time_lookups(points: list, lookup) -> float:
+    """Average microseconds per lookup"""
+    started = time.perf_counter()
+    for lat, lon in points:
+        lookup(lat, lon)
+    return (time.perf_counter() - started) / len(points) * 1e6
+
+def main():
+    rng = random.Random(42)
+
+    print("=" * 72)
+    print("🗺️  Geofence lookup benchmark (µs per point)")
+    print("=" * 72)
+    print(f"{'areas':>8} {'build ms':>10} {'height':>7} {'linear µs':>11} {'indexed µs':>11} {'speedup':>9}")
+    print("-" * 72)
+
+    for count in AREA_COUNTS:
+        areas = [random_area(area_id, rng) for area_id in range(count)]
+
+        started = time.perf_counter()
+        index = STRTree([(area.bbox, area) for area in areas])
+        build_ms = (time.perf_counter() - started) * 1000
+
+        linear_us = time_lookups(
+            random_points(LINEAR_QUERIES, rng),
+            lambda lat, lon: [area for area in areas if area.contains(lat, lon)]
+        )
+        indexed_us = time_lookups(
+            random_points(INDEX_QUERIES, rng),
+            lambda lat, lon: [area for area in index.query_point(lat, lon) if area.contains(lat, lon)]
+        )
+
+        print(f"{count:>8} {build_ms:>10.1f} {index.height:>7} {linear_us:>11.1f} {indexed_us:>11.2f} {linear_us / indexed_us:>8.0f}x")
+
+    print("-" * 72)
+
+if __name__ == "__main__":
+    main()
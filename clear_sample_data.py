@@ -33,6 +33,9 @@ def clear_all_data(cursor):
         'dashboard_stats',
         'alerts', 
         'routes',
+        'gps_rollups_15m',
+        'gps_rollups_1m',
+        'rollup_watermarks',
         'gps_logs',
         'areas',
         'vehicles'
@@ -40,6 +43,11 @@ def clear_all_data(cursor):
     
     for table in tables:
         try:
+            if table == 'gps_logs':
+                # Nothing references gps_logs; TRUNCATE empties every partition without a row-by-row delete
+                cursor.execute(f"TRUNCATE TABLE {table}")
+                print(f"✅ Truncated {table}")
+                continue
             cursor.execute(f"DELETE FROM {table}")
             affected_rows = cursor.rowcount
             print(f"✅ Cleared {affected_rows} records from {table}")
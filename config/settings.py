@@ -25,14 +25,83 @@ class Settings(BaseSettings):
     gps_update_interval: int = 30  # seconds
     gps_accuracy_threshold: float = 10.0  # meters
     gps_idle_timeout: int = 300  # seconds (5 minutes)
+    gps_batch_max_size: int = 1000  # fixes per batch request
+    
+    # Write-behind ingest settings
+    gps_write_behind_enabled: bool = False
+    gps_write_behind_queue_size: int = 10000  # fixes held in memory
+    gps_write_behind_batch_size: int = 500  # rows per group commit
+    gps_write_behind_flush_ms: int = 50  # max wait before a partial batch is flushed
+    gps_write_behind_durability: str = "enqueue"  # "enqueue" or "commit"
+    gps_write_behind_drain_timeout: float = 10.0  # seconds allowed for shutdown drain
+    
+    # Vehicle registry cache settings
+    vehicle_cache_size: int = 10000  # vehicles held in memory
+    vehicle_cache_ttl: float = 300.0  # seconds a known vehicle stays cached
+    vehicle_cache_negative_ttl: float = 30.0  # seconds an unknown vehicle_id stays cached
+    vehicle_cache_version_check_interval: float = 2.0  # seconds between vehicle version checks
     
     # Area settings
     max_area_points: int = 1000
     default_area_buffer: float = 50.0  # meters
+    geofence_version_check_interval: float = 1.0  # seconds between area version checks
+    geofence_dwell_limit: int = 900  # seconds inside an alert/critical area before a dwell alert
+    area_membership_refresh_interval: float = 2.0  # seconds between pulls of other workers' geofence events
     
     # Dashboard settings
     dashboard_refresh_interval: int = 10  # seconds
     max_vehicles_display: int = 100
+    latest_position_window_hours: int = 24  # vehicles silent for longer drop off the map
+    latest_position_refresh_interval: float = 2.0  # seconds between pulls of other workers' positions
+    
+    # Live map feed (WebSocket)
+    live_feed_interval: float = 1.0  # seconds between pushed updates
+    live_feed_client_queue_size: int = 8  # frames buffered per client before it counts as slow
+    live_feed_max_drops: int = 3  # consecutive overflows before a slow client is disconnected
+    
+    # Map clustering (/api/dashboard/vehicle-locations?zoom=)
+    vehicle_cluster_max_zoom: int = 13  # highest zoom level at which vehicles are clustered
+    vehicle_cluster_min_vehicles: int = 200  # viewports with fewer vehicles are never clustered
+    vehicle_cluster_cell_pixels: int = 60  # cluster grid cell size in screen pixels
+    
+    # Delta sync (?since= change cursors)
+    change_cursor_overlap: float = 10.0  # seconds re-sent before a time cursor to cover clock skew
+    
+    # Alert stream (Server-Sent Events)
+    alert_stream_buffer_size: int = 1000  # recent alerts kept for Last-Event-ID resume
+    alert_stream_poll_interval: float = 2.0  # seconds between checks for other workers' alerts
+    alert_stream_heartbeat: float = 15.0  # seconds between keep-alive comments
+    
+    # gps_logs partitioning (MariaDB/MySQL, applied by migration 0002)
+    gps_partition_granularity: str = "day"  # "day" or "month"
+    gps_partition_premake: int = 7  # periods created ahead of the current one
+    gps_log_retention_days: int = 0  # drop partitions older than this; 0 keeps everything
+    gps_partition_check_interval: float = 3600.0  # seconds between maintenance runs
+    
+    # Cold archive of expired gps_logs partitions (zstd Parquet, needs pyarrow)
+    gps_archive_enabled: bool = False  # archive partitions before retention drops them; kept if archiving fails
+    gps_archive_dir: str = "archive"
+    gps_archive_compression: str = "zstd"
+    
+    # History rollups (1-minute and 15-minute aggregates of gps_logs)
+    gps_rollup_interval: float = 60.0  # seconds between rollup runs once caught up
+    gps_rollup_batch_size: int = 50000  # gps_logs rows read per run
+    history_max_points: int = 1000  # default point budget when history picks its resolution
+    
+    # Compact track store (delta-encoded segment files serving raw track/polyline history)
+    track_store_enabled: bool = False
+    track_store_dir: str = "data/tracks"
+    track_store_interval: float = 60.0  # seconds between appends once caught up
+    track_store_batch_size: int = 50000  # gps_logs rows appended per run
+    track_store_commit_lag: float = 120.0  # seconds a gps_logs id must be old before it is appended
+    
+    # Bulk export (/api/gps/export)
+    gps_export_batch_size: int = 5000  # rows fetched per round trip from the server-side cursor
+    
+    # Columnar analytics export (export_parquet.py, needs pyarrow)
+    analytics_export_dir: str = "exports/parquet"
+    analytics_export_batch_size: int = 10000  # rows per Arrow record batch
+    analytics_export_compression: str = "snappy"  # Parquet codec: snappy, zstd, gzip or none
     
     # Logging settings
     log_level: str = "INFO"
@@ -1,14 +1,22 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from config.settings import settings
 import logging
 
+# Timestamps are stored and compared in UTC; pin MariaDB/MySQL sessions to it
+# so TIMESTAMP columns are not converted to the server's zone
+connect_args = {}
+if make_url(settings.database_url).get_backend_name() in ("mysql", "mariadb"):
+    connect_args["init_command"] = "SET time_zone = '+00:00'"
+
 # Create database engine
 engine = create_engine(
     settings.database_url,
     pool_pre_ping=True,
     pool_recycle=300,
-    echo=settings.api_debug
+    echo=settings.api_debug,
+    connect_args=connect_args
 )
 
 # Create session factory
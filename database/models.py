@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Enum, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import declared_attr, relationship
 from sqlalchemy.dialects.mysql import JSON
 from datetime import datetime
 import enum
@@ -59,14 +59,71 @@ class GPSLog(Base):
     speed = Column(Float)  # km/h
     heading = Column(Float)  # degrees
     accuracy = Column(Float)  # meters
-    timestamp = Column(DateTime, nullable=False, index=True)
+    timestamp = Column(DateTime, nullable=False)
     is_idle = Column(Boolean, default=False)
     idle_duration = Column(Integer, default=0)  # seconds
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # Per-vehicle history and latest-fix lookups, newest first
+        Index("idx_gps_logs_vehicle_time", "vehicle_id", "timestamp"),
+        # Fleet speed stats over a recent window, answered from the index alone
+        Index("idx_gps_logs_time_speed", "timestamp", "speed", "vehicle_id"),
+    )
+    
     # Relationships
     vehicle = relationship("Vehicle", back_populates="gps_logs")
 
+class VehicleLastPosition(Base):
+    __tablename__ = "vehicle_last_position"
+    
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id", ondelete="CASCADE"), primary_key=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    speed = Column(Float)  # km/h
+    heading = Column(Float)  # degrees
+    timestamp = Column(DateTime, nullable=False)  # GPS time of the newest fix
+    is_idle = Column(Boolean, default=False)
+    idle_duration = Column(Integer, default=0)  # seconds
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    # Relationships
+    vehicle = relationship("Vehicle")
+
+class GPSRollupMixin:
+    """Per-vehicle aggregate of the fixes whose timestamp falls in one bucket"""
+    
+    @declared_attr
+    def vehicle_id(cls):
+        return Column(Integer, ForeignKey("vehicles.id", ondelete="CASCADE"), primary_key=True)
+    
+    bucket_start = Column(DateTime, primary_key=True)
+    fix_count = Column(Integer, nullable=False)
+    first_latitude = Column(Float, nullable=False)
+    first_longitude = Column(Float, nullable=False)
+    first_timestamp = Column(DateTime, nullable=False)
+    last_latitude = Column(Float, nullable=False)
+    last_longitude = Column(Float, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+    avg_speed = Column(Float)  # km/h
+    max_speed = Column(Float)  # km/h
+    distance = Column(Float, default=0.0)  # km, including the leg from the previous fix
+    idle_seconds = Column(Integer, default=0)
+
+class GPSRollup1m(GPSRollupMixin, Base):
+    __tablename__ = "gps_rollups_1m"
+
+class GPSRollup15m(GPSRollupMixin, Base):
+    __tablename__ = "gps_rollups_15m"
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+    
+    name = Column(String(50), primary_key=True)  # e.g. "gps_rollups"
+    last_log_id = Column(Integer, nullable=False, default=0)  # gps_logs rows up to this id are rolled up
+    complete_until = Column(DateTime)  # every fix before this time is rolled up
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Area(Base):
     __tablename__ = "areas"
     
@@ -97,6 +154,10 @@ class Alert(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     resolved_at = Column(DateTime)
     
+    __table_args__ = (
+        Index("idx_alerts_resolved_created", "is_resolved", "created_at"),
+    )
+    
     # Relationships
     vehicle = relationship("Vehicle", back_populates="alerts")
     area = relationship("Area", back_populates="alerts")
@@ -131,3 +192,37 @@ class DashboardStats(Base):
     stat_label = Column(String(100))
     timestamp = Column(DateTime, default=datetime.utcnow)
     meta_data = Column(JSON)  # Additional data as JSON
+
+class GeofenceEventType(enum.Enum):
+    ENTER = "enter"
+    EXIT = "exit"
+    DWELL_EXCEEDED = "dwell_exceeded"
+
+class GeofenceEvent(Base):
+    __tablename__ = "geofence_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id", ondelete="CASCADE"), nullable=False)
+    area_id = Column(Integer, ForeignKey("areas.id", ondelete="SET NULL"), nullable=True)
+    event_type = Column(Enum(GeofenceEventType), nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    timestamp = Column(DateTime, nullable=False)  # GPS time of the fix that caused the transition
+    dwell_seconds = Column(Integer, default=0)  # time inside the area, for exit and dwell_exceeded
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("idx_geofence_events_vehicle_time", "vehicle_id", "timestamp"),
+        Index("idx_geofence_events_area_time", "area_id", "timestamp"),
+    )
+    
+    # Relationships
+    vehicle = relationship("Vehicle")
+    area = relationship("Area")
+
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+    
+    name = Column(String(50), primary_key=True)  # e.g. "areas"
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Export gps_logs, alerts and routes to Parquet for analytics
+
+Writes every complete UTC day not exported yet, one file per vehicle and
+day, under ANALYTICS_EXPORT_DIR (see services/columnar_export.py for the
+layout). Safe to run from cron; each run picks up where the last one ended:
+
+    python export_parquet.py                       # all tables, new days only
+    python export_parquet.py --table gps_logs      # one table
+    python export_parquet.py --day 2026-10-01      # rewrite a day, e.g. after late uploads
+
+Read the result with pandas.read_parquet("exports/parquet/gps_logs") or
+pyarrow.dataset.dataset(..., partitioning="hive").
+"""
+
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+from config.settings import settings
+from services.columnar_export import EXPORT_TABLES, export_pending
+
+def main():
+    parser = argparse.ArgumentParser(description="Export complete days to Parquet, incrementally")
+    parser.add_argument("--out", default=settings.analytics_export_dir, help="export root directory")
+    parser.add_argument("--table", action="append", choices=sorted(EXPORT_TABLES),
+                        help="table to export (repeatable, default all)")
+    parser.add_argument("--day", action="append", type=date.fromisoformat,
+                        help="export exactly this day, replacing an earlier export (repeatable)")
+    args = parser.parse_args()
+
+    try:
+        summary = export_pending(
+            Path(args.out),
+            tables=args.table or list(EXPORT_TABLES),
+            days=args.day,
+            batch_size=settings.analytics_export_batch_size,
+            compression=settings.analytics_export_compression
+        )
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+
+    for table, days in summary.items():
+        if not days:
+            print(f"✅ {table}: up to date")
+            continue
+        print(f"✅ {table}: {sum(days.values())} rows over {len(days)} days ({min(days)} .. {max(days)})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
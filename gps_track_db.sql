@@ -34,7 +34,7 @@ CREATE TABLE `alerts` (
   KEY `idx_vehicle_id` (`vehicle_id`),
   KEY `idx_area_id` (`area_id`),
   KEY `idx_alert_type` (`alert_type`),
-  KEY `idx_is_resolved` (`is_resolved`),
+  KEY `idx_alerts_resolved_created` (`is_resolved`,`created_at`),
   KEY `idx_created_at` (`created_at`),
   CONSTRAINT `alerts_ibfk_1` FOREIGN KEY (`vehicle_id`) REFERENCES `vehicles` (`id`) ON DELETE CASCADE,
   CONSTRAINT `alerts_ibfk_2` FOREIGN KEY (`area_id`) REFERENCES `areas` (`id`) ON DELETE SET NULL
@@ -162,8 +162,8 @@ CREATE TABLE `gps_logs` (
   `idle_duration` int(11) DEFAULT 0,
   `created_at` timestamp NULL DEFAULT current_timestamp(),
   PRIMARY KEY (`id`),
-  KEY `idx_vehicle_id` (`vehicle_id`),
-  KEY `idx_timestamp` (`timestamp`),
+  KEY `idx_gps_logs_vehicle_time` (`vehicle_id`,`timestamp`),
+  KEY `idx_gps_logs_time_speed` (`timestamp`,`speed`,`vehicle_id`),
   KEY `idx_location` (`latitude`,`longitude`),
   KEY `idx_is_idle` (`is_idle`),
   CONSTRAINT `gps_logs_ibfk_1` FOREIGN KEY (`vehicle_id`) REFERENCES `vehicles` (`id`) ON DELETE CASCADE
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, WebSocket
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,11 +6,18 @@ import logging
 import uvicorn
 
 from config.settings import settings
-from database.database import init_db, test_db_connection
-from api.gps_api import router as gps_router
+from database.database import init_db, test_db_connection, SessionLocal
+from api.gps_api import router as gps_router, ingest_buffer
 from api.vehicle_api import router as vehicle_router
 from api.area_api import router as area_router
 from api.dashboard_api import router as dashboard_router
+from services.area_membership import area_membership
+from services.position_store import position_store, backfill_last_positions
+from services.live_feed import live_feed
+from services.alert_bus import alert_bus
+from services.partitions import gps_log_partitioner
+from services.rollups import gps_rollup_job
+from services.track_store import track_store
 
 # Configure logging
 logging.basicConfig(
@@ -64,12 +71,47 @@ async def startup_event():
     else:
         logging.error("Database connection failed")
         raise Exception("Cannot start application without database connection")
+    
+    # Build the occupancy index and latest positions before the first map request
+    db = SessionLocal()
+    try:
+        backfilled = backfill_last_positions(db)
+        if backfilled:
+            logging.info(f"Seeded vehicle_last_position for {backfilled} vehicles")
+        area_membership.warm_up(db)
+        position_store.warm_up(db)
+    finally:
+        db.close()
+    
+    if settings.gps_write_behind_enabled:
+        await ingest_buffer.start()
+    
+    await alert_bus.start()
+    await live_feed.start()
+    await gps_log_partitioner.start()
+    await gps_rollup_job.start()
+    await track_store.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush queued GPS data before the process exits"""
+    await track_store.stop()
+    await gps_rollup_job.stop()
+    await gps_log_partitioner.stop()
+    await live_feed.stop()
+    await alert_bus.stop()
+    await ingest_buffer.drain(timeout=settings.gps_write_behind_drain_timeout)
 
 @app.get("/")
 async def root(request: Request):
     """Serve the main map page"""
     return templates.TemplateResponse("map.html", {"request": request})
 
+@app.websocket("/ws/live")
+async def live_updates(websocket: WebSocket):
+    """Push vehicle position deltas and new alerts for the client's map viewport"""
+    await live_feed.serve(websocket)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -89,7 +131,8 @@ async def api_status():
             "gps": "/api/gps",
             "vehicles": "/api/vehicles",
             "areas": "/api/areas",
-            "dashboard": "/api/dashboard"
+            "dashboard": "/api/dashboard",
+            "live": "/ws/live"
         }
     }
 
@@ -0,0 +1,44 @@
+"""
+Alembic environment
+
+Runs migrations against settings.database_url. Apply them with:
+
+    alembic upgrade head
+"""
+
+import logging.config
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+from config.settings import settings
+from database.models import Base
+
+config = context.config
+if config.config_file_name is not None:
+    logging.config.fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+def run_migrations_offline():
+    """Emit the migration SQL instead of running it (alembic upgrade head --sql)"""
+    context.configure(
+        url=settings.database_url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"}
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    engine = create_engine(settings.database_url, poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,68 @@
+"""Composite and covering indexes for gps_logs and alerts
+
+Replaces the single-column indexes the hot queries could only half use:
+
+- idx_gps_logs_vehicle_time (vehicle_id, timestamp): history pages, latest
+  fix per vehicle and the last-position backfill filter by vehicle and walk
+  timestamps in order; InnoDB appends the primary key, so (timestamp, id)
+  keyset pages are read straight from the index
+- idx_gps_logs_time_speed (timestamp, speed, vehicle_id): the dashboard's
+  average speed and per-type speed stats over the last hour are answered
+  from the index without touching the rows
+- idx_alerts_resolved_created (is_resolved, created_at): resolved/unresolved
+  alert lists ordered by creation time
+
+The single-column indexes they supersede (as created by setup_mariadb.py or
+by create_all) are dropped so every GPS insert maintains fewer indexes.
+Databases already created from the current models are left as they are.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+NEW_INDEXES = [
+    ("idx_gps_logs_vehicle_time", "gps_logs", ["vehicle_id", "timestamp"]),
+    ("idx_gps_logs_time_speed", "gps_logs", ["timestamp", "speed", "vehicle_id"]),
+    ("idx_alerts_resolved_created", "alerts", ["is_resolved", "created_at"]),
+]
+
+# Leftmost prefixes of the new indexes; recreated under their setup script names on downgrade
+SUPERSEDED_INDEXES = [
+    ("idx_vehicle_id", "gps_logs", ["vehicle_id"]),
+    ("idx_timestamp", "gps_logs", ["timestamp"]),
+    ("ix_gps_logs_timestamp", "gps_logs", None),
+    ("idx_is_resolved", "alerts", ["is_resolved"]),
+]
+
+def existing_indexes(table: str) -> set:
+    if context.is_offline_mode():
+        return set()
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+def upgrade():
+    for name, table, columns in NEW_INDEXES:
+        if name not in existing_indexes(table):
+            op.create_index(name, table, columns)
+
+    for name, table, columns in SUPERSEDED_INDEXES:
+        # Offline SQL assumes a database built by setup_mariadb.py
+        if name in existing_indexes(table) or (context.is_offline_mode() and columns):
+            op.drop_index(name, table_name=table)
+
+def downgrade():
+    for name, table, columns in SUPERSEDED_INDEXES:
+        if columns and name not in existing_indexes(table):
+            op.create_index(name, table, columns)
+
+    for name, table, _ in NEW_INDEXES:
+        if context.is_offline_mode() or name in existing_indexes(table):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,80 @@
+"""RANGE partition gps_logs by fix timestamp (MariaDB/MySQL)
+
+Partitioned InnoDB tables cannot take part in foreign keys and every unique
+key must contain the partitioning column, so the vehicle foreign key is
+dropped (vehicle deletion removes its fixes explicitly instead) and the
+primary key becomes (id, timestamp). Existing rows are spread over one
+partition per GPS_PARTITION_GRANULARITY period from the oldest fix onwards;
+later periods are split off p_future by services.partitions.
+
+The conversion rebuilds the table once; on a large table run it in a
+maintenance window. Other databases are left unpartitioned.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+
+from datetime import datetime
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from config.settings import settings
+from services.partitions import (
+    GPS_LOGS_TABLE, future_partition, next_period, partition_definitions,
+    partition_expression, period_start, read_expression
+)
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    granularity = settings.gps_partition_granularity
+    today = datetime.utcnow().date()
+
+    if context.is_offline_mode():
+        # Offline SQL assumes a database built by setup_mariadb.py (TIMESTAMP column)
+        # and starts partitions at the current period; older rows land in the first one
+        op.drop_constraint("gps_logs_ibfk_1", GPS_LOGS_TABLE, type_="foreignkey")
+        expression = partition_expression("TIMESTAMP")
+        first = today
+    else:
+        bind = op.get_bind()
+        if bind.dialect.name != "mysql" or read_expression(bind) is not None:
+            return
+
+        inspector = sa.inspect(bind)
+        for foreign_key in inspector.get_foreign_keys(GPS_LOGS_TABLE):
+            op.drop_constraint(foreign_key["name"], GPS_LOGS_TABLE, type_="foreignkey")
+
+        column_type = next(
+            str(column["type"]) for column in inspector.get_columns(GPS_LOGS_TABLE)
+            if column["name"] == "timestamp"
+        )
+        expression = partition_expression(column_type)
+        oldest = bind.execute(sa.text(f"SELECT MIN(`timestamp`) FROM {GPS_LOGS_TABLE}")).scalar()
+        first = oldest.date() if oldest else today
+
+    until = next_period(period_start(today, granularity), granularity)
+
+    definitions = partition_definitions(first, until, granularity, expression) + [future_partition()]
+    op.execute(
+        f"ALTER TABLE {GPS_LOGS_TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, `timestamp`) "
+        f"PARTITION BY RANGE ({expression}) ({', '.join(definitions)})"
+    )
+
+def downgrade():
+    if not context.is_offline_mode():
+        bind = op.get_bind()
+        if bind.dialect.name != "mysql" or read_expression(bind) is None:
+            return
+
+    op.execute(f"ALTER TABLE {GPS_LOGS_TABLE} REMOVE PARTITIONING")
+    op.execute(f"ALTER TABLE {GPS_LOGS_TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+    op.create_foreign_key(
+        "gps_logs_ibfk_1", GPS_LOGS_TABLE, "vehicles",
+        ["vehicle_id"], ["id"], ondelete="CASCADE"
+    )
@@ -0,0 +1,61 @@
+"""1-minute and 15-minute GPS history rollups
+
+Adds gps_rollups_1m and gps_rollups_15m, one row per vehicle and bucket,
+and rollup_watermarks, which records how far services.rollups has read
+gps_logs. The tables fill in from the existing fixes once the app runs.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+ROLLUP_TABLES = ["gps_rollups_1m", "gps_rollups_15m"]
+
+def existing_tables() -> set:
+    if context.is_offline_mode():
+        return set()
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+def upgrade():
+    tables = existing_tables()
+    for table in ROLLUP_TABLES:
+        if table in tables:
+            continue
+        op.create_table(
+            table,
+            sa.Column("vehicle_id", sa.Integer, sa.ForeignKey("vehicles.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("bucket_start", sa.DateTime, primary_key=True),
+            sa.Column("fix_count", sa.Integer, nullable=False),
+            sa.Column("first_latitude", sa.Float, nullable=False),
+            sa.Column("first_longitude", sa.Float, nullable=False),
+            sa.Column("first_timestamp", sa.DateTime, nullable=False),
+            sa.Column("last_latitude", sa.Float, nullable=False),
+            sa.Column("last_longitude", sa.Float, nullable=False),
+            sa.Column("last_timestamp", sa.DateTime, nullable=False),
+            sa.Column("avg_speed", sa.Float),
+            sa.Column("max_speed", sa.Float),
+            sa.Column("distance", sa.Float),
+            sa.Column("idle_seconds", sa.Integer)
+        )
+
+    if "rollup_watermarks" not in tables:
+        op.create_table(
+            "rollup_watermarks",
+            sa.Column("name", sa.String(50), primary_key=True),
+            sa.Column("last_log_id", sa.Integer, nullable=False),
+            sa.Column("complete_until", sa.DateTime),
+            sa.Column("updated_at", sa.DateTime)
+        )
+
+def downgrade():
+    op.drop_table("rollup_watermarks")
+    for table in reversed(ROLLUP_TABLES):
+        op.drop_table(table)
@@ -25,7 +25,9 @@ def check_dependencies():
         'sqlalchemy',
         'pymysql',
         'pydantic',
-        'dotenv'
+        'dotenv',
+        'numpy',
+        'websockets'
     ]
     
     missing_packages = []
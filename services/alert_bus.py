@@ -0,0 +1,218 @@
+"""
+In-process alert bus
+
+Alerts are published here right after the transaction that created them
+commits, and kept in a ring buffer of the most recent ones so streaming
+clients can resume with Last-Event-ID. Alerts committed by other worker
+processes are picked up by polling the alerts table, so every worker's
+buffer converges on the same stream. Ids are allocated before commit, so an
+alert can become visible after a higher id was already read; each poll
+therefore rescans from the newest id seen one poll earlier, and alerts
+already in the buffer are not published twice.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from database.database import SessionLocal
+from database.models import Alert, Vehicle
+
+def alert_payload(alert: Alert, vehicle_id: str, vehicle_name: Optional[str]) -> dict:
+    """Same fields as the items of /api/dashboard/alerts"""
+    return {
+        "id": alert.id,
+        "vehicle_id": vehicle_id,
+        "vehicle_name": vehicle_name or vehicle_id,
+        "alert_type": alert.alert_type,
+        "message": alert.message,
+        "latitude": alert.latitude,
+        "longitude": alert.longitude,
+        "is_resolved": bool(alert.is_resolved),
+        "created_at": alert.created_at.isoformat() if alert.created_at else None,
+        "resolved_at": alert.resolved_at.isoformat() if alert.resolved_at else None
+    }
+
+def build_alert_payloads(db: Session, alerts: List[Alert]) -> List[dict]:
+    """
+    Flush pending alerts so they have ids and serialize them; call before commit
+    """
+    if not alerts:
+        return []
+    db.flush()
+
+    vehicle_pks = {alert.vehicle_id for alert in alerts}
+    names = {
+        row.id: (row.vehicle_id, row.license_plate)
+        for row in db.query(Vehicle.id, Vehicle.vehicle_id, Vehicle.license_plate).filter(
+            Vehicle.id.in_(vehicle_pks)
+        )
+    }
+    return [
+        alert_payload(alert, *names.get(alert.vehicle_id, (str(alert.vehicle_id), None)))
+        for alert in alerts
+    ]
+
+class AlertSubscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def _deliver(self, payload: dict):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # The client resumes from its last event id after reconnecting
+            self.overflowed = True
+
+class AlertBus:
+    def __init__(self, capacity: int = 1000, poll_interval: float = 2.0, subscriber_queue_size: int = 256):
+        self.capacity = capacity
+        self.poll_interval = poll_interval
+        self.subscriber_queue_size = subscriber_queue_size
+        self._recent: deque = deque(maxlen=capacity)
+        self._ids: Set[int] = set()
+        self._polled_id: Optional[int] = None  # alerts above this id are read at the next poll
+        self._seen_id = 0  # newest alert id read by the previous poll
+        self._polled_at = 0.0
+        self._subscribers: Set[AlertSubscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def publish(self, payloads: Iterable[dict]):
+        """
+        Add committed alerts to the buffer and hand them to subscribers; safe from any thread
+        """
+        with self._lock:
+            fresh = []
+            for payload in payloads:
+                if payload["id"] in self._ids:
+                    continue
+                if len(self._recent) == self._recent.maxlen:
+                    self._ids.discard(self._recent[0]["id"])
+                self._recent.append(payload)
+                self._ids.add(payload["id"])
+                fresh.append(payload)
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            for payload in fresh:
+                subscriber.loop.call_soon_threadsafe(subscriber._deliver, payload)
+
+    def poll(self, db: Session):
+        """
+        Publish alerts committed by any process since the last poll
+        """
+        with self._poll_lock:
+            self._poll(db)
+
+    def _poll(self, db: Session):
+        now = time.monotonic()
+        stale = now - self._polled_at > max(10.0, 5 * self.poll_interval)
+        self._polled_at = now
+        if self._polled_id is None or stale:
+            # Nobody polled for a while; start from now instead of replaying old alerts
+            latest = db.query(Alert.id).order_by(Alert.id.desc()).first()
+            self._polled_id = self._seen_id = latest[0] if latest else 0
+            return
+
+        rows = db.query(Alert, Vehicle.vehicle_id, Vehicle.license_plate).join(
+            Vehicle, Vehicle.id == Alert.vehicle_id
+        ).filter(Alert.id > self._polled_id).order_by(Alert.id).limit(self.capacity).all()
+        if rows:
+            self.publish(alert_payload(*row) for row in rows)
+        newest = rows[-1][0].id if rows else self._seen_id
+        self._polled_id = max(self._polled_id, min(newest, self._seen_id))
+        self._seen_id = newest
+
+    def since(self, last_id: Optional[int], db: Optional[Session] = None) -> List[dict]:
+        """
+        Alerts after the given event id, from the ring buffer; when the id has
+        already been evicted and a session is given, the gap is read from the database
+        """
+        with self._lock:
+            recent = list(self._recent)
+
+        if last_id is None:
+            return []
+        for position, payload in enumerate(recent):
+            if payload["id"] == last_id:
+                return recent[position + 1:]
+
+        oldest = recent[0]["id"] if recent else None
+        if db is not None and (oldest is None or last_id < oldest):
+            rows = db.query(Alert, Vehicle.vehicle_id, Vehicle.license_plate).join(
+                Vehicle, Vehicle.id == Alert.vehicle_id
+            ).filter(Alert.id > last_id).order_by(Alert.id).limit(self.capacity).all()
+            missed = [alert_payload(*row) for row in rows]
+            seen = {payload["id"] for payload in missed}
+            return missed + [payload for payload in recent if payload["id"] not in seen]
+        return [payload for payload in recent if payload["id"] > last_id]
+
+    @property
+    def last_id(self) -> Optional[int]:
+        with self._lock:
+            return self._recent[-1]["id"] if self._recent else None
+
+    def subscribe(self) -> AlertSubscription:
+        subscription = AlertSubscription(asyncio.get_running_loop(), self.subscriber_queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: AlertSubscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._recent),
+            "subscribers": len(self._subscribers),
+            "last_id": self.last_id
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self._subscribers:
+                continue
+            try:
+                await loop.run_in_executor(None, self._poll_once)
+            except Exception as e:
+                logging.error(f"Alert bus poll failed: {e}")
+
+    def _poll_once(self):
+        db = SessionLocal()
+        try:
+            self.poll(db)
+        finally:
+            db.close()
+
+alert_bus = AlertBus(
+    capacity=settings.alert_stream_buffer_size,
+    poll_interval=settings.alert_stream_poll_interval
+)
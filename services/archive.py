@@ -0,0 +1,212 @@
+"""
+Cold archive of expired gps_logs partitions
+
+Before retention drops a gps_logs partition (services.partitions), its days
+are written as zstd-compressed Parquet in the same layout as the analytics
+export, one file per vehicle and day:
+
+    <GPS_ARCHIVE_DIR>/gps_logs/date=2019-03-01/vehicle_id=V001/part-0.parquet
+
+A partition is only dropped once every one of its days is archived, and
+partitions are archived oldest first, so the archive always covers every
+day before archived_until() and the live table everything from there on.
+History queries that reach past that boundary read the live table for the
+newer part and the vehicle's day files for the older part; a day file is
+read whole (tens of thousands of rows at most) and filtered in Arrow.
+
+Off by default (GPS_ARCHIVE_ENABLED). Needs pyarrow (requirements_full.txt);
+without it nothing is archived, no partition is dropped, a warning is logged
+when the partitioner starts, and history only reads the live table.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+from sqlalchemy import select
+
+from config.settings import settings
+from database.database import engine
+from database.models import Vehicle
+from services.columnar_export import (
+    EXPORT_TABLES, day_directory, exported_days, export_day, pa, pq
+)
+
+if pa is not None:
+    import pyarrow.compute as pc
+
+GPS_LOGS = EXPORT_TABLES["gps_logs"]
+FIX_COLUMNS = [name for name, _ in GPS_LOGS.columns]
+
+class ArchivedFix(NamedTuple):
+    """An archived gps_logs row, with the attributes the history responses read"""
+    id: int
+    timestamp: datetime
+    latitude: float
+    longitude: float
+    altitude: Optional[float]
+    speed: Optional[float]
+    heading: Optional[float]
+    accuracy: Optional[float]
+    is_idle: bool
+    idle_duration: int
+
+class GPSArchive:
+    def __init__(self, root: str, enabled: bool = True, compression: str = "zstd",
+                 batch_size: int = 10000):
+        self.root = Path(root)
+        self.enabled = enabled
+        self.compression = compression
+        self.batch_size = batch_size
+        self._until: Optional[datetime] = None
+        self._until_mtime: Optional[float] = None
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and pa is not None
+
+    def archived_until(self) -> Optional[datetime]:
+        """
+        Start of the day after the newest archived day, None when nothing is
+        archived; cached until a day directory is added or replaced
+        """
+        if not self.available:
+            return None
+        directory = self.root / GPS_LOGS.name
+        try:
+            mtime = directory.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        if mtime != self._until_mtime:
+            days = exported_days(self.root, GPS_LOGS)
+            self._until = datetime.combine(days[-1] + timedelta(days=1), datetime.min.time()) if days else None
+            self._until_mtime = mtime
+        return self._until
+
+    def archive_days(self, first: date, end: date, expected_rows: Optional[int] = None) -> bool:
+        """
+        Archive every day in [first, end) not archived yet; False when it
+        could not be done and the rows must stay in the live table. With
+        expected_rows the archived days must hold exactly that many rows;
+        days archived earlier are rebuilt once when they do not.
+        """
+        if not self.available:
+            logging.error("gps_logs archiving needs pyarrow; expired partitions are kept")
+            return False
+        days = [first + timedelta(days=offset) for offset in range((end - first).days)]
+        done = set(exported_days(self.root, GPS_LOGS))
+        try:
+            for attempt in range(2):
+                self._export(day for day in days if day not in done)
+                archived = self.archived_rows(days)
+                if expected_rows is None or archived == expected_rows:
+                    return True
+                # Rows that arrived after a day was first archived: rebuild the days
+                done = set()
+            logging.error(
+                f"Archive of gps_logs {first}..{end} holds {archived} rows, "
+                f"the live table {expected_rows}; the rows are kept"
+            )
+        except Exception as e:
+            logging.error(f"Archiving gps_logs {first}..{end} failed: {e}")
+        return False
+
+    def archived_rows(self, days: Iterable[date]) -> int:
+        """Rows held in the archive for the given days, from Parquet metadata"""
+        total = 0
+        for day in days:
+            for path in day_directory(self.root, GPS_LOGS, day).glob("vehicle_id=*/part-0.parquet"):
+                total += pq.ParquetFile(str(path)).metadata.num_rows
+        return total
+
+    def _export(self, days: Iterable[date]):
+        with engine.connect() as conn:
+            vehicles = conn.execute(select(Vehicle.id, Vehicle.vehicle_id).order_by(Vehicle.vehicle_id)).all()
+            conn = conn.execution_options(stream_results=True, yield_per=self.batch_size)
+            for day in days:
+                rows = export_day(conn, self.root, GPS_LOGS, day, vehicles,
+                                  self.batch_size, self.compression)
+                logging.info(f"Archived {rows} gps_logs rows for {day}")
+
+    def count(self, vehicle_id: str, start: Optional[datetime], end: datetime) -> int:
+        """Archived fixes of the vehicle with start <= timestamp < end"""
+        total = 0
+        for day, path in self._day_files(vehicle_id, start, end, newest_first=False):
+            if self._inside(day, start, end):
+                total += pq.ParquetFile(path).metadata.num_rows
+            else:
+                total += len(self._read(path, start, end))
+        return total
+
+    def fetch(self, vehicle_id: str, start: Optional[datetime], end: datetime,
+              limit: Optional[int] = None, offset: int = 0,
+              before: Optional[Tuple[datetime, int]] = None,
+              newest_first: bool = True) -> List[ArchivedFix]:
+        """
+        Archived fixes of the vehicle with start <= timestamp < end, ordered
+        by (timestamp, id), optionally only those before a (timestamp, id)
+        keyset cursor; whole days are skipped by their row count when possible
+        """
+        fixes = []
+        for day, path in self._day_files(vehicle_id, start, end, newest_first):
+            if before is not None and datetime.combine(day, datetime.min.time()) > before[0]:
+                continue
+            if offset and before is None and self._inside(day, start, end):
+                rows = pq.ParquetFile(path).metadata.num_rows
+                if offset >= rows:
+                    offset -= rows
+                    continue
+            records = self._read(path, start, end, before)
+            if newest_first:
+                records.reverse()
+            if offset:
+                skipped = min(offset, len(records))
+                records = records[skipped:]
+                offset -= skipped
+            fixes.extend(records)
+            if limit is not None and len(fixes) >= limit:
+                return fixes[:limit]
+        return fixes
+
+    def _day_files(self, vehicle_id: str, start: Optional[datetime], end: datetime,
+                   newest_first: bool) -> Iterator[Tuple[date, str]]:
+        archived = exported_days(self.root, GPS_LOGS)
+        if start is not None:
+            archived = [day for day in archived if day >= start.date()]
+        archived = [day for day in archived if datetime.combine(day, datetime.min.time()) < end]
+        segment = f"vehicle_id={quote(vehicle_id, safe='')}"
+        for day in (reversed(archived) if newest_first else archived):
+            path = day_directory(self.root, GPS_LOGS, day) / segment / "part-0.parquet"
+            if path.exists():
+                yield day, str(path)
+
+    @staticmethod
+    def _inside(day: date, start: Optional[datetime], end: datetime) -> bool:
+        day_start = datetime.combine(day, datetime.min.time())
+        return (start is None or start <= day_start) and day_start + timedelta(days=1) <= end
+
+    @staticmethod
+    def _read(path: str, start: Optional[datetime], end: datetime,
+              before: Optional[Tuple[datetime, int]] = None) -> List[ArchivedFix]:
+        """Rows of one day file within the bounds, oldest first as they were written"""
+        table = pq.read_table(path, columns=FIX_COLUMNS)
+        timestamps = table.column("timestamp")
+        stamp = lambda value: pa.scalar(value, type=timestamps.type)
+        mask = pc.less(timestamps, stamp(end))
+        if start is not None:
+            mask = pc.and_(mask, pc.greater_equal(timestamps, stamp(start)))
+        if before is not None:
+            earlier = pc.less(timestamps, stamp(before[0]))
+            tied = pc.and_(pc.equal(timestamps, stamp(before[0])), pc.less(table.column("id"), before[1]))
+            mask = pc.and_(mask, pc.or_(earlier, tied))
+        table = table.filter(mask)
+        return [ArchivedFix(*row) for row in zip(*(table.column(name).to_pylist() for name in FIX_COLUMNS))]
+
+gps_archive = GPSArchive(
+    root=settings.gps_archive_dir,
+    enabled=settings.gps_archive_enabled,
+    compression=settings.gps_archive_compression,
+    batch_size=settings.analytics_export_batch_size
+)
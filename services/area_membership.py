@@ -0,0 +1,346 @@
+"""
+Geofence membership state machine and area occupancy index
+
+Tracks which areas each vehicle is currently inside and turns the stream of
+per-fix containment results into enter, exit and dwell_exceeded transitions.
+The reverse mapping (area -> vehicles inside) is kept alongside so occupancy
+reads never scan GPS logs. State is rebuilt from the last geofence_events row
+per vehicle and area: for one vehicle the first time it is seen, or for the
+whole fleet by warm_up() before the occupancy index is first read.
+
+Transitions are applied in memory when update() returns them, before the
+caller commits the geofence_events rows. A vehicle whose transaction rolls
+back is dropped and reloaded from the committed events. Every
+refresh_interval seconds the vehicles with geofence_events above the id
+watermark, written by this or another worker, are reloaded too, and the
+last-seen time of vehicles inside areas follows vehicle_last_position.
+Occupancy reads therefore trail other workers by up to refresh_interval.
+Two workers handling fixes of one vehicle within that interval can still
+both report its transition, so ingest of a vehicle should stay on one
+worker where that matters.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from database.models import GeofenceEvent, GeofenceEventType, VehicleLastPosition
+
+@dataclass
+class Membership:
+    entered_at: datetime
+    dwell_alerted: bool = False
+
+    def dwell_seconds(self, at: datetime) -> int:
+        return max(int((at - self.entered_at).total_seconds()), 0)
+
+class Transition(NamedTuple):
+    area_id: int
+    event_type: GeofenceEventType
+    dwell_seconds: int
+
+class _VehicleAreas:
+    __slots__ = ("timestamp", "areas")
+
+    def __init__(self, timestamp: Optional[datetime], areas: Dict[int, Membership]):
+        self.timestamp = timestamp
+        self.areas = areas
+
+class Occupant(NamedTuple):
+    vehicle_id: int
+    entered_at: datetime
+    last_seen: Optional[datetime]
+
+# Session.info key of the vehicles whose membership the session's open transaction changed
+TOUCHED_KEY = "area_membership_touched"
+
+class MembershipTracker:
+    def __init__(self, dwell_limit: int = 900, refresh_interval: float = 2.0):
+        self.dwell_limit = dwell_limit
+        self.refresh_interval = refresh_interval
+        self._vehicles: Dict[int, _VehicleAreas] = {}
+        self._occupants: Dict[int, Set[int]] = {}
+        self._pending: Dict[int, int] = {}  # vehicle -> open transactions that changed it
+        self._stale: Set[int] = set()  # vehicles to reload at the next refresh
+        self._warm = False
+        self._synced_at: Optional[datetime] = None
+        self._event_id = 0  # geofence_events above this id are checked at the next refresh
+        self._seen_event_id = 0  # newest geofence_events id at the previous refresh
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, db: Session, vehicle_id: int, timestamp: datetime,
+               area_ids: Iterable[int], active_area_ids: Iterable[int]) -> List[Transition]:
+        """
+        Apply the set of areas containing a fix and return the resulting transitions.
+        Areas that are no longer active are forgotten without an exit event.
+        """
+        inside_now = set(area_ids)
+        active = set(active_area_ids)
+        self.ensure_fresh(db)
+
+        with self._lock:
+            state = self._load(db, vehicle_id)
+
+            # Late fixes cannot change membership that newer fixes already decided
+            if state.timestamp is not None and timestamp < state.timestamp:
+                return []
+            state.timestamp = timestamp
+
+            transitions = []
+            for area_id in list(state.areas):
+                if area_id not in active:
+                    del state.areas[area_id]
+                    self._leave(area_id, vehicle_id)
+                elif area_id not in inside_now:
+                    membership = state.areas.pop(area_id)
+                    self._leave(area_id, vehicle_id)
+                    transitions.append(Transition(
+                        area_id, GeofenceEventType.EXIT, membership.dwell_seconds(timestamp)
+                    ))
+
+            for area_id in inside_now:
+                membership = state.areas.get(area_id)
+                if membership is None:
+                    state.areas[area_id] = Membership(entered_at=timestamp)
+                    self._occupants.setdefault(area_id, set()).add(vehicle_id)
+                    transitions.append(Transition(area_id, GeofenceEventType.ENTER, 0))
+                    continue
+
+                dwell = membership.dwell_seconds(timestamp)
+                if not membership.dwell_alerted and dwell >= self.dwell_limit:
+                    membership.dwell_alerted = True
+                    transitions.append(Transition(area_id, GeofenceEventType.DWELL_EXCEEDED, dwell))
+
+            touched = db.info.setdefault(TOUCHED_KEY, {}).setdefault(self, set())
+            if vehicle_id not in touched:
+                touched.add(vehicle_id)
+                self._pending[vehicle_id] = self._pending.get(vehicle_id, 0) + 1
+            return transitions
+
+    def transaction_ended(self, vehicle_ids: Set[int], committed: bool):
+        """
+        Called when a session's transaction ends; vehicles it changed are
+        dropped when it did not commit, so their committed events are reread
+        """
+        with self._lock:
+            for vehicle_id in vehicle_ids:
+                remaining = self._pending.get(vehicle_id, 0) - 1
+                if remaining > 0:
+                    self._pending[vehicle_id] = remaining
+                else:
+                    self._pending.pop(vehicle_id, None)
+                if not committed:
+                    self._drop(vehicle_id)
+                    self._stale.add(vehicle_id)
+
+    def ensure_fresh(self, db: Session):
+        """
+        Reload vehicles with geofence events recorded since the last check and
+        any rolled back ones, and move last-seen times of vehicles inside areas
+        forward from vehicle_last_position; at most every refresh_interval seconds
+        """
+        if not self._warm:
+            self.warm_up(db)
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval and not self._stale:
+            return
+        self._checked_at = now
+
+        synced_at = datetime.utcnow()
+        newest = db.query(func.max(GeofenceEvent.id)).scalar() or 0
+        changed = {
+            vehicle_id for (vehicle_id,) in db.query(GeofenceEvent.vehicle_id).filter(
+                GeofenceEvent.id > self._event_id
+            ).distinct()
+        }
+        # Overlap the previous check to tolerate clock skew between writers
+        heard = db.query(
+            VehicleLastPosition.vehicle_id, VehicleLastPosition.timestamp
+        ).filter(
+            VehicleLastPosition.updated_at >= self._synced_at - timedelta(seconds=5)
+        ).all()
+        with self._lock:
+            changed |= self._stale
+            # A vehicle changed by a transaction still open here is reloaded once that ends
+            deferred = {vehicle_id for vehicle_id in changed if vehicle_id in self._pending}
+            self._stale = deferred
+            changed -= deferred
+        states = self._read_states(db, changed) if changed else {}
+
+        with self._lock:
+            for vehicle_id in changed:
+                if vehicle_id in self._pending:
+                    self._stale.add(vehicle_id)
+                    continue
+                previous = self._vehicles.get(vehicle_id)
+                state = states.get(vehicle_id) or _VehicleAreas(None, {})
+                if previous is not None and previous.timestamp is not None and (
+                        state.timestamp is None or previous.timestamp > state.timestamp):
+                    state.timestamp = previous.timestamp
+                self._drop(vehicle_id)
+                self._store(vehicle_id, state)
+            for vehicle_id, timestamp in heard:
+                state = self._vehicles.get(vehicle_id)
+                if state is not None and timestamp is not None and (
+                        state.timestamp is None or timestamp > state.timestamp):
+                    state.timestamp = timestamp
+            # Rows below the newest id can still commit late, so the next
+            # check rescans from the id seen one check earlier
+            self._event_id = self._seen_event_id
+            self._seen_event_id = newest
+            self._synced_at = synced_at
+
+    def areas_of(self, vehicle_id: int) -> Dict[int, Membership]:
+        with self._lock:
+            state = self._vehicles.get(vehicle_id)
+            return dict(state.areas) if state else {}
+
+    def warm_up(self, db: Session):
+        """
+        Load open memberships for every vehicle so the occupancy index is complete
+        """
+        with self._lock:
+            if self._warm:
+                return
+            synced_at = datetime.utcnow()
+            newest = db.query(func.max(GeofenceEvent.id)).scalar() or 0
+            loaded = self._read_states(db)
+            for vehicle_id, state in loaded.items():
+                if vehicle_id not in self._vehicles:
+                    self._store(vehicle_id, state)
+            self._event_id = self._seen_event_id = newest
+            self._synced_at = synced_at
+            self._checked_at = time.monotonic()
+            self._warm = True
+
+    def occupants(self, db: Session, area_id: int,
+                  since: Optional[datetime] = None) -> List[Occupant]:
+        """
+        Vehicles currently inside an area, optionally only those heard from since a time
+        """
+        self.ensure_fresh(db)
+        with self._lock:
+            found = []
+            for vehicle_id in self._occupants.get(area_id, ()):
+                state = self._vehicles[vehicle_id]
+                if since is not None and (state.timestamp is None or state.timestamp < since):
+                    continue
+                found.append(Occupant(vehicle_id, state.areas[area_id].entered_at, state.timestamp))
+            return found
+
+    def occupant_count(self, db: Session, area_id: int, since: Optional[datetime] = None) -> int:
+        if since is None:
+            self.ensure_fresh(db)
+            with self._lock:
+                return len(self._occupants.get(area_id, ()))
+        return len(self.occupants(db, area_id, since))
+
+    def vehicles_in(self, db: Session, area_ids: Iterable[int],
+                    since: Optional[datetime] = None) -> Set[int]:
+        """Distinct vehicles inside any of the given areas"""
+        vehicles = set()
+        for area_id in area_ids:
+            vehicles.update(occupant.vehicle_id for occupant in self.occupants(db, area_id, since))
+        return vehicles
+
+    def discard(self, vehicle_id: int):
+        with self._lock:
+            self._drop(vehicle_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "vehicles": len(self._vehicles),
+                "occupied_areas": len(self._occupants),
+                "warm": self._warm
+            }
+
+    def _drop(self, vehicle_id: int):
+        state = self._vehicles.pop(vehicle_id, None)
+        if state:
+            for area_id in state.areas:
+                self._leave(area_id, vehicle_id)
+
+    def _leave(self, area_id: int, vehicle_id: int):
+        occupants = self._occupants.get(area_id)
+        if occupants is not None:
+            occupants.discard(vehicle_id)
+            if not occupants:
+                del self._occupants[area_id]
+
+    def _store(self, vehicle_id: int, state: _VehicleAreas):
+        self._vehicles[vehicle_id] = state
+        for area_id in state.areas:
+            self._occupants.setdefault(area_id, set()).add(vehicle_id)
+
+    def _load(self, db: Session, vehicle_id: int) -> _VehicleAreas:
+        state = self._vehicles.get(vehicle_id)
+        if state is not None:
+            return state
+
+        state = self._read_states(db, {vehicle_id}).get(vehicle_id) or _VehicleAreas(None, {})
+        self._store(vehicle_id, state)
+        return state
+
+    def _read_states(self, db: Session, vehicle_ids: Optional[Set[int]] = None) -> Dict[int, _VehicleAreas]:
+        # Last event per vehicle and area tells whether the vehicle is still inside it
+        latest = db.query(
+            func.max(GeofenceEvent.id).label("id")
+        ).filter(GeofenceEvent.area_id.isnot(None))
+        if vehicle_ids is not None:
+            latest = latest.filter(GeofenceEvent.vehicle_id.in_(vehicle_ids))
+        latest = latest.group_by(GeofenceEvent.vehicle_id, GeofenceEvent.area_id).subquery()
+
+        events = db.query(GeofenceEvent).join(latest, GeofenceEvent.id == latest.c.id).all()
+
+        states: Dict[int, _VehicleAreas] = {}
+        for event in events:
+            state = states.setdefault(event.vehicle_id, _VehicleAreas(None, {}))
+            if state.timestamp is None or event.timestamp > state.timestamp:
+                state.timestamp = event.timestamp
+            if event.event_type == GeofenceEventType.EXIT:
+                continue
+            state.areas[event.area_id] = Membership(
+                entered_at=event.timestamp - timedelta(seconds=event.dwell_seconds or 0),
+                dwell_alerted=event.event_type == GeofenceEventType.DWELL_EXCEEDED
+            )
+
+        # For a fleet-wide load the newest committed fix, not the newest
+        # transition, is when the vehicle was last heard from
+        inside = [pk for pk, state in states.items() if state.areas]
+        if vehicle_ids is None and inside:
+            last_fixes = db.query(
+                VehicleLastPosition.vehicle_id, VehicleLastPosition.timestamp
+            ).filter(VehicleLastPosition.vehicle_id.in_(inside)).all()
+            for pk, timestamp in last_fixes:
+                if timestamp is not None and timestamp > states[pk].timestamp:
+                    states[pk].timestamp = timestamp
+
+        return states
+
+area_membership = MembershipTracker(
+    dwell_limit=settings.geofence_dwell_limit,
+    refresh_interval=settings.area_membership_refresh_interval
+)
+
+@event.listens_for(Session, "after_commit")
+def _membership_committed(session: Session):
+    touched = session.info.pop(TOUCHED_KEY, None)
+    for tracker, vehicle_ids in (touched or {}).items():
+        tracker.transaction_ended(vehicle_ids, committed=True)
+
+@event.listens_for(Session, "after_transaction_end")
+def _membership_rolled_back(session: Session, transaction):
+    # After a commit the set is already gone; anything left was rolled back or abandoned
+    if transaction.parent is None:
+        touched = session.info.pop(TOUCHED_KEY, None)
+        for tracker, vehicle_ids in (touched or {}).items():
+            tracker.transaction_ended(vehicle_ids, committed=False)
@@ -0,0 +1,237 @@
+"""
+Columnar export of gps_logs, alerts and routes for analytics
+
+Each complete UTC day is written as Parquet under a Hive-style layout that
+pandas, pyarrow.dataset, DuckDB and Spark read directly:
+
+    <root>/<table>/date=2026-10-01/vehicle_id=V001/part-0.parquet
+
+A day is read one vehicle at a time over a server-side cursor, in batches
+that become Arrow record batches written as they arrive, so memory use does
+not depend on the size of the day. Repeated strings (alert types) are
+dictionary-encoded in Arrow and every column is dictionary-encoded in
+Parquet where that is smaller. A _SUCCESS marker is written once all of a
+day's files are in place; runs are incremental and only export the days
+after the newest marked one, up to yesterday.
+
+The same gps_logs columns are available as an Arrow IPC stream for
+/api/gps/export?format=arrow.
+
+pyarrow is optional (requirements_full.txt); without it these functions
+raise RuntimeError.
+"""
+
+import io
+import logging
+import os
+import shutil
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+from sqlalchemy import func, select
+
+from database.database import engine
+from database.models import Alert, GPSLog, Route, Vehicle
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+SUCCESS_MARKER = "_SUCCESS"
+
+class ExportTable(NamedTuple):
+    name: str
+    model: type
+    time_column: str  # decides which day a row belongs to
+    columns: List[Tuple[str, str]]  # (column, type key for arrow_type)
+
+EXPORT_TABLES = {
+    table.name: table for table in (
+        ExportTable("gps_logs", GPSLog, "timestamp", [
+            ("id", "int64"), ("timestamp", "timestamp"), ("latitude", "float64"),
+            ("longitude", "float64"), ("altitude", "float64"), ("speed", "float64"),
+            ("heading", "float64"), ("accuracy", "float64"), ("is_idle", "bool"),
+            ("idle_duration", "int32")
+        ]),
+        ExportTable("alerts", Alert, "created_at", [
+            ("id", "int64"), ("area_id", "int64"), ("alert_type", "category"), ("message", "string"),
+            ("latitude", "float64"), ("longitude", "float64"), ("is_resolved", "bool"),
+            ("created_at", "timestamp"), ("resolved_at", "timestamp")
+        ]),
+        ExportTable("routes", Route, "start_time", [
+            ("id", "int64"), ("start_latitude", "float64"), ("start_longitude", "float64"),
+            ("end_latitude", "float64"), ("end_longitude", "float64"), ("start_time", "timestamp"),
+            ("end_time", "timestamp"), ("total_distance", "float64"), ("total_duration", "int32"),
+            ("average_speed", "float64"), ("max_speed", "float64"), ("idle_time", "int32"),
+            ("created_at", "timestamp")
+        ]),
+    )
+}
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Columnar export needs pyarrow (pip install -r requirements_full.txt)")
+
+def arrow_type(key: str):
+    return {
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "bool": pa.bool_(),
+        "string": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "timestamp": pa.timestamp("us")
+    }[key]
+
+def arrow_schema(columns: List[Tuple[str, str]]):
+    require_pyarrow()
+    return pa.schema([(name, arrow_type(key)) for name, key in columns])
+
+def record_batch(rows: List[tuple], schema) -> "pa.RecordBatch":
+    """Arrow batch from row tuples in schema column order"""
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=field.type.value_type).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+def day_directory(root: Path, table: ExportTable, day: date) -> Path:
+    return Path(root) / table.name / f"date={day.isoformat()}"
+
+def exported_days(root: Path, table: ExportTable) -> List[date]:
+    directory = Path(root) / table.name
+    if not directory.is_dir():
+        return []
+    days = []
+    for entry in directory.iterdir():
+        # Staging directories (.tmp) hold a marker just before they are swapped in
+        if entry.name.startswith("date=") and not entry.name.endswith(".tmp") \
+                and (entry / SUCCESS_MARKER).exists():
+            days.append(date.fromisoformat(entry.name[len("date="):]))
+    return sorted(days)
+
+def pending_days(conn, root: Path, table: ExportTable, until: date) -> List[date]:
+    """Days after the newest exported one (or from the oldest row) before until"""
+    done = exported_days(root, table)
+    if done:
+        first = done[-1] + timedelta(days=1)
+    else:
+        oldest = conn.execute(select(func.min(getattr(table.model, table.time_column)))).scalar()
+        if oldest is None:
+            return []
+        first = oldest.date()
+    return [first + timedelta(days=offset) for offset in range((until - first).days)]
+
+def export_day(conn, root: Path, table: ExportTable, day: date, vehicles: List[Tuple[int, str]],
+               batch_size: int = 10000, compression: str = "snappy") -> int:
+    """
+    Write one day of a table, one Parquet file per vehicle; the day's
+    directory is rebuilt in a temporary location and swapped in whole
+    """
+    require_pyarrow()
+    schema = arrow_schema(table.columns)
+    model = table.model
+    time_column = getattr(model, table.time_column)
+    start, end = day_bounds(day)
+
+    target = day_directory(root, table, day)
+    staging = target.with_name(target.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    rows_written = 0
+    for vehicle_pk, vehicle_id in vehicles:
+        result = conn.execute(
+            select(*(getattr(model, name) for name, _ in table.columns)).where(
+                model.vehicle_id == vehicle_pk,
+                time_column >= start,
+                time_column < end
+            ).order_by(time_column, model.id)
+        )
+        writer = None
+        try:
+            for rows in result.partitions(batch_size):
+                if writer is None:
+                    directory = staging / f"vehicle_id={quote(vehicle_id, safe='')}"
+                    directory.mkdir()
+                    writer = pq.ParquetWriter(
+                        str(directory / "part-0.parquet"), schema,
+                        compression=compression, use_dictionary=True
+                    )
+                writer.write_batch(record_batch(rows, schema))
+                rows_written += len(rows)
+        finally:
+            result.close()
+            if writer is not None:
+                writer.close()
+
+    (staging / SUCCESS_MARKER).touch()
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    return rows_written
+
+def export_pending(root: Path, tables: Iterable[str] = tuple(EXPORT_TABLES), until: Optional[date] = None,
+                   days: Optional[List[date]] = None, batch_size: int = 10000,
+                   compression: str = "snappy") -> Dict[str, Dict[str, int]]:
+    """
+    Export every complete day not yet exported (or exactly the given days)
+    for each table; returns rows written per table and day
+    """
+    require_pyarrow()
+    until = until or datetime.utcnow().date()
+    summary = {}
+    with engine.connect() as conn:
+        vehicles = conn.execute(select(Vehicle.id, Vehicle.vehicle_id).order_by(Vehicle.vehicle_id)).all()
+        conn = conn.execution_options(stream_results=True, yield_per=batch_size)
+        for name in tables:
+            table = EXPORT_TABLES[name]
+            summary[name] = {}
+            for day in days or pending_days(conn, root, table, until):
+                rows = export_day(conn, root, table, day, vehicles, batch_size, compression)
+                summary[name][day.isoformat()] = rows
+                logging.info(f"Exported {rows} {name} rows for {day}")
+    return summary
+
+GPS_STREAM_COLUMNS = [
+    ("id", "int64"), ("vehicle_id", "category"), ("timestamp", "timestamp"),
+    ("latitude", "float64"), ("longitude", "float64"), ("altitude", "float64"),
+    ("speed", "float64"), ("heading", "float64"), ("accuracy", "float64"),
+    ("is_idle", "bool"), ("idle_duration", "int32")
+]
+
+def arrow_stream(rows: Iterable[tuple], batch_size: int = 10000) -> Iterator[bytes]:
+    """
+    Arrow IPC stream of services.export.iter_gps_rows tuples, one record
+    batch per batch_size rows
+    """
+    schema = arrow_schema(GPS_STREAM_COLUMNS)
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            writer.write_batch(record_batch(batch, schema))
+            batch = []
+            yield drain()
+    if batch:
+        writer.write_batch(record_batch(batch, schema))
+    writer.close()
+    yield drain()
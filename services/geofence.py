@@ -0,0 +1,308 @@
+"""
+Geofence engine
+
+Compiles active areas into in-memory geometry once and keeps them until the
+areas change. Changes are tracked by the "areas" row in cache_versions, which
+area_api bumps in the same transaction as the edit, so every worker can
+detect a stale copy with a single primary-key lookup.
+"""
+
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from database.models import Area, AreaShape, AreaType, CacheVersion
+from services.geometry import (
+    LocalProjection, PolygonEdges, PolygonSet,
+    distance_to_segments, haversine, points_in_polygon
+)
+from services.spatial_index import STRTree
+
+AREAS_VERSION_KEY = "areas"
+
+class CompiledArea:
+    """
+    An active area with its coordinates parsed once. Circle radius and buffer
+    distance are in meters; distances are measured in a local projection
+    centred on the area.
+    """
+
+    __slots__ = (
+        "id", "name", "area_type", "shape", "buffer_distance", "bbox",
+        "center", "radius", "bounds", "points", "edges",
+        "projection", "rect_xy", "segments"
+    )
+
+    def __init__(self, area_id: int, name: str, area_type: AreaType, shape: AreaShape,
+                 coordinates: dict, buffer_distance: Optional[float] = 0.0):
+        self.id = area_id
+        self.name = name
+        self.area_type = area_type
+        self.shape = AreaShape(shape)
+        if buffer_distance is None:
+            buffer_distance = settings.default_area_buffer
+        self.buffer_distance = max(float(buffer_distance), 0.0)
+        self.center = None
+        self.radius = 0.0
+        self.bounds = None
+        self.points = None
+        self.edges = None
+        self.rect_xy = None
+        self.segments = None
+
+        if self.shape == AreaShape.CIRCLE:
+            center = coordinates.get("center", {})
+            self.center = (float(center.get("lat", 0)), float(center.get("lng", 0)))
+            self.radius = float(coordinates.get("radius", 0))
+            self.projection = LocalProjection(*self.center)
+            self.bbox = self._expand(self.center + self.center, self.radius + self.buffer_distance)
+
+        elif self.shape == AreaShape.RECTANGLE:
+            bounds = coordinates.get("bounds", {})
+            self.bounds = (
+                float(bounds.get("south", 0)), float(bounds.get("west", 0)),
+                float(bounds.get("north", 0)), float(bounds.get("east", 0))
+            )
+            south, west, north, east = self.bounds
+            self.projection = LocalProjection((south + north) / 2, (west + east) / 2)
+            min_x, min_y = self.projection.project(south, west)
+            max_x, max_y = self.projection.project(north, east)
+            self.rect_xy = (min_x, min_y, max_x, max_y)
+            self.bbox = self._expand(self.bounds, self.buffer_distance)
+
+        else:
+            self.points = [
+                (float(point.get("lat", 0)), float(point.get("lng", 0)))
+                for point in coordinates.get("points", [])
+            ]
+            self.edges = PolygonEdges(self.points)
+            if self.points:
+                lats = [lat for lat, _ in self.points]
+                lons = [lon for _, lon in self.points]
+                outline = (min(lats), min(lons), max(lats), max(lons))
+            else:
+                outline = (0.0, 0.0, 0.0, 0.0)
+            self.projection = LocalProjection((outline[0] + outline[2]) / 2, (outline[1] + outline[3]) / 2)
+            x0, y0 = self.projection.project(self.edges.lat0, self.edges.lon0)
+            x1, y1 = self.projection.project(self.edges.lat1, self.edges.lon1)
+            self.segments = (x0, y0, x1, y1)
+            self.bbox = self._expand(outline, self.buffer_distance)
+
+    @classmethod
+    def from_model(cls, area: Area) -> "CompiledArea":
+        return cls(area.id, area.name, area.area_type, area.shape, area.coordinates, area.buffer_distance)
+
+    def bbox_contains(self, lat: float, lon: float) -> bool:
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+
+    def contains(self, lat: float, lon: float) -> bool:
+        if not self.bbox_contains(lat, lon):
+            return False
+
+        if self.shape == AreaShape.CIRCLE:
+            reach = self.radius + self.buffer_distance
+            x, y = self.projection.project(lat, lon)
+            distance = math.hypot(x, y)
+            if abs(distance - reach) <= self._boundary_band(reach):
+                distance = float(haversine(lat, lon, *self.center))
+            return distance <= reach
+
+        if self.shape == AreaShape.RECTANGLE:
+            south, west, north, east = self.bounds
+            if south <= lat <= north and west <= lon <= east:
+                return True
+            if self.buffer_distance <= 0:
+                return False
+            min_x, min_y, max_x, max_y = self.rect_xy
+            x, y = self.projection.project(lat, lon)
+            return math.hypot(max(min_x - x, 0.0, x - max_x), max(min_y - y, 0.0, y - max_y)) <= self.buffer_distance
+
+        if points_in_polygon(self.edges, lat, lon)[0]:
+            return True
+        if self.buffer_distance <= 0:
+            return False
+        x, y = self.projection.project(lat, lon)
+        return bool(distance_to_segments(x, y, *self.segments)[0] <= self.buffer_distance)
+
+    def contains_many(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Vectorized contains() over arrays of points"""
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        mask = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        if not mask.any():
+            return mask
+
+        candidates = np.flatnonzero(mask)
+        lat = lats[candidates]
+        lon = lons[candidates]
+
+        if self.shape == AreaShape.CIRCLE:
+            reach = self.radius + self.buffer_distance
+            x, y = self.projection.project(lat, lon)
+            distance = np.hypot(x, y)
+            # Only points near the edge pay for the exact great-circle distance
+            near_edge = np.abs(distance - reach) <= self._boundary_band(reach)
+            if near_edge.any():
+                distance[near_edge] = haversine(lat[near_edge], lon[near_edge], *self.center)
+            mask[candidates] = distance <= reach
+            return mask
+
+        if self.shape == AreaShape.RECTANGLE:
+            south, west, north, east = self.bounds
+            inside = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        else:
+            inside = points_in_polygon(self.edges, lat, lon)
+
+        if self.buffer_distance > 0 and not inside.all():
+            outside = np.flatnonzero(~inside)
+            x, y = self.projection.project(lat[outside], lon[outside])
+            if self.shape == AreaShape.RECTANGLE:
+                min_x, min_y, max_x, max_y = self.rect_xy
+                dx = np.maximum(np.maximum(min_x - x, x - max_x), 0.0)
+                dy = np.maximum(np.maximum(min_y - y, y - max_y), 0.0)
+                inside[outside] = np.hypot(dx, dy) <= self.buffer_distance
+            else:
+                inside[outside] = distance_to_segments(x, y, *self.segments) <= self.buffer_distance
+
+        mask[candidates] = inside
+        return mask
+
+    def _expand(self, box: tuple, meters: float) -> tuple:
+        dlat, dlon = self.projection.degrees_for(meters)
+        return (box[0] - dlat, box[1] - dlon, box[2] + dlat, box[3] + dlon)
+
+    @staticmethod
+    def _boundary_band(reach: float) -> float:
+        # Projection error is far below 0.1% at geofence scale
+        return reach * 0.001 + 0.5
+
+class GeofenceEngine:
+    def __init__(self, version_check_interval: float = 1.0):
+        self.version_check_interval = version_check_interval
+        self.version: Optional[int] = None
+        self.areas: Tuple[CompiledArea, ...] = ()
+        self.by_id: Dict[int, CompiledArea] = {}
+        self.index = STRTree([])
+        self.loaded_at: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def ensure_fresh(self, db: Session):
+        """
+        Reload compiled areas if another process (or this one) changed them
+        """
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < self.version_check_interval:
+            return
+
+        with self._lock:
+            if self.version is not None and now - self._checked_at < self.version_check_interval:
+                return
+
+            current = get_version(db, AREAS_VERSION_KEY)
+            if current != self.version:
+                self._reload(db, current)
+            self._checked_at = now
+
+    def invalidate(self):
+        """Force the next ensure_fresh() to re-read the version counter"""
+        self._checked_at = 0.0
+
+    def areas_containing(self, db: Session, lat: float, lon: float) -> List[CompiledArea]:
+        self.ensure_fresh(db)
+        return self._match_point(lat, lon)
+
+    def areas_containing_many(self, db: Session, lats, lons) -> List[List[CompiledArea]]:
+        """
+        Areas containing each of many points, testing each candidate area once for all points
+        """
+        self.ensure_fresh(db)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        matches = [[] for _ in range(lats.shape[0])]
+        if lats.shape[0] == 0:
+            return matches
+
+        candidates = self.index.query_bbox((lats.min(), lons.min(), lats.max(), lons.max()))
+        if len(candidates) > 4 * lats.shape[0]:
+            # Points are spread out; per-point index lookups touch fewer areas
+            return [self._match_point(lat, lon) for lat, lon in zip(lats.tolist(), lons.tolist())]
+
+        for area in candidates:
+            for position in np.flatnonzero(area.contains_many(lats, lons)):
+                matches[position].append(area)
+        return matches
+
+    def _match_point(self, lat: float, lon: float) -> List[CompiledArea]:
+        # The index prunes to areas whose bounding box holds the point
+        candidates = self.index.query_point(lat, lon)
+        polygons = [area for area in candidates if area.shape == AreaShape.POLYGON]
+        matched = [area for area in candidates if area.shape != AreaShape.POLYGON and area.contains(lat, lon)]
+
+        if len(polygons) == 1:
+            if polygons[0].contains(lat, lon):
+                matched.append(polygons[0])
+        elif polygons:
+            inside = PolygonSet([area.edges for area in polygons]).contains_point(lat, lon)
+            # Polygons missed by the ray cast may still be within their buffer
+            matched.extend(
+                area for area, hit in zip(polygons, inside)
+                if hit or (area.buffer_distance > 0 and area.contains(lat, lon))
+            )
+        return matched
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "areas": len(self.areas),
+            "index_height": self.index.height,
+            "loaded_seconds_ago": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else None
+        }
+
+    def _reload(self, db: Session, version: int):
+        areas = db.query(Area).filter(Area.is_active == True).all()
+
+        compiled = []
+        for area in areas:
+            try:
+                compiled.append(CompiledArea.from_model(area))
+            except Exception as e:
+                logging.error(f"Skipping area {area.id} with invalid coordinates: {e}")
+
+        # Swap in whole objects so readers never see a half-built index
+        self.index = STRTree([(area.bbox, area) for area in compiled])
+        self.areas = tuple(compiled)
+        self.by_id = {area.id: area for area in compiled}
+        self.version = version
+        self.loaded_at = time.monotonic()
+        logging.info(f"Geofence engine loaded {len(compiled)} areas (version {version})")
+
+def get_version(db: Session, name: str) -> int:
+    row = db.query(CacheVersion.version).filter(CacheVersion.name == name).first()
+    return row[0] if row else 0
+
+def bump_version(db: Session, name: str):
+    """
+    Increment a cache version inside the caller's transaction
+    """
+    updated = db.query(CacheVersion).filter(CacheVersion.name == name).update(
+        {CacheVersion.version: CacheVersion.version + 1},
+        synchronize_session=False
+    )
+    if not updated:
+        db.add(CacheVersion(name=name, version=1))
+
+def bump_area_version(db: Session):
+    """
+    Mark compiled areas stale; call before committing an area change and
+    call geofence_engine.invalidate() after the commit
+    """
+    bump_version(db, AREAS_VERSION_KEY)
+
+geofence_engine = GeofenceEngine(version_check_interval=settings.geofence_version_check_interval)
@@ -0,0 +1,152 @@
+"""
+Vectorized geometry kernels for geofencing
+
+Polygons are compiled into edge arrays once; containment is an even-odd
+ray-casting test evaluated with NumPy for many points against one polygon,
+or one point against many polygons, in a single call. Distances use a
+per-area local equirectangular projection, with haversine available where
+exact great-circle distance matters.
+"""
+
+import math
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# Cap on points x edges evaluated at once, keeps temporary arrays small
+MAX_CELLS_PER_CHUNK = 1_000_000
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = EARTH_RADIUS_M * math.pi / 180
+
+class LocalProjection:
+    """
+    Equirectangular projection to meters around an origin; accurate to well
+    under 0.1% within a few kilometres, which covers any single geofence
+    """
+
+    __slots__ = ("lat0", "lon0", "meters_per_lon")
+
+    def __init__(self, lat0: float, lon0: float):
+        self.lat0 = lat0
+        self.lon0 = lon0
+        self.meters_per_lon = METERS_PER_DEGREE * math.cos(math.radians(lat0))
+
+    def project(self, lat, lon):
+        """(x, y) in meters east and north of the origin; accepts scalars or arrays"""
+        return (lon - self.lon0) * self.meters_per_lon, (lat - self.lat0) * METERS_PER_DEGREE
+
+    def degrees_for(self, meters: float) -> Tuple[float, float]:
+        """Latitude and longitude spans covering the given distance"""
+        return meters / METERS_PER_DEGREE, meters / max(self.meters_per_lon, 1e-9)
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters; accepts scalars or arrays"""
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def distance_to_segments(xs, ys, x0, y0, x1, y1) -> np.ndarray:
+    """
+    Distance from each point to the nearest of the given segments, all in projected meters
+    """
+    xs = np.atleast_1d(np.asarray(xs, dtype=np.float64))
+    ys = np.atleast_1d(np.asarray(ys, dtype=np.float64))
+    nearest = np.full(xs.shape[0], np.inf)
+    if x0.size == 0 or xs.size == 0:
+        return nearest
+
+    dx = x1 - x0
+    dy = y1 - y0
+    length_sq = dx * dx + dy * dy
+    safe_length_sq = np.where(length_sq > 0, length_sq, 1.0)
+
+    chunk = max(1, MAX_CELLS_PER_CHUNK // x0.size)
+    for start in range(0, xs.shape[0], chunk):
+        px = xs[start:start + chunk, None]
+        py = ys[start:start + chunk, None]
+
+        # Clamp the projection of each point onto each segment to the segment ends
+        t = np.clip(((px - x0) * dx + (py - y0) * dy) / safe_length_sq, 0.0, 1.0)
+        t = np.where(length_sq > 0, t, 0.0)
+        distance = np.hypot(px - (x0 + t * dx), py - (y0 + t * dy))
+
+        nearest[start:start + chunk] = distance.min(axis=1)
+
+    return nearest
+
+class PolygonEdges:
+    """Edge arrays for one polygon, (lat, lon) vertices, closed implicitly"""
+
+    __slots__ = ("lat0", "lon0", "lat1", "lon1", "lon_per_lat")
+
+    def __init__(self, points: Sequence[Tuple[float, float]]):
+        vertices = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        following = np.roll(vertices, -1, axis=0)
+
+        self.lat0 = vertices[:, 0]
+        self.lon0 = vertices[:, 1]
+        self.lat1 = following[:, 0]
+        self.lon1 = following[:, 1]
+
+        # Inverse slope of each edge; horizontal edges never straddle a ray so 0 is safe
+        dlat = self.lat1 - self.lat0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.lon_per_lat = np.where(dlat != 0, (self.lon1 - self.lon0) / dlat, 0.0)
+
+    def __len__(self) -> int:
+        return len(self.lat0)
+
+def points_in_polygon(edges: PolygonEdges, lats, lons) -> np.ndarray:
+    """
+    Test many points against one polygon; returns a boolean array
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    inside = np.zeros(lats.shape[0], dtype=bool)
+    if len(edges) < 3 or lats.size == 0:
+        return inside
+
+    chunk = max(1, MAX_CELLS_PER_CHUNK // len(edges))
+    for start in range(0, lats.shape[0], chunk):
+        lat = lats[start:start + chunk, None]
+        lon = lons[start:start + chunk, None]
+
+        straddles = (edges.lat0 > lat) != (edges.lat1 > lat)
+        crossing_lon = edges.lon0 + (lat - edges.lat0) * edges.lon_per_lat
+        crossings = straddles & (lon < crossing_lon)
+
+        inside[start:start + chunk] = (np.count_nonzero(crossings, axis=1) & 1).astype(bool)
+
+    return inside
+
+class PolygonSet:
+    """Edges of many polygons packed into flat arrays for one-point queries"""
+
+    def __init__(self, polygons: List[PolygonEdges]):
+        self.count = len(polygons)
+        if not polygons:
+            empty = np.zeros(0)
+            self.lat0 = self.lon0 = self.lat1 = self.lon_per_lat = empty
+            self.owner = np.zeros(0, dtype=np.intp)
+            return
+
+        self.lat0 = np.concatenate([edges.lat0 for edges in polygons])
+        self.lon0 = np.concatenate([edges.lon0 for edges in polygons])
+        self.lat1 = np.concatenate([edges.lat1 for edges in polygons])
+        self.lon_per_lat = np.concatenate([edges.lon_per_lat for edges in polygons])
+        self.owner = np.repeat(np.arange(len(polygons)), [len(edges) for edges in polygons])
+
+    def contains_point(self, lat: float, lon: float) -> np.ndarray:
+        """
+        Test one point against every polygon; returns a boolean array per polygon
+        """
+        if self.count == 0:
+            return np.zeros(0, dtype=bool)
+
+        straddles = (self.lat0 > lat) != (self.lat1 > lat)
+        crossing_lon = self.lon0 + (lat - self.lat0) * self.lon_per_lat
+        crossings = straddles & (lon < crossing_lon)
+
+        counts = np.bincount(self.owner[crossings], minlength=self.count)
+        return (counts & 1).astype(bool)
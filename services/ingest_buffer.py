@@ -0,0 +1,203 @@
+"""
+Write-behind buffer for GPS ingestion
+
+Validated fixes are queued in memory and a background flusher commits them
+in groups, either when a batch fills up or when the flush deadline passes.
+On shutdown the queue is drained; fixes that could not be flushed before
+the drain timeout are dropped, counted in the metrics, and their waiting
+commit-mode requests fail with IngestBufferClosed.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, List, Optional
+
+DURABILITY_ENQUEUE = "enqueue"  # acknowledge as soon as the fix is queued
+DURABILITY_COMMIT = "commit"    # acknowledge after the group commit succeeds
+
+class IngestBufferFull(Exception):
+    """Raised when the queue is at capacity and cannot accept more fixes"""
+
+class IngestBufferClosed(Exception):
+    """Raised when fixes are submitted while the buffer is not running"""
+
+class IngestBuffer:
+    def __init__(
+        self,
+        flush_handler: Callable[[List[dict]], None],
+        max_queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval_ms: int = 50,
+        durability: str = DURABILITY_ENQUEUE
+    ):
+        if durability not in (DURABILITY_ENQUEUE, DURABILITY_COMMIT):
+            raise ValueError(f"Unknown durability mode: {durability}")
+
+        self.flush_handler = flush_handler
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.durability = durability
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Future] = None  # group commit in progress
+        self._collecting: list = []  # batch taken off the queue, not yet handed to a flush
+        self._accepting = False
+
+        # Metrics
+        self.enqueued = 0
+        self.rejected = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.dropped_rows = 0
+        self.flush_count = 0
+        self.last_flush_size = 0
+        self.last_flush_ms = 0.0
+        self.max_depth_seen = 0
+
+    @property
+    def running(self) -> bool:
+        return self._accepting
+
+    async def start(self):
+        """Create the queue and start the background flusher"""
+        if self._accepting:
+            return
+
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._accepting = True
+        self._flusher = asyncio.create_task(self._run())
+        logging.info(
+            f"Write-behind ingest started (batch={self.batch_size}, "
+            f"interval={self.flush_interval * 1000:.0f}ms, durability={self.durability})"
+        )
+
+    async def submit(self, row: dict):
+        """
+        Queue a GPS log row. In commit mode this waits for the group commit
+        """
+        if not self._accepting:
+            raise IngestBufferClosed("Write-behind ingest is not running")
+
+        future = None
+        if self.durability == DURABILITY_COMMIT:
+            future = asyncio.get_running_loop().create_future()
+
+        try:
+            self._queue.put_nowait((row, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise IngestBufferFull(f"Ingest queue is full ({self.max_queue_size} fixes)")
+
+        self.enqueued += 1
+        self.max_depth_seen = max(self.max_depth_seen, self._queue.qsize())
+
+        if future is not None:
+            await future
+
+    async def drain(self, timeout: float = 10.0):
+        """
+        Stop accepting fixes and flush everything still queued
+        """
+        if not self._accepting:
+            return
+
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        self._flusher.cancel()
+        try:
+            await self._flusher
+        except asyncio.CancelledError:
+            pass
+        # A group commit already running finishes and resolves its own fixes
+        if self._flushing is not None:
+            await asyncio.wait([self._flushing])
+
+        leftover = self._collecting
+        self._collecting = []
+        for _ in leftover:
+            self._queue.task_done()
+        while not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+            self._queue.task_done()
+        if leftover:
+            self.dropped_rows += len(leftover)
+            logging.error(f"Write-behind drain timed out; dropped {len(leftover)} queued fixes")
+            for _, future in leftover:
+                if future is not None and not future.done():
+                    future.set_exception(IngestBufferClosed("Write-behind ingest stopped before the fix was stored"))
+
+        logging.info(f"Write-behind ingest drained ({self.flushed_rows} rows flushed in total)")
+
+    def metrics(self) -> dict:
+        """Queue depth and throughput counters"""
+        return {
+            "running": self._accepting,
+            "durability": self.durability,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_capacity": self.max_queue_size,
+            "max_depth_seen": self.max_depth_seen,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "flushed_rows": self.flushed_rows,
+            "failed_rows": self.failed_rows,
+            "dropped_rows": self.dropped_rows,
+            "flush_count": self.flush_count,
+            "last_flush_size": self.last_flush_size,
+            "last_flush_ms": round(self.last_flush_ms, 2)
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = self._collecting = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+
+            # Collect until the batch is full or the deadline passes
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            self._collecting = []
+            # Shielded so that cancelling the flusher never abandons a commit halfway
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _flush(self, batch: list):
+        rows = [row for row, _ in batch]
+        started = time.perf_counter()
+        error = None
+
+        try:
+            # Database work is synchronous; keep it off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self.flush_handler, rows)
+            self.flushed_rows += len(rows)
+        except Exception as e:
+            error = e
+            self.failed_rows += len(rows)
+            logging.error(f"Write-behind flush of {len(rows)} fixes failed: {e}")
+
+        self.flush_count += 1
+        self.last_flush_size = len(rows)
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+        for _, future in batch:
+            if future is not None and not future.done():
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+            self._queue.task_done()
@@ -0,0 +1,263 @@
+"""
+Live map feed over WebSocket
+
+One broadcaster task per process wakes every LIVE_FEED_INTERVAL seconds,
+collects the vehicles whose latest position changed since the previous tick
+(coalesced to one entry per vehicle) and the alerts that reached the alert
+bus since then, and fans them out to the connected clients. Each client subscribes to a map
+viewport and only receives vehicles inside it, plus removals for vehicles
+that left it. A client showing server-side clusters subscribes with
+"vehicles": false and only receives alerts.
+
+Clients that cannot keep up have their pending frames dropped and get a
+full snapshot on the next tick; a client that keeps falling behind is
+disconnected.
+"""
+
+import asyncio
+import json
+import logging
+from typing import List, Optional, Set, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from database.database import SessionLocal
+from services.alert_bus import alert_bus
+from services.position_store import LatestPosition, position_store
+
+BBox = Tuple[float, float, float, float]  # (south, west, north, east)
+
+def position_payload(position: LatestPosition) -> dict:
+    """Same fields as the VehicleLocation schema"""
+    return {
+        "vehicle_id": position.vehicle_id,
+        "latitude": position.latitude,
+        "longitude": position.longitude,
+        "speed": position.speed,
+        "heading": position.heading,
+        "timestamp": position.timestamp.isoformat(),
+        "status": position.status.value,
+        "is_idle": position.is_idle
+    }
+
+def parse_bbox(value) -> Optional[BBox]:
+    if not value:
+        return None
+    south, west, north, east = (float(part) for part in value)
+    return (min(south, north), west, max(south, north), east)
+
+def in_bbox(bbox: Optional[BBox], position: LatestPosition) -> bool:
+    if bbox is None:
+        return True
+    south, west, north, east = bbox
+    if not south <= position.latitude <= north:
+        return False
+    if west <= east:
+        return west <= position.longitude <= east
+    # Viewport crossing the antimeridian
+    return position.longitude >= west or position.longitude <= east
+
+class LiveClient:
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.bbox: Optional[BBox] = None
+        self.vehicles = True
+        self.visible: Set[int] = set()
+        self.needs_snapshot = True
+        self.drops = 0
+
+    def offer(self, frame: str) -> bool:
+        """Queue a frame without waiting; False when the client is behind"""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def discard_pending(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+class LiveFeed:
+    def __init__(self, interval: float = 1.0, client_queue_size: int = 8, max_drops: int = 3):
+        self.interval = interval
+        self.client_queue_size = client_queue_size
+        self.max_drops = max_drops
+        self._clients: Set[LiveClient] = set()
+        self._revision = 0
+        self._alert_cursor: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self.frames_sent = 0
+        self.clients_dropped = 0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def serve(self, websocket: WebSocket):
+        """
+        Run one client connection until it closes
+        """
+        await websocket.accept()
+        client = LiveClient(websocket, self.client_queue_size)
+        self._clients.add(client)
+        sender = asyncio.create_task(self._send_loop(client))
+        try:
+            while True:
+                message = json.loads(await websocket.receive_text())
+                if message.get("type") == "subscribe":
+                    client.bbox = parse_bbox(message.get("bbox"))
+                    client.vehicles = bool(message.get("vehicles", True))
+                    client.needs_snapshot = True
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        except (ValueError, TypeError) as e:
+            logging.warning(f"Closing live feed client after bad message: {e}")
+            await websocket.close(code=1003)
+        finally:
+            self._clients.discard(client)
+            sender.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "revision": self._revision,
+            "frames_sent": self.frames_sent,
+            "clients_dropped": self.clients_dropped
+        }
+
+    async def _send_loop(self, client: LiveClient):
+        try:
+            while True:
+                frame = await client.queue.get()
+                await client.websocket.send_text(frame)
+                self.frames_sent += 1
+                client.drops = 0
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Connection went away; serve() notices on its next receive
+            self._clients.discard(client)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self._clients:
+                # Nobody is watching; new clients start from the current alerts
+                self._alert_cursor = None
+                continue
+            try:
+                changes, alerts = await loop.run_in_executor(None, self._collect)
+                self._broadcast(changes, alerts)
+            except Exception as e:
+                logging.error(f"Live feed tick failed: {e}")
+
+    def _collect(self) -> Tuple[List[LatestPosition], List[dict]]:
+        db = SessionLocal()
+        try:
+            position_store.ensure_fresh(db)
+            changes, self._revision = position_store.changes_since(self._revision)
+            return changes, self._new_alerts(db)
+        finally:
+            db.close()
+
+    def _new_alerts(self, db: Session) -> List[dict]:
+        alert_bus.poll(db)
+        if self._alert_cursor is None:
+            # Start from now; clients load earlier alerts over HTTP
+            self._alert_cursor = alert_bus.last_id or 0
+            return []
+
+        alerts = alert_bus.since(self._alert_cursor)
+        if alerts:
+            self._alert_cursor = alerts[-1]["id"]
+        return alerts
+
+    def _broadcast(self, changes: List[LatestPosition], alerts: List[dict]):
+        snapshot = None
+        for client in list(self._clients):
+            if client.needs_snapshot:
+                if snapshot is None:
+                    snapshot = position_store.snapshot()
+                frame = self._snapshot_frame(client, snapshot, alerts)
+            else:
+                frame = self._delta_frame(client, changes, alerts)
+                if frame is None:
+                    continue
+
+            if client.offer(frame):
+                continue
+
+            # Slow consumer: stale frames are worthless, resync it with a snapshot
+            client.discard_pending()
+            client.needs_snapshot = True
+            client.drops += 1
+            if client.drops >= self.max_drops:
+                self._disconnect(client)
+
+    def _snapshot_frame(self, client: LiveClient, snapshot: List[LatestPosition], alerts: List[dict]) -> str:
+        visible = [
+            position for position in snapshot
+            if client.vehicles and in_bbox(client.bbox, position)
+        ]
+        client.visible = {position.vehicle_pk for position in visible}
+        client.needs_snapshot = False
+        return json.dumps({
+            "type": "snapshot",
+            "revision": self._revision,
+            "vehicles": [position_payload(position) for position in visible],
+            "alerts": alerts
+        })
+
+    def _delta_frame(self, client: LiveClient, changes: List[LatestPosition], alerts: List[dict]) -> Optional[str]:
+        vehicles = []
+        removed = []
+        for position in (changes if client.vehicles else ()):
+            if in_bbox(client.bbox, position):
+                client.visible.add(position.vehicle_pk)
+                vehicles.append(position_payload(position))
+            elif position.vehicle_pk in client.visible:
+                client.visible.discard(position.vehicle_pk)
+                removed.append(position.vehicle_id)
+
+        if not vehicles and not removed and not alerts:
+            return None
+        return json.dumps({
+            "type": "delta",
+            "revision": self._revision,
+            "vehicles": vehicles,
+            "removed": removed,
+            "alerts": alerts
+        })
+
+    def _disconnect(self, client: LiveClient):
+        self._clients.discard(client)
+        self.clients_dropped += 1
+        logging.warning("Dropping live feed client that cannot keep up")
+        asyncio.create_task(self._close(client.websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+live_feed = LiveFeed(
+    interval=settings.live_feed_interval,
+    client_queue_size=settings.live_feed_client_queue_size,
+    max_drops=settings.live_feed_max_drops
+)
@@ -0,0 +1,196 @@
+"""
+In-memory per-vehicle live state
+
+Keeps the last fix and idle bookkeeping for each vehicle so idle detection
+does not have to read gps_logs on every fix. State is rebuilt lazily from the
+vehicle_last_position row the first time a vehicle is seen by this process.
+
+update() works on a copy held in the session until its transaction commits,
+so fixes later in the same transaction chain onto it while a rollback leaves
+the committed state alone. The state is per worker process and is not
+refreshed from other workers: a worker only sees fixes it handled itself
+after it first loaded the vehicle. A vehicle whose fixes alternate between
+workers can therefore be measured from a stale idle start, so ingest of a
+vehicle should stay on one worker where idle times matter.
+"""
+
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from database.models import VehicleLastPosition
+
+IDLE_SPEED_THRESHOLD = 1.0  # km/h
+# Session.info key of the states the session's open transaction changed, applied once it commits
+STAGED_KEY = "live_state_staged"
+
+@dataclass
+class VehicleLiveState:
+    vehicle_id: int
+    timestamp: datetime
+    latitude: float
+    longitude: float
+    speed: Optional[float] = None
+    heading: Optional[float] = None
+    idle_since: Optional[datetime] = None
+    idle_alerted: bool = False
+
+    @property
+    def is_stationary(self) -> bool:
+        return self.speed is not None and self.speed < IDLE_SPEED_THRESHOLD
+
+    def idle_duration(self, at: Optional[datetime] = None) -> int:
+        if self.idle_since is None:
+            return 0
+        return int(((at or self.timestamp) - self.idle_since).total_seconds())
+
+class IdleUpdate(NamedTuple):
+    is_idle: bool
+    idle_duration: int
+    alert_due: bool  # idle duration crossed the timeout on this fix
+
+def as_naive_utc(value: datetime) -> datetime:
+    """Normalize timestamps so device (aware) and database (naive UTC) values compare"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class LiveStateStore:
+    def __init__(self, idle_timeout: int = 300):
+        self.idle_timeout = idle_timeout
+        self._states: Dict[int, VehicleLiveState] = {}
+
+    def get(self, db: Session, vehicle_id: int) -> Optional[VehicleLiveState]:
+        """
+        Get the live state for a vehicle primary key, as changed by the session's
+        open transaction, rebuilding it from the database on a miss
+        """
+        state = db.info.get(STAGED_KEY, {}).get(self, {}).get(vehicle_id) or self._states.get(vehicle_id)
+        if state is None:
+            self.load_many(db, [vehicle_id])
+            state = self._states.get(vehicle_id)
+        return state
+
+    def load_many(self, db: Session, vehicle_ids: Iterable[int]):
+        """
+        Rebuild state for every vehicle not yet in memory with one query
+        """
+        missing = {vehicle_id for vehicle_id in vehicle_ids if vehicle_id not in self._states}
+        if not missing:
+            return
+
+        logs = db.query(VehicleLastPosition).filter(
+            VehicleLastPosition.vehicle_id.in_(missing)
+        ).all()
+
+        for log in logs:
+            timestamp = as_naive_utc(log.timestamp)
+            state = VehicleLiveState(
+                vehicle_id=log.vehicle_id,
+                timestamp=timestamp,
+                latitude=log.latitude,
+                longitude=log.longitude,
+                speed=log.speed,
+                heading=log.heading
+            )
+            if state.is_stationary:
+                state.idle_since = timestamp - timedelta(seconds=log.idle_duration or 0)
+                state.idle_alerted = bool(log.is_idle)
+            self._states[log.vehicle_id] = state
+
+    def update(self, db: Session, vehicle_id: int, fix, defer: bool = True) -> IdleUpdate:
+        """
+        Apply a fix (anything with latitude, longitude, speed, heading and timestamp)
+        and return its idle status, measured from real timestamps. The new state
+        becomes current when the session commits, or at once without defer.
+        """
+        timestamp = as_naive_utc(fix.timestamp)
+        stationary = fix.speed is not None and fix.speed < IDLE_SPEED_THRESHOLD
+        state = self.get(db, vehicle_id)
+
+        if state is None:
+            state = VehicleLiveState(
+                vehicle_id=vehicle_id,
+                timestamp=timestamp,
+                latitude=fix.latitude,
+                longitude=fix.longitude,
+                speed=fix.speed,
+                heading=fix.heading,
+                idle_since=timestamp if stationary else None
+            )
+            self._stage(db, state, defer)
+            return IdleUpdate(False, 0, False)
+
+        if timestamp < state.timestamp:
+            # Late fix: report it against the current idle period but leave state alone
+            if stationary and state.idle_since is not None and timestamp >= state.idle_since:
+                duration = state.idle_duration(timestamp)
+                return IdleUpdate(duration >= self.idle_timeout, duration, False)
+            return IdleUpdate(False, 0, False)
+
+        state = replace(state)
+        if stationary:
+            if state.idle_since is None:
+                state.idle_since = timestamp
+                state.idle_alerted = False
+        else:
+            state.idle_since = None
+            state.idle_alerted = False
+
+        state.timestamp = timestamp
+        state.latitude = fix.latitude
+        state.longitude = fix.longitude
+        state.speed = fix.speed
+        state.heading = fix.heading
+
+        duration = state.idle_duration()
+        is_idle = stationary and duration >= self.idle_timeout
+        alert_due = is_idle and not state.idle_alerted
+        if alert_due:
+            state.idle_alerted = True
+
+        self._stage(db, state, defer)
+        return IdleUpdate(is_idle, duration, alert_due)
+
+    def committed(self, states: Iterable[VehicleLiveState]):
+        """
+        Make a committed transaction's states current; a newer fix committed
+        meanwhile by another session wins
+        """
+        for state in states:
+            current = self._states.get(state.vehicle_id)
+            if current is None or state.timestamp >= current.timestamp:
+                self._states[state.vehicle_id] = state
+
+    def discard(self, vehicle_id: int):
+        self._states.pop(vehicle_id, None)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def _stage(self, db: Session, state: VehicleLiveState, defer: bool):
+        if defer:
+            # Staged states are only dropped or applied when a transaction ends
+            if not db.in_transaction():
+                db.begin()
+            db.info.setdefault(STAGED_KEY, {}).setdefault(self, {})[state.vehicle_id] = state
+        else:
+            self.committed([state])
+
+live_state = LiveStateStore(idle_timeout=settings.gps_idle_timeout)
+
+@event.listens_for(Session, "after_commit")
+def _live_state_committed(session: Session):
+    staged = session.info.pop(STAGED_KEY, None)
+    for store, states in (staged or {}).items():
+        store.committed(states.values())
+
+@event.listens_for(Session, "after_transaction_end")
+def _live_state_rolled_back(session: Session, transaction):
+    # After a commit the states are already applied; anything left was rolled back or abandoned
+    if transaction.parent is None:
+        session.info.pop(STAGED_KEY, None)
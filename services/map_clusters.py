@@ -0,0 +1,104 @@
+"""
+Server-side clustering of vehicle positions for the map
+
+Positions are binned into a square grid laid over Web Mercator pixel space
+at the requested zoom level, the same space Leaflet draws in, so a cell is
+always the same size on screen. Cells holding a single vehicle are returned
+as that vehicle; fuller cells collapse into one cluster with the count, the
+centroid of its members and a breakdown by status.
+"""
+
+import math
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from database.models import VehicleStatus
+from services.position_store import LatestPosition
+
+TILE_SIZE = 256
+MAX_MERCATOR_LAT = 85.05112878
+
+BBox = Tuple[float, float, float, float]  # (south, west, north, east)
+
+class VehicleCluster(NamedTuple):
+    latitude: float
+    longitude: float
+    count: int
+    statuses: dict
+    bounds: BBox
+
+def parse_bbox_param(value: Optional[str]) -> Optional[BBox]:
+    """
+    Parse a "south,west,north,east" query parameter; raises ValueError when malformed
+    """
+    if not value:
+        return None
+    parts = [float(part) for part in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be south,west,north,east")
+    south, west, north, east = parts
+    if not (-90 <= south <= 90 and -90 <= north <= 90):
+        raise ValueError("bbox latitudes must be within [-90, 90]")
+    return (min(south, north), west, max(south, north), east)
+
+def mercator_pixels(lat: np.ndarray, lon: np.ndarray, zoom: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Global pixel coordinates of the given points at a zoom level"""
+    world = TILE_SIZE * (2 ** zoom)
+    lat = np.radians(np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    x = (lon + 180.0) / 360.0 * world
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * world
+    return x, y
+
+def cluster_positions(positions: Sequence[LatestPosition], zoom: int,
+                      cell_pixels: int) -> Tuple[List[LatestPosition], List[VehicleCluster]]:
+    """
+    Group positions sharing a grid cell; returns the vehicles left on their own
+    and the clusters, largest first
+    """
+    if not positions:
+        return [], []
+
+    lat = np.fromiter((position.latitude for position in positions), dtype=np.float64, count=len(positions))
+    lon = np.fromiter((position.longitude for position in positions), dtype=np.float64, count=len(positions))
+    statuses = list(VehicleStatus)
+    status_index = {status: index for index, status in enumerate(statuses)}
+    status_codes = np.fromiter(
+        (status_index[position.status] for position in positions), dtype=np.int64, count=len(positions)
+    )
+
+    x, y = mercator_pixels(lat, lon, zoom)
+    cells_per_row = int(math.ceil(TILE_SIZE * (2 ** zoom) / cell_pixels)) + 1
+    cell_ids = (y // cell_pixels).astype(np.int64) * cells_per_row + (x // cell_pixels).astype(np.int64)
+    _, cell_of, counts = np.unique(cell_ids, return_inverse=True, return_counts=True)
+
+    cell_count = counts.size
+    lat_sum = np.bincount(cell_of, weights=lat, minlength=cell_count)
+    lon_sum = np.bincount(cell_of, weights=lon, minlength=cell_count)
+    south = np.full(cell_count, np.inf)
+    north = np.full(cell_count, -np.inf)
+    west = np.full(cell_count, np.inf)
+    east = np.full(cell_count, -np.inf)
+    np.minimum.at(south, cell_of, lat)
+    np.maximum.at(north, cell_of, lat)
+    np.minimum.at(west, cell_of, lon)
+    np.maximum.at(east, cell_of, lon)
+    by_status = np.zeros((cell_count, len(statuses)), dtype=np.int64)
+    np.add.at(by_status, (cell_of, status_codes), 1)
+
+    singles = [positions[index] for index in np.flatnonzero(counts[cell_of] == 1)]
+    clusters = [
+        VehicleCluster(
+            latitude=float(lat_sum[cell] / counts[cell]),
+            longitude=float(lon_sum[cell] / counts[cell]),
+            count=int(counts[cell]),
+            statuses={
+                statuses[code].value: int(by_status[cell, code])
+                for code in np.flatnonzero(by_status[cell])
+            },
+            bounds=(float(south[cell]), float(west[cell]), float(north[cell]), float(east[cell]))
+        )
+        for cell in np.flatnonzero(counts > 1)
+    ]
+    clusters.sort(key=lambda cluster: cluster.count, reverse=True)
+    return singles, clusters
@@ -0,0 +1,265 @@
+"""
+Time partitioning of gps_logs on MariaDB/MySQL
+
+gps_logs is RANGE partitioned on the fix timestamp, one partition per day
+or per month, plus a catch-all p_future partition. Partition names carry
+the first day they hold (p20261017 for a day, p202610 for a month), so the
+boundaries are read back from the names rather than from the partitioning
+expression, which differs between DATETIME (TO_DAYS) and TIMESTAMP
+(UNIX_TIMESTAMP) columns. Fixes are stored in UTC, so TIMESTAMP bounds are
+written as the epoch seconds of UTC midnight, whatever the session time zone.
+
+A background job keeps PREMAKE periods ahead split off p_future while it is
+still empty, and drops partitions whose newest possible fix is older than
+the retention window. Dropping a partition is a metadata operation, unlike a
+DELETE over millions of rows; with GPS_ARCHIVE_ENABLED the partition's
+days are first written to the cold archive (services.archive) and the
+partition is kept if that fails. Queries only get partition pruning when they
+compare the timestamp column directly (timestamp >= :since), never through a
+function such as DATE(timestamp).
+"""
+
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+
+GPS_LOGS_TABLE = "gps_logs"
+FUTURE_PARTITION = "p_future"
+MAINTENANCE_LOCK = "gps_logs_partition_maintenance"
+EPOCH = datetime(1970, 1, 1)
+
+_NAME = re.compile(r"^p(\d{4})(\d{2})(\d{2})?$")
+
+class Partition(NamedTuple):
+    name: str
+    start: Optional[date]  # None for p_future and partitions not named by this module
+    end: Optional[date]  # exclusive
+    rows: int
+
+def period_start(day: date, granularity: str) -> date:
+    return day.replace(day=1) if granularity == "month" else day
+
+def next_period(start: date, granularity: str) -> date:
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+def partition_name(start: date, granularity: str) -> str:
+    return start.strftime("p%Y%m" if granularity == "month" else "p%Y%m%d")
+
+def parse_partition(name: str, rows: int = 0) -> Partition:
+    match = _NAME.match(name or "")
+    if not match:
+        return Partition(name, None, None, rows)
+    year, month, day = match.groups()
+    if day is None:
+        start = date(int(year), int(month), 1)
+        return Partition(name, start, next_period(start, "month"), rows)
+    start = date(int(year), int(month), int(day))
+    return Partition(name, start, next_period(start, "day"), rows)
+
+def partition_expression(column_type: str) -> str:
+    """RANGE expression for the timestamp column's SQL type"""
+    if "TIMESTAMP" in column_type.upper():
+        return "UNIX_TIMESTAMP(`timestamp`)"
+    return "TO_DAYS(`timestamp`)"
+
+def partition_bound(boundary: date, expression: str) -> str:
+    if expression.upper().startswith("UNIX_TIMESTAMP"):
+        # Epoch seconds of UTC midnight as a literal; UNIX_TIMESTAMP('<date>')
+        # would read the date in the session time zone
+        return str(int((datetime.combine(boundary, datetime.min.time()) - EPOCH).total_seconds()))
+    return f"TO_DAYS('{boundary.isoformat()}')"
+
+def partition_definitions(first: date, until: date, granularity: str, expression: str) -> List[str]:
+    """PARTITION clauses for every period from the one containing first up to until (exclusive)"""
+    definitions = []
+    start = period_start(first, granularity)
+    while start < until:
+        end = next_period(start, granularity)
+        definitions.append(
+            f"PARTITION {partition_name(start, granularity)} VALUES LESS THAN ({partition_bound(end, expression)})"
+        )
+        start = end
+    return definitions
+
+def future_partition() -> str:
+    return f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE"
+
+def read_partitions(conn: Connection) -> List[Partition]:
+    rows = conn.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_EXPRESSION, TABLE_ROWS FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"table": GPS_LOGS_TABLE}).all()
+    return [parse_partition(name, rows or 0) for name, _, rows in rows]
+
+def read_expression(conn: Connection) -> Optional[str]:
+    row = conn.execute(text(
+        "SELECT PARTITION_EXPRESSION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL LIMIT 1"
+    ), {"table": GPS_LOGS_TABLE}).first()
+    return row[0] if row else None
+
+class GPSLogPartitioner:
+    def __init__(self, granularity: str = "day", premake: int = 7,
+                 retention_days: int = 0, check_interval: float = 3600.0):
+        if granularity not in ("day", "month"):
+            raise ValueError(f"Unsupported partition granularity: {granularity}")
+        self.granularity = granularity
+        self.premake = premake
+        self.retention_days = retention_days
+        self.check_interval = check_interval
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[datetime] = None
+        self.last_result: dict = {}
+
+    async def start(self):
+        if self.retention_days > 0 and settings.gps_archive_enabled:
+            from services.archive import gps_archive
+            if not gps_archive.available:
+                logging.warning(
+                    "GPS_ARCHIVE_ENABLED is set but pyarrow is not installed: expired gps_logs "
+                    f"partitions will never be dropped and GPS_LOG_RETENTION_DAYS={self.retention_days} "
+                    "has no effect. Install pyarrow (requirements_full.txt) or disable archiving."
+                )
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def maintain(self, db: Session, today: Optional[date] = None) -> dict:
+        """
+        Split upcoming periods off p_future and drop expired partitions; a
+        no-op on databases other than MariaDB/MySQL or when gps_logs is not
+        partitioned. Only one worker runs it at a time.
+        """
+        result = {"partitioned": False, "created": [], "dropped": []}
+        if db.get_bind().dialect.name != "mysql":
+            return result
+
+        conn = db.connection()
+        if not conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": MAINTENANCE_LOCK}).scalar():
+            return result
+        try:
+            expression = read_expression(conn)
+            if expression is None:
+                return result
+            result["partitioned"] = True
+            today = today or datetime.utcnow().date()
+
+            partitions = read_partitions(conn)
+            result["created"] = self._create_upcoming(conn, partitions, expression, today)
+            result["dropped"] = self._drop_expired(conn, read_partitions(conn), today)
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MAINTENANCE_LOCK})
+            db.commit()
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "granularity": self.granularity,
+            "retention_days": self.retention_days,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            **self.last_result
+        }
+
+    def _create_upcoming(self, conn: Connection, partitions: List[Partition],
+                         expression: str, today: date) -> List[str]:
+        until = period_start(today, self.granularity)
+        for _ in range(self.premake + 1):
+            until = next_period(until, self.granularity)
+
+        ends = [partition.end for partition in partitions if partition.end is not None]
+        first = max(ends) if ends else period_start(today, self.granularity)
+        definitions = partition_definitions(first, until, self.granularity, expression)
+        if not definitions:
+            return []
+
+        names = [definition.split()[1] for definition in definitions]
+        if any(partition.name == FUTURE_PARTITION for partition in partitions):
+            # Cheap while p_future is empty, which is the case when the job keeps ahead
+            conn.execute(text(
+                f"ALTER TABLE {GPS_LOGS_TABLE} REORGANIZE PARTITION {FUTURE_PARTITION} INTO "
+                f"({', '.join(definitions + [future_partition()])})"
+            ))
+        else:
+            conn.execute(text(f"ALTER TABLE {GPS_LOGS_TABLE} ADD PARTITION ({', '.join(definitions)})"))
+        logging.info(f"Created gps_logs partitions {names[0]}..{names[-1]}")
+        return names
+
+    def _drop_expired(self, conn: Connection, partitions: List[Partition], today: date) -> List[str]:
+        if self.retention_days <= 0:
+            return []
+        cutoff = today - timedelta(days=self.retention_days)
+        # Never drop the last dated partition, REORGANIZE/ADD need something to follow
+        dated = [partition for partition in partitions if partition.end is not None]
+        expired = [partition for partition in dated[:-1] if partition.end <= cutoff]
+        if expired and settings.gps_archive_enabled:
+            expired = self._archive(conn, expired)
+        expired = [partition.name for partition in expired]
+        if expired:
+            conn.execute(text(f"ALTER TABLE {GPS_LOGS_TABLE} DROP PARTITION {', '.join(expired)}"))
+            logging.info(f"Dropped expired gps_logs partitions {', '.join(expired)}")
+        return expired
+
+    def _archive(self, conn: Connection, expired: List[Partition]) -> List[Partition]:
+        """
+        Archive expired partitions oldest first; only those archived before
+        the first failure may be dropped, so the archive stays contiguous.
+        A partition counts as archived only when the archive holds as many
+        rows for its days as the partition itself.
+        """
+        from services.archive import gps_archive
+
+        archived = []
+        for partition in expired:
+            rows = conn.execute(text(
+                f"SELECT COUNT(*) FROM {GPS_LOGS_TABLE} PARTITION ({partition.name})"
+            )).scalar()
+            if not gps_archive.archive_days(partition.start, partition.end, expected_rows=rows):
+                break
+            archived.append(partition)
+        return archived
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self.last_result = await loop.run_in_executor(None, self._maintain_once)
+                self.last_run = datetime.utcnow()
+            except Exception as e:
+                logging.error(f"gps_logs partition maintenance failed: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    def _maintain_once(self) -> dict:
+        # Imported here so migrations can use the helpers without an engine for the app's URL
+        from database.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            return self.maintain(db)
+        finally:
+            db.close()
+
+gps_log_partitioner = GPSLogPartitioner(
+    granularity=settings.gps_partition_granularity,
+    premake=settings.gps_partition_premake,
+    retention_days=settings.gps_log_retention_days,
+    check_interval=settings.gps_partition_check_interval
+)
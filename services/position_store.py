@@ -0,0 +1,366 @@
+"""
+Latest-position store
+
+One entry per vehicle holding its newest fix together with the vehicle
+fields the map filters on, so map refreshes and /api/gps/latest are served
+from memory. Entries are replaced on ingest (never regressed by a late fix).
+
+The durable copy is the vehicle_last_position table, one row per vehicle,
+written by upsert in the same transaction as the GPS log rows. The store is
+warmed from it and periodically pulls rows other workers changed. Vehicle
+edits and deletions bump the "vehicles" row in cache_versions; when it moves
+the held vehicle fields are re-read and deleted vehicles are dropped. Dropped
+entries leave a tombstone for window_hours so delta polls can report them.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from database.models import GPSLog, Vehicle, VehicleLastPosition, VehicleType, VehicleStatus
+from services.geofence import get_version
+from services.live_state import as_naive_utc
+from services.vehicle_cache import VEHICLES_VERSION_KEY
+
+# Columns copied from a fix, timestamp last: MySQL applies ON DUPLICATE KEY
+# assignments in order, so the guard must still see the old timestamp
+LAST_POSITION_COLUMNS = (
+    "latitude", "longitude", "speed", "heading",
+    "is_idle", "idle_duration", "updated_at", "timestamp"
+)
+
+@dataclass(frozen=True)
+class LatestPosition:
+    vehicle_pk: int
+    vehicle_id: str
+    vehicle_type: VehicleType
+    status: VehicleStatus
+    latitude: float
+    longitude: float
+    speed: Optional[float]
+    heading: Optional[float]
+    timestamp: datetime
+    is_idle: bool
+    revision: int = 0  # store revision at which this entry last changed
+    changed_at: Optional[datetime] = None  # when the entry was last written, by any worker
+
+class LatestPositionStore:
+    def __init__(self, window_hours: int = 24, refresh_interval: float = 2.0):
+        self.window_hours = window_hours
+        self.refresh_interval = refresh_interval
+        self._positions: Dict[int, LatestPosition] = {}
+        self._revision = 0
+        self._removed: Dict[int, Tuple[str, datetime]] = {}  # vehicle_pk -> (vehicle_id, removed at)
+        self._vehicles_version: Optional[int] = None
+        self._warm = False
+        self._synced_at: Optional[datetime] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def warm_up(self, db: Session):
+        """
+        Load the newest fix of every vehicle heard from within the window
+        """
+        if self._warm:
+            return
+
+        since = datetime.utcnow() - timedelta(hours=self.window_hours)
+        synced_at = datetime.utcnow()
+        vehicles_version = get_version(db, VEHICLES_VERSION_KEY)
+        rows = self._read(db, VehicleLastPosition.timestamp >= since)
+
+        with self._lock:
+            if self._warm:
+                return
+            for position in rows:
+                self._put(position)
+            self._vehicles_version = vehicles_version
+            self._synced_at = synced_at
+            self._checked_at = time.monotonic()
+            self._warm = True
+
+    def ensure_fresh(self, db: Session):
+        """
+        Pull positions written by other workers since the last sync
+        """
+        if not self._warm:
+            self.warm_up(db)
+            return
+
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+
+        # Overlap the previous sync to tolerate clock skew between writers
+        synced_at = datetime.utcnow()
+        rows = self._read(db, VehicleLastPosition.updated_at >= self._synced_at - timedelta(seconds=5))
+        vehicles_version = get_version(db, VEHICLES_VERSION_KEY)
+        vehicles = None
+        if vehicles_version != self._vehicles_version:
+            vehicles = db.query(
+                Vehicle.id, Vehicle.vehicle_id, Vehicle.vehicle_type, Vehicle.status
+            ).all()
+
+        with self._lock:
+            for position in rows:
+                self._put(position)
+            if vehicles is not None:
+                self._reconcile(vehicles)
+                self._vehicles_version = vehicles_version
+            self._synced_at = synced_at
+
+    def update(self, vehicle, fix, is_idle: bool) -> bool:
+        """
+        Record a fix for a vehicle (a Vehicle or CachedVehicle); returns False
+        when an equal or newer fix is already held
+        """
+        with self._lock:
+            return self._put(LatestPosition(
+                vehicle_pk=vehicle.id,
+                vehicle_id=vehicle.vehicle_id,
+                vehicle_type=vehicle.vehicle_type,
+                status=vehicle.status,
+                latitude=fix.latitude,
+                longitude=fix.longitude,
+                speed=fix.speed,
+                heading=fix.heading,
+                timestamp=as_naive_utc(fix.timestamp),
+                is_idle=bool(is_idle)
+            ))
+
+    def update_vehicle(self, vehicle):
+        """Refresh the vehicle fields held with a position after the vehicle row changes"""
+        with self._lock:
+            position = self._positions.get(vehicle.id)
+            if position is not None:
+                self._revision += 1
+                self._positions[vehicle.id] = replace(
+                    position,
+                    vehicle_id=vehicle.vehicle_id,
+                    vehicle_type=vehicle.vehicle_type,
+                    status=vehicle.status,
+                    revision=self._revision,
+                    changed_at=datetime.utcnow()
+                )
+
+    def discard(self, vehicle_pk: int):
+        with self._lock:
+            self._remove(vehicle_pk)
+
+    def get(self, db: Session, vehicle_pk: int) -> Optional[LatestPosition]:
+        self.ensure_fresh(db)
+        return self._positions.get(vehicle_pk)
+
+    def positions(self, db: Session, vehicle_type: Optional[VehicleType] = None,
+                  status: Optional[VehicleStatus] = None,
+                  since: Optional[datetime] = None,
+                  changed_after: Optional[datetime] = None) -> List[LatestPosition]:
+        """
+        Latest position per vehicle, filtered by vehicle type, status, age and
+        optionally by when the entry last changed
+        """
+        self.ensure_fresh(db)
+        return [
+            position for position in self.snapshot(since)
+            if (vehicle_type is None or position.vehicle_type == vehicle_type)
+            and (status is None or position.status == status)
+            and (changed_after is None or position.changed_at >= changed_after)
+        ]
+
+    def snapshot(self, since: Optional[datetime] = None) -> List[LatestPosition]:
+        """Positions currently held and reported since the given time (default: the window)"""
+        if since is None:
+            since = datetime.utcnow() - timedelta(hours=self.window_hours)
+
+        with self._lock:
+            snapshot = list(self._positions.values())
+        return [position for position in snapshot if position.timestamp >= since]
+
+    def changes_since(self, revision: int) -> Tuple[List[LatestPosition], int]:
+        """
+        Entries changed after the given revision, one per vehicle however often
+        it moved, and the revision to pass next time
+        """
+        with self._lock:
+            current = self._revision
+            if revision >= current:
+                return [], current
+            snapshot = list(self._positions.values())
+        return [position for position in snapshot if revision < position.revision <= current], current
+
+    def removed_since(self, after: datetime) -> List[str]:
+        """
+        Vehicle ids dropped from the store at or after the given time: deleted
+        vehicles and those whose newest fix has since left the window
+        """
+        now = datetime.utcnow()
+        window = timedelta(hours=self.window_hours)
+        with self._lock:
+            for vehicle_pk, (_, removed_at) in list(self._removed.items()):
+                if removed_at < now - window:
+                    del self._removed[vehicle_pk]
+            removed = [vehicle_id for vehicle_id, removed_at in self._removed.values() if removed_at >= after]
+            snapshot = list(self._positions.values())
+        removed.extend(
+            position.vehicle_id for position in snapshot
+            if after - window <= position.timestamp < now - window
+        )
+        return removed
+
+    @property
+    def revision(self) -> int:
+        return self._revision
+
+    def stats(self) -> dict:
+        return {"vehicles": len(self._positions), "revision": self._revision, "warm": self._warm}
+
+    def _put(self, position: LatestPosition) -> bool:
+        current = self._positions.get(position.vehicle_pk)
+        if current is not None and position.timestamp <= current.timestamp:
+            return False
+        self._revision += 1
+        self._positions[position.vehicle_pk] = replace(
+            position, revision=self._revision, changed_at=position.changed_at or datetime.utcnow()
+        )
+        return True
+
+    def _remove(self, vehicle_pk: int):
+        position = self._positions.pop(vehicle_pk, None)
+        if position is not None:
+            self._revision += 1
+            self._removed[vehicle_pk] = (position.vehicle_id, datetime.utcnow())
+
+    def _reconcile(self, vehicles):
+        # Pick up vehicle edits and deletions made by any worker
+        current = {vehicle_pk: (vehicle_id, vehicle_type, status)
+                   for vehicle_pk, vehicle_id, vehicle_type, status in vehicles}
+        for vehicle_pk, position in list(self._positions.items()):
+            fields = current.get(vehicle_pk)
+            if fields is None:
+                self._remove(vehicle_pk)
+            elif fields != (position.vehicle_id, position.vehicle_type, position.status):
+                self._revision += 1
+                self._positions[vehicle_pk] = replace(
+                    position,
+                    vehicle_id=fields[0],
+                    vehicle_type=fields[1],
+                    status=fields[2],
+                    revision=self._revision,
+                    changed_at=datetime.utcnow()
+                )
+
+    @staticmethod
+    def _read(db: Session, condition) -> List[LatestPosition]:
+        rows = db.query(VehicleLastPosition, Vehicle).join(
+            Vehicle, Vehicle.id == VehicleLastPosition.vehicle_id
+        ).filter(condition).all()
+
+        return [
+            LatestPosition(
+                vehicle_pk=vehicle.id,
+                vehicle_id=vehicle.vehicle_id,
+                vehicle_type=vehicle.vehicle_type,
+                status=vehicle.status,
+                latitude=last.latitude,
+                longitude=last.longitude,
+                speed=last.speed,
+                heading=last.heading,
+                timestamp=as_naive_utc(last.timestamp),
+                is_idle=bool(last.is_idle),
+                changed_at=last.updated_at
+            )
+            for last, vehicle in rows
+        ]
+
+def upsert_last_positions(db: Session, rows: Iterable[dict]):
+    """
+    Write the newest of the given gps_logs rows for each vehicle into
+    vehicle_last_position, without committing; an existing row is only
+    replaced by a fix with an equal or newer timestamp
+    """
+    newest: Dict[int, dict] = {}
+    for row in rows:
+        current = newest.get(row["vehicle_id"])
+        if current is None or as_naive_utc(row["timestamp"]) >= as_naive_utc(current["timestamp"]):
+            newest[row["vehicle_id"]] = row
+    if not newest:
+        return
+
+    updated_at = datetime.utcnow()
+    values = [
+        {
+            "vehicle_id": vehicle_pk,
+            "latitude": row["latitude"],
+            "longitude": row["longitude"],
+            "speed": row.get("speed"),
+            "heading": row.get("heading"),
+            "timestamp": as_naive_utc(row["timestamp"]),
+            "is_idle": bool(row.get("is_idle")),
+            "idle_duration": row.get("idle_duration") or 0,
+            "updated_at": updated_at
+        }
+        for vehicle_pk, row in newest.items()
+    ]
+
+    table = VehicleLastPosition.__table__
+    if db.get_bind().dialect.name == "sqlite":
+        # Local test databases; production runs on MariaDB/MySQL
+        stmt = sqlite.insert(table).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.vehicle_id],
+            set_={column: stmt.excluded[column] for column in LAST_POSITION_COLUMNS},
+            where=stmt.excluded.timestamp >= table.c.timestamp
+        )
+    else:
+        stmt = mysql.insert(table).values(values)
+        is_newer = stmt.inserted.timestamp >= table.c.timestamp
+        stmt = stmt.on_duplicate_key_update([
+            (column, func.if_(is_newer, stmt.inserted[column], table.c[column]))
+            for column in LAST_POSITION_COLUMNS
+        ])
+
+    db.execute(stmt)
+
+def backfill_last_positions(db: Session) -> int:
+    """
+    Seed an empty vehicle_last_position table from gps_logs, once, and commit
+    """
+    if db.query(VehicleLastPosition.vehicle_id).first() is not None:
+        return 0
+
+    latest = select(
+        GPSLog.vehicle_id,
+        func.max(GPSLog.timestamp).label("timestamp")
+    ).group_by(GPSLog.vehicle_id).subquery()
+
+    # Highest id breaks ties between fixes sharing the newest timestamp
+    newest_ids = select(func.max(GPSLog.id)).join(
+        latest,
+        (GPSLog.vehicle_id == latest.c.vehicle_id) & (GPSLog.timestamp == latest.c.timestamp)
+    ).group_by(GPSLog.vehicle_id)
+
+    newest_logs = select(
+        GPSLog.vehicle_id, GPSLog.latitude, GPSLog.longitude, GPSLog.speed,
+        GPSLog.heading, GPSLog.timestamp, GPSLog.is_idle, GPSLog.idle_duration,
+        func.now()
+    ).where(GPSLog.id.in_(newest_ids))
+
+    result = db.execute(insert(VehicleLastPosition).from_select([
+        "vehicle_id", "latitude", "longitude", "speed", "heading",
+        "timestamp", "is_idle", "idle_duration", "updated_at"
+    ], newest_logs))
+    db.commit()
+    return result.rowcount or 0
+
+position_store = LatestPositionStore(
+    window_hours=settings.latest_position_window_hours,
+    refresh_interval=settings.latest_position_refresh_interval
+)
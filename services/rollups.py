@@ -0,0 +1,353 @@
+"""
+Downsampled GPS history
+
+Raw fixes are aggregated per vehicle into 1-minute and 15-minute buckets:
+first and last position, average and max speed, distance travelled and idle
+time. A background job walks gps_logs by id: each run reads the rows added
+since the watermark, recomputes every 1-minute bucket they touch from the
+raw fixes and then rebuilds the 15-minute buckets above those from the
+1-minute rows. Whole buckets are recomputed, so a fix that arrives late (a
+device uploading its backlog) only rewrites the buckets it falls in.
+
+Ids are allocated before commit, so a row can become visible after a higher
+id was already read. The watermark therefore only moves up to the newest id
+seen by the previous run; rows from the last interval are read twice, which
+is harmless since the rollup is idempotent. On MariaDB the job holds a named
+lock while it runs, so only one worker process rolls up at a time.
+
+Long-range history reads the coarsest level whose buckets are no wider than
+range / point budget, so a month of one vehicle is a few thousand rows
+instead of millions of fixes. Ids do not follow timestamps, so each time the
+watermark moves the job also stores the time up to which every fix is rolled
+up (rolled_up_until): the newest fix it has rolled up, but no later than the
+oldest fix past the watermark. Readers summarize the fixes after it on the
+fly with summarize_range.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, insert, text
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from database.database import SessionLocal
+from database.models import GPSLog, GPSRollup1m, GPSRollup15m, RollupWatermark
+from services.geometry import haversine
+
+WATERMARK_NAME = "gps_rollups"
+ROLLUP_LOCK = "gps_rollups"
+# How far back to look for the fix before a recomputed range, whose leg counts in its first bucket
+LEG_LOOKBACK = timedelta(hours=1)
+
+class RollupLevel(NamedTuple):
+    name: str
+    width: timedelta
+    model: type
+
+MINUTE = RollupLevel("1m", timedelta(minutes=1), GPSRollup1m)
+QUARTER_HOUR = RollupLevel("15m", timedelta(minutes=15), GPSRollup15m)
+ROLLUP_LEVELS = (MINUTE, QUARTER_HOUR)  # finest first
+LEVELS_BY_NAME = {level.name: level for level in ROLLUP_LEVELS}
+
+def bucket_start(timestamp: datetime, width: timedelta) -> datetime:
+    return datetime.min + ((timestamp - datetime.min) // width) * width
+
+def choose_level(start: datetime, end: datetime, max_points: int,
+                 raw_since: Optional[datetime] = None) -> Optional[RollupLevel]:
+    """
+    Coarsest level whose buckets are no wider than the range split into
+    max_points; None means raw fixes. Ranges reaching back past raw_since,
+    where raw fixes are no longer kept, use at least 1-minute buckets.
+    """
+    interval = (end - start) / max(max_points, 1)
+    chosen = None
+    for level in ROLLUP_LEVELS:
+        if level.width <= interval:
+            chosen = level
+    if chosen is None and raw_since is not None and start < raw_since:
+        chosen = MINUTE
+    return chosen
+
+def raw_history_start() -> Optional[datetime]:
+    """Oldest time raw fixes are guaranteed to exist for, None when they are kept forever"""
+    if settings.gps_log_retention_days <= 0:
+        return None
+    return datetime.utcnow() - timedelta(days=settings.gps_log_retention_days)
+
+def rolled_up_until(db: Session) -> Optional[datetime]:
+    """
+    Time before which every fix is rolled up, None before the first rollup;
+    buckets before the one it falls in are complete
+    """
+    watermark = db.get(RollupWatermark, WATERMARK_NAME)
+    if watermark is None or not watermark.last_log_id:
+        return None
+    return watermark.complete_until
+
+def summarize_range(db: Session, vehicle_id: int, start: Optional[datetime], end: Optional[datetime],
+                    width: timedelta) -> List[dict]:
+    """Buckets of a vehicle's fixes with start <= timestamp < end, computed from gps_logs"""
+    columns = (GPSLog.timestamp, GPSLog.latitude, GPSLog.longitude, GPSLog.speed, GPSLog.is_idle)
+    query = db.query(*columns).filter(GPSLog.vehicle_id == vehicle_id)
+    if start is not None:
+        query = query.filter(GPSLog.timestamp >= start)
+    if end is not None:
+        query = query.filter(GPSLog.timestamp < end)
+    fixes = query.order_by(GPSLog.timestamp, GPSLog.id).all()
+    previous = None
+    if start is not None and fixes:
+        previous = db.query(*columns).filter(
+            GPSLog.vehicle_id == vehicle_id,
+            GPSLog.timestamp >= start - LEG_LOOKBACK,
+            GPSLog.timestamp < start
+        ).order_by(GPSLog.timestamp.desc(), GPSLog.id.desc()).first()
+    return summarize_fixes(fixes, previous, width)
+
+def summarize_fixes(fixes: List[tuple], previous: Optional[tuple], width: timedelta) -> List[dict]:
+    """
+    Aggregate fixes (timestamp, latitude, longitude, speed, is_idle), in time
+    order, into buckets of the given width. Each fix's leg from the fix
+    before it, previous for the first one, counts in the fix's bucket, as
+    does the time since that fix when the vehicle was idle at both ends.
+    """
+    if not fixes:
+        return []
+    chain = ([previous] if previous else []) + list(fixes)
+    lat = np.array([fix[1] for fix in chain], dtype=np.float64)
+    lon = np.array([fix[2] for fix in chain], dtype=np.float64)
+    legs = np.concatenate(([0.0], haversine(lat[:-1], lon[:-1], lat[1:], lon[1:]) / 1000.0))
+    offset = len(chain) - len(fixes)
+
+    buckets = []
+    indexed = range(offset, len(chain))
+    for start, members in groupby(indexed, key=lambda i: bucket_start(chain[i][0], width)):
+        members = list(members)
+        speeds = [chain[i][3] for i in members if chain[i][3] is not None]
+        idle_seconds = sum(
+            (chain[i][0] - chain[i - 1][0]).total_seconds()
+            for i in members if i > 0 and chain[i][4] and chain[i - 1][4]
+        )
+        first, last = chain[members[0]], chain[members[-1]]
+        buckets.append({
+            "bucket_start": start,
+            "fix_count": len(members),
+            "first_latitude": first[1],
+            "first_longitude": first[2],
+            "first_timestamp": first[0],
+            "last_latitude": last[1],
+            "last_longitude": last[2],
+            "last_timestamp": last[0],
+            "avg_speed": sum(speeds) / len(speeds) if speeds else None,
+            "max_speed": max(speeds) if speeds else None,
+            "distance": float(legs[members].sum()),
+            "idle_seconds": int(idle_seconds)
+        })
+    return buckets
+
+def merge_buckets(rows: Iterable, width: timedelta) -> List[dict]:
+    """Combine finer rollup rows, in time order, into buckets of the given width"""
+    buckets = []
+    for start, members in groupby(rows, key=lambda row: bucket_start(row.bucket_start, width)):
+        members = list(members)
+        timed = [row for row in members if row.avg_speed is not None]
+        weight = sum(row.fix_count for row in timed)
+        max_speeds = [row.max_speed for row in members if row.max_speed is not None]
+        first, last = members[0], members[-1]
+        buckets.append({
+            "bucket_start": start,
+            "fix_count": sum(row.fix_count for row in members),
+            "first_latitude": first.first_latitude,
+            "first_longitude": first.first_longitude,
+            "first_timestamp": first.first_timestamp,
+            "last_latitude": last.last_latitude,
+            "last_longitude": last.last_longitude,
+            "last_timestamp": last.last_timestamp,
+            "avg_speed": sum(row.avg_speed * row.fix_count for row in timed) / weight if weight else None,
+            "max_speed": max(max_speeds) if max_speeds else None,
+            "distance": sum(row.distance or 0.0 for row in members),
+            "idle_seconds": sum(row.idle_seconds or 0 for row in members)
+        })
+    return buckets
+
+def touched_ranges(timestamps: Iterable[datetime]) -> List[Tuple[datetime, datetime]]:
+    """
+    1-minute ranges [start, end) to recompute for new fixes at these times,
+    aligned to 15-minute buckets; nearby fixes share one range. Each range
+    runs one minute past the last new fix, since the leg of the fix after a
+    late one changes too.
+    """
+    starts = sorted({bucket_start(timestamp, MINUTE.width) for timestamp in timestamps})
+    ranges = []
+    for start in starts:
+        end = start + 2 * MINUTE.width
+        if ranges and start <= ranges[-1][1] + QUARTER_HOUR.width:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((bucket_start(start, QUARTER_HOUR.width), end))
+    return ranges
+
+class GPSRollupJob:
+    def __init__(self, interval: float = 60.0, batch_size: int = 50000):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._seen_log_id: Optional[int] = None  # newest gps_logs id visible at the previous run
+        self._newest_rolled: Optional[datetime] = None  # newest fix timestamp at or below the watermark
+        self.last_run: Optional[datetime] = None
+        self.last_result: dict = {}
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def roll_up(self, db: Session) -> dict:
+        """
+        Roll up one batch of gps_logs rows past the watermark and commit; on
+        MariaDB the run is skipped while another worker holds the lock
+        """
+        bind = db.get_bind()
+        if bind.dialect.name != "mysql":
+            return self._roll_up(db)
+        # A named lock belongs to its connection, so it is taken on one of its own that outlives the commit
+        with bind.connect() as lock:
+            if not lock.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": ROLLUP_LOCK}).scalar():
+                return {"skipped": True, "caught_up": True}
+            try:
+                return self._roll_up(db)
+            finally:
+                lock.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": ROLLUP_LOCK})
+
+    def _roll_up(self, db: Session) -> dict:
+        watermark = db.get(RollupWatermark, WATERMARK_NAME)
+        if watermark is None:
+            watermark = RollupWatermark(name=WATERMARK_NAME, last_log_id=0)
+            db.add(watermark)
+
+        newest = db.query(func.max(GPSLog.id)).scalar() or 0
+        if newest < watermark.last_log_id:
+            # gps_logs was emptied and its ids restarted
+            watermark.last_log_id = 0
+            watermark.complete_until = None
+            self._seen_log_id = None
+            self._newest_rolled = None
+
+        rows = db.query(GPSLog.id, GPSLog.vehicle_id, GPSLog.timestamp).filter(
+            GPSLog.id > watermark.last_log_id,
+            GPSLog.id <= newest
+        ).order_by(GPSLog.id).limit(self.batch_size).all()
+
+        raw_since = raw_history_start()
+        by_vehicle: Dict[int, List[datetime]] = {}
+        for _, vehicle_id, timestamp in rows:
+            # Buckets past raw retention cannot be recomputed from fixes that are gone
+            if raw_since is None or timestamp >= raw_since:
+                by_vehicle.setdefault(vehicle_id, []).append(timestamp)
+
+        buckets = 0
+        for vehicle_id, timestamps in by_vehicle.items():
+            for start, end in touched_ranges(timestamps):
+                buckets += self._rebuild(db, vehicle_id, start, end)
+
+        read_to = rows[-1][0] if rows else watermark.last_log_id
+        if self._seen_log_id is not None:
+            watermark.last_log_id = max(watermark.last_log_id, min(read_to, self._seen_log_id))
+            watermark.complete_until = self._complete_until(db, watermark, rows)
+        self._seen_log_id = newest
+        db.commit()
+
+        return {
+            "last_log_id": watermark.last_log_id,
+            "rows_read": len(rows),
+            "vehicles": len(by_vehicle),
+            "buckets_written": buckets,
+            "caught_up": read_to >= newest
+        }
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            **self.last_result
+        }
+
+    def _complete_until(self, db: Session, watermark: RollupWatermark, rows: List[tuple]) -> Optional[datetime]:
+        """
+        Newest fix at or below the watermark, capped at the oldest fix past
+        it, which a late upload can put far back in time
+        """
+        rolled = [timestamp for log_id, _, timestamp in rows if log_id <= watermark.last_log_id]
+        # The stored value stands in for rows rolled up before a restart or by another worker
+        rolled += [previous for previous in (self._newest_rolled, watermark.complete_until) if previous is not None]
+        if not rolled:
+            return None
+        self._newest_rolled = max(rolled)
+        pending = db.query(func.min(GPSLog.timestamp)).filter(GPSLog.id > watermark.last_log_id).scalar()
+        return min(self._newest_rolled, pending) if pending is not None else self._newest_rolled
+
+    def _rebuild(self, db: Session, vehicle_id: int, start: datetime, end: datetime) -> int:
+        minutes = summarize_range(db, vehicle_id, start, end, MINUTE.width)
+        self._replace(db, MINUTE.model, vehicle_id, start, end, minutes)
+        db.flush()
+
+        quarter_start = bucket_start(start, QUARTER_HOUR.width)
+        quarter_end = bucket_start(end - timedelta(microseconds=1), QUARTER_HOUR.width) + QUARTER_HOUR.width
+        finer = db.query(MINUTE.model).filter(
+            MINUTE.model.vehicle_id == vehicle_id,
+            MINUTE.model.bucket_start >= quarter_start,
+            MINUTE.model.bucket_start < quarter_end
+        ).order_by(MINUTE.model.bucket_start).all()
+        quarters = merge_buckets(finer, QUARTER_HOUR.width)
+        self._replace(db, QUARTER_HOUR.model, vehicle_id, quarter_start, quarter_end, quarters)
+
+        return len(minutes) + len(quarters)
+
+    def _replace(self, db: Session, model, vehicle_id: int, start: datetime, end: datetime,
+                 buckets: List[dict]):
+        db.query(model).filter(
+            model.vehicle_id == vehicle_id,
+            model.bucket_start >= start,
+            model.bucket_start < end
+        ).delete(synchronize_session=False)
+        if buckets:
+            db.execute(insert(model), [{"vehicle_id": vehicle_id, **bucket} for bucket in buckets])
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self.last_result = await loop.run_in_executor(None, self._roll_up_once)
+                self.last_run = datetime.utcnow()
+                if self.last_result["caught_up"]:
+                    await asyncio.sleep(self.interval)
+            except Exception as e:
+                logging.error(f"GPS rollup failed: {e}")
+                await asyncio.sleep(self.interval)
+
+    def _roll_up_once(self) -> dict:
+        db = SessionLocal()
+        try:
+            return self.roll_up(db)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+gps_rollup_job = GPSRollupJob(
+    interval=settings.gps_rollup_interval,
+    batch_size=settings.gps_rollup_batch_size
+)
@@ -0,0 +1,108 @@
+"""
+Track simplification for drawing history on the map
+
+Points are projected to local meters once, then reduced with either
+Douglas-Peucker (every dropped point within a tolerance of the kept line)
+or Visvalingam-Whyatt (drop the points spanning the smallest triangles
+until a point budget is met). Both keep the first and last point and any
+point flagged in keep, which the API uses for the fixes where a stop
+starts and ends. The inner loops run over NumPy arrays: Douglas-Peucker
+measures a whole span per step, and Visvalingam-Whyatt removes a batch of
+non-adjacent points per pass instead of one point per heap pop.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from services.geometry import LocalProjection
+
+def project(lat: np.ndarray, lon: np.ndarray):
+    """(x, y) in meters around the track's mean position"""
+    projection = LocalProjection(float(np.mean(lat)), float(np.mean(lon)))
+    return projection.project(lat, lon)
+
+def segment_distance(px, py, x0: float, y0: float, x1: float, y1: float) -> np.ndarray:
+    """Distance from each point to the segment (x0, y0)-(x1, y1)"""
+    dx, dy = x1 - x0, y1 - y0
+    length2 = dx * dx + dy * dy
+    if length2 == 0:
+        return np.hypot(px - x0, py - y0)
+    t = np.clip(((px - x0) * dx + (py - y0) * dy) / length2, 0.0, 1.0)
+    return np.hypot(px - (x0 + t * dx), py - (y0 + t * dy))
+
+def locked_points(n: int, keep: Optional[np.ndarray]) -> np.ndarray:
+    locked = np.zeros(n, dtype=bool) if keep is None else np.asarray(keep, dtype=bool).copy()
+    locked[0] = locked[-1] = True
+    return locked
+
+def douglas_peucker(x: np.ndarray, y: np.ndarray, tolerance: float,
+                    keep: Optional[np.ndarray] = None) -> np.ndarray:
+    """Indices of the points kept so no dropped point is further than tolerance from the line"""
+    n = len(x)
+    if n <= 2:
+        return np.arange(n)
+    kept = locked_points(n, keep)
+    anchors = np.flatnonzero(kept)
+    spans = list(zip(anchors[:-1].tolist(), anchors[1:].tolist()))
+    while spans:
+        start, end = spans.pop()
+        if end - start < 2:
+            continue
+        distance = segment_distance(x[start + 1:end], y[start + 1:end], x[start], y[start], x[end], y[end])
+        farthest = int(np.argmax(distance))
+        if distance[farthest] > tolerance:
+            split = start + 1 + farthest
+            kept[split] = True
+            spans.append((start, split))
+            spans.append((split, end))
+    return np.flatnonzero(kept)
+
+def visvalingam_whyatt(x: np.ndarray, y: np.ndarray, max_points: int,
+                       keep: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Indices of at most max_points points (more when keep demands it),
+    dropping the least significant first
+    """
+    n = len(x)
+    index = np.arange(n)
+    if n <= max(max_points, 2):
+        return index
+    locked = locked_points(n, keep)
+    while len(index) > max_points:
+        xs, ys = x[index], y[index]
+        area = np.full(len(index), np.inf)
+        area[1:-1] = 0.5 * np.abs(
+            (xs[:-2] - xs[2:]) * (ys[1:-1] - ys[2:]) - (xs[1:-1] - xs[2:]) * (ys[:-2] - ys[2:])
+        )
+        area[locked[index]] = np.inf
+        excess = min(len(index) - max_points, int(np.isfinite(area).sum()))
+        if excess <= 0:
+            break
+        drop = np.zeros(len(index), dtype=bool)
+        drop[np.argsort(area, kind="stable")[:excess]] = True
+        # Dropping a point changes its neighbours' triangles, so never drop two neighbours in one pass
+        drop[1:] &= ~drop[:-1]
+        index = index[~drop]
+    return index
+
+def stop_boundaries(idle: np.ndarray) -> np.ndarray:
+    """Mask of the first and last point of every idle stretch"""
+    idle = np.asarray(idle, dtype=bool)
+    before = np.concatenate(([False], idle[:-1]))
+    after = np.concatenate((idle[1:], [False]))
+    return idle & ~(before & after)
+
+def encode_polyline(lat: np.ndarray, lon: np.ndarray, precision: int = 5) -> str:
+    """Google encoded polyline of the points"""
+    factor = 10 ** precision
+    coordinates = np.round(np.column_stack((lat, lon)) * factor).astype(np.int64)
+    deltas = np.diff(coordinates, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    chunks = []
+    for value in deltas.ravel().tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return "".join(chunks)
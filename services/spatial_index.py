@@ -0,0 +1,111 @@
+"""
+Static spatial index over bounding boxes
+
+An STR (Sort-Tile-Recursive) packed R-tree: built once from a list of
+bounding boxes and rebuilt whenever the underlying set changes. Point
+queries return only the payloads whose box contains the point.
+"""
+
+import math
+from typing import Any, List, Sequence, Tuple
+
+BBox = Tuple[float, float, float, float]  # (min_lat, min_lon, max_lat, max_lon)
+
+class _Node:
+    __slots__ = ("min_lat", "min_lon", "max_lat", "max_lon", "children", "leaf")
+
+    def __init__(self, entries: list, leaf: bool):
+        # entries are (bbox, payload) for leaves and child nodes otherwise
+        self.children = entries
+        self.leaf = leaf
+        if leaf:
+            boxes = [bbox for bbox, _ in entries]
+            self.min_lat = min(box[0] for box in boxes)
+            self.min_lon = min(box[1] for box in boxes)
+            self.max_lat = max(box[2] for box in boxes)
+            self.max_lon = max(box[3] for box in boxes)
+        else:
+            self.min_lat = min(node.min_lat for node in entries)
+            self.min_lon = min(node.min_lon for node in entries)
+            self.max_lat = max(node.max_lat for node in entries)
+            self.max_lon = max(node.max_lon for node in entries)
+
+    @property
+    def center(self) -> Tuple[float, float]:
+        return (self.min_lat + self.max_lat) / 2, (self.min_lon + self.max_lon) / 2
+
+class STRTree:
+    def __init__(self, items: Sequence[Tuple[BBox, Any]], node_capacity: int = 16):
+        self.node_capacity = max(2, node_capacity)
+        self.size = len(items)
+        self.root = None
+        self.height = 0
+
+        if items:
+            level = self._pack(
+                list(items),
+                center=lambda item: ((item[0][0] + item[0][2]) / 2, (item[0][1] + item[0][3]) / 2),
+                make=lambda group: _Node(group, leaf=True)
+            )
+            self.height = 1
+            while len(level) > 1:
+                level = self._pack(level, center=lambda node: node.center, make=lambda group: _Node(group, leaf=False))
+                self.height += 1
+            self.root = level[0]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def query_point(self, lat: float, lon: float) -> List[Any]:
+        """Payloads whose bounding box contains the point"""
+        if self.root is None:
+            return []
+
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if not (node.min_lat <= lat <= node.max_lat and node.min_lon <= lon <= node.max_lon):
+                continue
+            if node.leaf:
+                for bbox, payload in node.children:
+                    if bbox[0] <= lat <= bbox[2] and bbox[1] <= lon <= bbox[3]:
+                        found.append(payload)
+            else:
+                stack.extend(node.children)
+        return found
+
+    def query_bbox(self, bbox: BBox) -> List[Any]:
+        """Payloads whose bounding box intersects the given box"""
+        if self.root is None:
+            return []
+
+        min_lat, min_lon, max_lat, max_lon = bbox
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.max_lat < min_lat or node.min_lat > max_lat or node.max_lon < min_lon or node.min_lon > max_lon:
+                continue
+            if node.leaf:
+                for box, payload in node.children:
+                    if not (box[2] < min_lat or box[0] > max_lat or box[3] < min_lon or box[1] > max_lon):
+                        found.append(payload)
+            else:
+                stack.extend(node.children)
+        return found
+
+    def _pack(self, entries: list, center, make) -> list:
+        # Sort by longitude into vertical slices, then by latitude within each slice
+        capacity = self.node_capacity
+        node_count = math.ceil(len(entries) / capacity)
+        slice_count = math.ceil(math.sqrt(node_count))
+        slice_size = slice_count * capacity
+
+        entries.sort(key=lambda entry: center(entry)[1])
+        nodes = []
+        for start in range(0, len(entries), slice_size):
+            vertical_slice = sorted(entries[start:start + slice_size], key=lambda entry: center(entry)[0])
+            for offset in range(0, len(vertical_slice), capacity):
+                nodes.append(make(vertical_slice[offset:offset + capacity]))
+        return nodes
@@ -0,0 +1,419 @@
+"""
+Compact per-vehicle track store
+
+An optional append-only copy of gps_logs holding what tracks are drawn
+from: time, position, speed, heading and the idle flag. A background job
+walks gps_logs by id like the rollup job and appends one block per vehicle
+and hour of new fixes to that vehicle's segment file for the day, with a
+fixed-size entry per block in the day's index:
+
+    <TRACK_STORE_DIR>/v<vehicle pk>/2026-10-01.seg   blocks, back to back
+    <TRACK_STORE_DIR>/v<vehicle pk>/2026-10-01.idx   first/last timestamp, offset, length, count
+
+Inside a block each column is fixed point (microseconds, 1e-7 degrees,
+0.01 km/h, 0.01 degrees) stored as zigzag varint deltas from the fix
+before, so a moving vehicle reporting every few seconds costs around ten
+bytes a fix instead of the 100+ of a gps_logs row and its indexes.
+Positions therefore come back rounded to about a centimetre. A range read
+picks its blocks from the index and decodes them with NumPy straight from
+the memory-mapped segment file.
+
+Ids are allocated before commit, and rows at or below the watermark are
+never read again, so the job only appends ids up to the newest id a run saw
+at least commit_lag seconds earlier (the previous run when it is 0). A row
+whose transaction stays open longer than that is missed by the store;
+commit_lag should exceed the longest ingest transaction. Reads take the rows
+above the watermark from gps_logs. A crash between appending and saving the
+watermark appends some rows twice, which reads drop.
+"""
+
+import asyncio
+import logging
+import mmap
+import os
+import shutil
+import struct
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from database.database import SessionLocal
+from database.models import GPSLog
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+WATERMARK_FILE = "WATERMARK"
+LOCK_FILE = ".lock"
+# Fixes, then the byte length of each varint column in BLOCK_COLUMNS order
+BLOCK_HEADER = struct.Struct("<7I")
+BLOCK_COLUMNS = ("id", "timestamp", "latitude", "longitude", "speed", "heading")
+FIXED_POINT = {"latitude": 1e7, "longitude": 1e7, "speed": 100.0, "heading": 100.0}
+INDEX_ENTRY = np.dtype([
+    ("first", "<i8"), ("last", "<i8"), ("offset", "<i8"), ("length", "<u4"), ("count", "<u4")
+])
+
+class TrackColumns(NamedTuple):
+    """Decoded fixes of one vehicle, ordered by (timestamp, id); NaN speed or heading is unknown"""
+    id: np.ndarray
+    timestamp: np.ndarray  # int64 microseconds since the epoch
+    latitude: np.ndarray
+    longitude: np.ndarray
+    speed: np.ndarray
+    heading: np.ndarray
+    is_idle: np.ndarray
+
+    def rows(self) -> List[tuple]:
+        """(latitude, longitude, timestamp, speed, is_idle, id) tuples"""
+        speed = [None if missing else value
+                 for value, missing in zip(self.speed.tolist(), np.isnan(self.speed).tolist())]
+        return list(zip(
+            self.latitude.tolist(), self.longitude.tolist(),
+            self.timestamp.astype("datetime64[us]").tolist(), speed,
+            self.is_idle.tolist(), self.id.tolist()
+        ))
+
+def to_micros(timestamp: datetime) -> int:
+    return int(np.datetime64(timestamp, "us").astype(np.int64))
+
+def encode_varints(values: np.ndarray) -> bytes:
+    """Zigzag LEB128 varints of int64 values, seven bits a byte"""
+    zigzag = ((values << 1) ^ (values >> 63)).astype(np.uint64)
+    lengths = np.ones(len(zigzag), dtype=np.int64)
+    rest = zigzag >> np.uint64(7)
+    while rest.any():
+        lengths += rest > 0
+        rest >>= np.uint64(7)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    out = np.empty(int(ends[-1]) if len(ends) else 0, dtype=np.uint8)
+    for k in range(int(lengths.max()) if len(lengths) else 0):
+        # Byte k of every value that has one, with the continuation bit unless it is the last
+        selected = lengths > k
+        payload = (zigzag[selected] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        more = (lengths[selected] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[selected] + k] = payload | more
+    return out.tobytes()
+
+def decode_varints(data: np.ndarray) -> np.ndarray:
+    """int64 values of the zigzag varints in a uint8 array"""
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shift = (np.arange(len(data)) - np.repeat(starts, ends - starts + 1)) * 7
+    zigzag = np.add.reduceat((data & 0x7f).astype(np.uint64) << shift.astype(np.uint64), starts)
+    return (zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64)
+
+def encode_block(fixes: List[tuple]) -> bytes:
+    """Block of (id, timestamp, latitude, longitude, speed, heading, is_idle) fixes"""
+    fixes = sorted(fixes, key=lambda fix: (fix[1], fix[0]))
+    columns = list(zip(*fixes))
+    streams, nulls = [], []
+    for position, name in enumerate(BLOCK_COLUMNS):
+        values = columns[position]
+        if name == "id":
+            fixed = np.array(values, dtype=np.int64)
+        elif name == "timestamp":
+            fixed = np.array(values, dtype="datetime64[us]").astype(np.int64)
+        else:
+            floats = np.array(values, dtype=np.float64)  # None becomes NaN
+            missing = np.isnan(floats)
+            if name in ("speed", "heading"):
+                nulls.append(np.packbits(missing).tobytes())
+            fixed = np.round(np.where(missing, 0.0, floats) * FIXED_POINT[name]).astype(np.int64)
+        streams.append(encode_varints(np.diff(fixed, prepend=0)))
+    idle = np.packbits(np.array(columns[6], dtype=bool)).tobytes()
+    header = BLOCK_HEADER.pack(len(fixes), *(len(stream) for stream in streams))
+    return b"".join([header, *streams, *nulls, idle])
+
+def decode_block(data: np.ndarray) -> TrackColumns:
+    """Columns of a block from a uint8 array, typically a view of the mapped segment"""
+    count, *lengths = BLOCK_HEADER.unpack_from(data)
+    position = BLOCK_HEADER.size
+    decoded = {}
+    for name, length in zip(BLOCK_COLUMNS, lengths):
+        fixed = np.cumsum(decode_varints(data[position:position + length]))
+        decoded[name] = fixed / FIXED_POINT[name] if name in FIXED_POINT else fixed
+        position += length
+    flags = []
+    for _ in range(3):
+        size = (count + 7) // 8
+        flags.append(np.unpackbits(data[position:position + size], count=count).astype(bool))
+        position += size
+    decoded["speed"][flags[0]] = np.nan
+    decoded["heading"][flags[1]] = np.nan
+    return TrackColumns(is_idle=flags[2], **decoded)
+
+def concatenate(parts: List[TrackColumns]) -> TrackColumns:
+    if not parts:
+        empty = np.zeros(0)
+        return TrackColumns(empty.astype(np.int64), empty.astype(np.int64), empty, empty,
+                            empty, empty, empty.astype(bool))
+    return TrackColumns(*(np.concatenate(column) for column in zip(*parts)))
+
+class TrackStore:
+    def __init__(self, root: str, enabled: bool = False, interval: float = 60.0,
+                 batch_size: int = 50000, commit_lag: float = 0.0):
+        self.root = Path(root)
+        self.enabled = enabled
+        self.interval = interval
+        self.batch_size = batch_size
+        self.commit_lag = commit_lag
+        self._task: Optional[asyncio.Task] = None
+        self._seen: deque = deque()  # (monotonic time, newest gps_logs id) of the runs since then
+        self._settled_log_id: Optional[int] = None  # newest id seen at least commit_lag seconds ago
+        self._pruned_on: Optional[date] = None
+        self.last_run: Optional[datetime] = None
+        self.last_result: dict = {}
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def watermark(self) -> int:
+        """Every gps_logs id up to this one is in the store"""
+        try:
+            return int((self.root / WATERMARK_FILE).read_text())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def read(self, vehicle_pk: int, start: datetime, end: datetime,
+             max_id: Optional[int] = None) -> TrackColumns:
+        """Stored fixes of the vehicle with start <= timestamp <= end and id <= max_id"""
+        first, last = to_micros(start), to_micros(end)
+        directory = self.root / f"v{vehicle_pk}"
+        parts = []
+        day = start.date()
+        while day <= end.date():
+            parts.extend(self._read_day(directory, day, first, last))
+            day += timedelta(days=1)
+        columns = concatenate(parts)
+
+        keep = (columns.timestamp >= first) & (columns.timestamp <= last)
+        if max_id is not None:
+            keep &= columns.id <= max_id
+        columns = TrackColumns(*(column[keep] for column in columns))
+        order = np.lexsort((columns.id, columns.timestamp))
+        columns = TrackColumns(*(column[order] for column in columns))
+        # Rows appended again after a crash before the watermark was saved
+        unique = np.ones(len(order), dtype=bool)
+        unique[1:] = columns.id[1:] != columns.id[:-1]
+        return TrackColumns(*(column[unique] for column in columns))
+
+    def append(self, fixes: List[tuple]) -> int:
+        """
+        Append (id, vehicle_id, timestamp, latitude, longitude, speed,
+        heading, is_idle) fixes, one block per vehicle and hour; returns
+        the number of blocks written
+        """
+        hour = lambda fix: (fix[1], fix[2].replace(minute=0, second=0, microsecond=0))
+        blocks = 0
+        for (vehicle_pk, day), day_fixes in groupby(sorted(fixes, key=hour), key=lambda fix: (fix[1], fix[2].date())):
+            directory = self.root / f"v{vehicle_pk}"
+            directory.mkdir(parents=True, exist_ok=True)
+            entries = []
+            with open(directory / f"{day.isoformat()}.seg", "ab") as segment:
+                offset = segment.seek(0, os.SEEK_END)
+                for _, hour_fixes in groupby(day_fixes, key=hour):
+                    hour_fixes = [(fix[0], *fix[2:]) for fix in hour_fixes]
+                    block = encode_block(hour_fixes)
+                    segment.write(block)
+                    timestamps = [fix[1] for fix in hour_fixes]
+                    entries.append((to_micros(min(timestamps)), to_micros(max(timestamps)),
+                                    offset, len(block), len(hour_fixes)))
+                    offset += len(block)
+            # The index only points at blocks already written
+            with open(directory / f"{day.isoformat()}.idx", "ab") as index:
+                index.write(np.array(entries, dtype=INDEX_ENTRY).tobytes())
+            blocks += len(entries)
+        return blocks
+
+    def discard(self, vehicle_pk: int):
+        """Drop a deleted vehicle's segments"""
+        if not (self.root / f"v{vehicle_pk}").exists():
+            return
+        with self._locked(wait=True):
+            shutil.rmtree(self.root / f"v{vehicle_pk}", ignore_errors=True)
+
+    def sync(self, db: Session) -> dict:
+        """Append one batch of gps_logs rows past the watermark"""
+        with self._locked(wait=False) as locked:
+            if not locked:
+                return {"last_log_id": self.watermark(), "rows_appended": 0, "caught_up": True}
+
+            watermark = self.watermark()
+            newest = db.query(func.max(GPSLog.id)).scalar() or 0
+            if newest < watermark:
+                # gps_logs was emptied and its ids restarted
+                self._clear()
+                watermark, self._settled_log_id = 0, None
+                self._seen.clear()
+
+            self._settle(newest)
+            rows = []
+            if self._settled_log_id is not None:
+                rows = db.query(
+                    GPSLog.id, GPSLog.vehicle_id, GPSLog.timestamp, GPSLog.latitude, GPSLog.longitude,
+                    GPSLog.speed, GPSLog.heading, GPSLog.is_idle
+                ).filter(
+                    GPSLog.id > watermark,
+                    GPSLog.id <= self._settled_log_id
+                ).order_by(GPSLog.id).limit(self.batch_size).all()
+
+            blocks = self.append(rows) if rows else 0
+            if rows:
+                watermark = rows[-1][0]
+                self._save_watermark(watermark)
+            caught_up = len(rows) < self.batch_size
+            self._prune()
+
+        return {
+            "last_log_id": watermark,
+            "rows_appended": len(rows),
+            "blocks_written": blocks,
+            "caught_up": caught_up
+        }
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "interval": self.interval,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            **self.last_result
+        }
+
+    def _settle(self, newest: int):
+        """Move on to the newest id seen by a run commit_lag seconds ago, then note this run's"""
+        now = time.monotonic()
+        while self._seen and self._seen[0][0] <= now - self.commit_lag:
+            self._settled_log_id = self._seen.popleft()[1]
+        self._seen.append((now, newest))
+
+    def _read_day(self, directory: Path, day: date, first: int, last: int) -> List[TrackColumns]:
+        try:
+            entries = np.fromfile(directory / f"{day.isoformat()}.idx", dtype=np.uint8)
+        except FileNotFoundError:
+            return []
+        # A partly written trailing entry is ignored
+        entries = entries[:len(entries) // INDEX_ENTRY.itemsize * INDEX_ENTRY.itemsize].view(INDEX_ENTRY)
+        entries = entries[(entries["first"] <= last) & (entries["last"] >= first)]
+        if not len(entries):
+            return []
+        with open(directory / f"{day.isoformat()}.seg", "rb") as segment:
+            mapped = mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            data = np.frombuffer(mapped, dtype=np.uint8)
+            parts = [decode_block(data[entry["offset"]:entry["offset"] + entry["length"]]) for entry in entries]
+            del data
+        finally:
+            mapped.close()
+        return parts
+
+    def _save_watermark(self, value: int):
+        path = self.root / WATERMARK_FILE
+        staging = path.with_name(WATERMARK_FILE + ".tmp")
+        staging.write_text(str(value))
+        os.replace(staging, path)
+
+    def _clear(self):
+        for entry in self.root.glob("v*"):
+            shutil.rmtree(entry, ignore_errors=True)
+        (self.root / WATERMARK_FILE).unlink(missing_ok=True)
+
+    def _prune(self):
+        """Once a day, drop segments past the gps_logs retention window"""
+        today = datetime.utcnow().date()
+        if settings.gps_log_retention_days <= 0 or self._pruned_on == today:
+            return
+        cutoff = today - timedelta(days=settings.gps_log_retention_days)
+        for path in self.root.glob("v*/*.*"):
+            if path.suffix in (".seg", ".idx") and date.fromisoformat(path.stem) < cutoff:
+                path.unlink()
+        self._pruned_on = today
+
+    @contextmanager
+    def _locked(self, wait: bool):
+        """Serializes writers across workers; yields False when another holds it and wait is off"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / LOCK_FILE, "a+") as lock:
+            if not self._acquire(lock, wait):
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+                else:
+                    lock.seek(0)
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @staticmethod
+    def _acquire(lock, wait: bool) -> bool:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            return True
+        # msvcrt locks a byte range from the current position; LK_LOCK gives up
+        # after ten seconds, so waiting polls the non-blocking form instead
+        while True:
+            lock.seek(0)
+            try:
+                msvcrt.locking(lock.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not wait:
+                    return False
+                time.sleep(0.1)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self.last_result = await loop.run_in_executor(None, self._sync_once)
+                self.last_run = datetime.utcnow()
+                if self.last_result["caught_up"]:
+                    await asyncio.sleep(self.interval)
+            except Exception as e:
+                logging.error(f"Track store sync failed: {e}")
+                await asyncio.sleep(self.interval)
+
+    def _sync_once(self) -> dict:
+        db = SessionLocal()
+        try:
+            return self.sync(db)
+        finally:
+            db.close()
+
+track_store = TrackStore(
+    root=settings.track_store_dir,
+    enabled=settings.track_store_enabled,
+    interval=settings.track_store_interval,
+    batch_size=settings.track_store_batch_size,
+    commit_lag=settings.track_store_commit_lag
+)
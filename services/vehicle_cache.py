@@ -0,0 +1,183 @@
+"""
+In-process vehicle registry cache
+
+Maps the external vehicle_id string to a snapshot of the vehicle row so the
+ingest and lookup paths do not query the vehicles table on every request.
+Unknown IDs are cached as misses for a shorter time. Vehicle writes bump the
+"vehicles" cache version; every few seconds the registry compares it and
+drops all entries when a vehicle was changed, possibly by another worker.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from database.models import Vehicle, VehicleType, VehicleStatus
+from services.geofence import get_version
+
+VEHICLES_VERSION_KEY = "vehicles"
+
+@dataclass(frozen=True)
+class CachedVehicle:
+    id: int
+    vehicle_id: str
+    license_plate: Optional[str]
+    vehicle_type: VehicleType
+    status: VehicleStatus
+    driver_name: Optional[str]
+    driver_phone: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_model(cls, vehicle: Vehicle) -> "CachedVehicle":
+        return cls(
+            id=vehicle.id,
+            vehicle_id=vehicle.vehicle_id,
+            license_plate=vehicle.license_plate,
+            vehicle_type=vehicle.vehicle_type,
+            status=vehicle.status,
+            driver_name=vehicle.driver_name,
+            driver_phone=vehicle.driver_phone,
+            created_at=vehicle.created_at,
+            updated_at=vehicle.updated_at
+        )
+
+class VehicleRegistry:
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0, negative_ttl: float = 30.0,
+                 version_check_interval: float = 2.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.version_check_interval = version_check_interval
+
+        # vehicle_id -> (CachedVehicle or None for a known miss, expires_at)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._checked_at = float("-inf")
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, db: Session, vehicle_id: str) -> Optional[CachedVehicle]:
+        """
+        Resolve a vehicle_id, querying the database only on a cache miss
+        """
+        self._check_version(db)
+        found, vehicle = self._lookup(vehicle_id)
+        if found:
+            return vehicle
+
+        row = db.query(Vehicle).filter(Vehicle.vehicle_id == vehicle_id).first()
+        vehicle = CachedVehicle.from_model(row) if row else None
+        self._store(vehicle_id, vehicle)
+        return vehicle
+
+    def get_many(self, db: Session, vehicle_ids: Iterable[str]) -> Dict[str, CachedVehicle]:
+        """
+        Resolve several vehicle_ids with at most one query for the misses
+        """
+        self._check_version(db)
+        resolved = {}
+        missing = set()
+        for vehicle_id in set(vehicle_ids):
+            found, vehicle = self._lookup(vehicle_id)
+            if not found:
+                missing.add(vehicle_id)
+            elif vehicle is not None:
+                resolved[vehicle_id] = vehicle
+
+        if missing:
+            rows = db.query(Vehicle).filter(Vehicle.vehicle_id.in_(missing)).all()
+            for row in rows:
+                vehicle = CachedVehicle.from_model(row)
+                resolved[row.vehicle_id] = vehicle
+                self._store(row.vehicle_id, vehicle)
+            for vehicle_id in missing - set(resolved):
+                self._store(vehicle_id, None)
+
+        return resolved
+
+    def put(self, vehicle: Vehicle):
+        """Cache a freshly written vehicle row"""
+        self._store(vehicle.vehicle_id, CachedVehicle.from_model(vehicle))
+
+    def invalidate(self, vehicle_id: str):
+        """Drop a vehicle (or a cached miss) from the cache"""
+        with self._lock:
+            self._entries.pop(vehicle_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "version": self._version
+        }
+
+    def _check_version(self, db: Session):
+        """Clear the cache when the vehicles version moved; read at most once per interval"""
+        now = time.monotonic()
+        if now - self._checked_at < self.version_check_interval:
+            return
+        self._checked_at = now
+
+        version = get_version(db, VEHICLES_VERSION_KEY)
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._entries.clear()
+            self._version = version
+
+    def _lookup(self, vehicle_id: str) -> tuple:
+        with self._lock:
+            entry = self._entries.get(vehicle_id)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            vehicle, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[vehicle_id]
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(vehicle_id)
+            if vehicle is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, vehicle
+
+    def _store(self, vehicle_id: str, vehicle: Optional[CachedVehicle]):
+        ttl = self.ttl if vehicle is not None else self.negative_ttl
+        with self._lock:
+            self._entries[vehicle_id] = (vehicle, time.monotonic() + ttl)
+            self._entries.move_to_end(vehicle_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+vehicle_registry = VehicleRegistry(
+    max_size=settings.vehicle_cache_size,
+    ttl=settings.vehicle_cache_ttl,
+    negative_ttl=settings.vehicle_cache_negative_ttl,
+    version_check_interval=settings.vehicle_cache_version_check_interval
+)
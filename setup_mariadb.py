@@ -83,8 +83,8 @@ def create_tables(connection):
                 idle_duration INT DEFAULT 0,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE CASCADE,
-                INDEX idx_vehicle_id (vehicle_id),
-                INDEX idx_timestamp (timestamp),
+                INDEX idx_gps_logs_vehicle_time (vehicle_id, timestamp),
+                INDEX idx_gps_logs_time_speed (timestamp, speed, vehicle_id),
                 INDEX idx_location (latitude, longitude),
                 INDEX idx_is_idle (is_idle)
             )
@@ -128,7 +128,7 @@ def create_tables(connection):
                 INDEX idx_vehicle_id (vehicle_id),
                 INDEX idx_area_id (area_id),
                 INDEX idx_alert_type (alert_type),
-                INDEX idx_is_resolved (is_resolved),
+                INDEX idx_alerts_resolved_created (is_resolved, created_at),
                 INDEX idx_created_at (created_at)
             )
         """)
@@ -174,6 +174,108 @@ def create_tables(connection):
         """)
         print("✅ Created dashboard_stats table")
         
+        # Create vehicle_last_position table (one row per vehicle, kept current by upsert on ingest)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS vehicle_last_position (
+                vehicle_id INT PRIMARY KEY,
+                latitude DECIMAL(10, 8) NOT NULL,
+                longitude DECIMAL(11, 8) NOT NULL,
+                speed DECIMAL(6, 2),
+                heading DECIMAL(6, 2),
+                timestamp TIMESTAMP NOT NULL,
+                is_idle BOOLEAN DEFAULT FALSE,
+                idle_duration INT DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE CASCADE,
+                INDEX idx_updated_at (updated_at)
+            )
+        """)
+        print("✅ Created vehicle_last_position table")
+        
+        # Create geofence_events table (enter/exit/dwell timeline)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS geofence_events (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                vehicle_id INT NOT NULL,
+                area_id INT,
+                event_type ENUM('enter', 'exit', 'dwell_exceeded') NOT NULL,
+                latitude DECIMAL(10, 8) NOT NULL,
+                longitude DECIMAL(11, 8) NOT NULL,
+                timestamp TIMESTAMP NOT NULL,
+                dwell_seconds INT DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE CASCADE,
+                FOREIGN KEY (area_id) REFERENCES areas(id) ON DELETE SET NULL,
+                INDEX idx_geofence_events_vehicle_time (vehicle_id, timestamp),
+                INDEX idx_geofence_events_area_time (area_id, timestamp)
+            )
+        """)
+        print("✅ Created geofence_events table")
+        
+        # Create cache_versions table (invalidation counters for in-process caches)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS cache_versions (
+                name VARCHAR(50) PRIMARY KEY,
+                version INT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+        """)
+        print("✅ Created cache_versions table")
+        
+        # Create gps_rollups_1m / gps_rollups_15m tables (per-vehicle history aggregates, filled by services/rollups.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS gps_rollups_1m (
+                vehicle_id INT NOT NULL,
+                bucket_start TIMESTAMP NOT NULL,
+                fix_count INT NOT NULL,
+                first_latitude DECIMAL(10, 8) NOT NULL,
+                first_longitude DECIMAL(11, 8) NOT NULL,
+                first_timestamp TIMESTAMP NOT NULL,
+                last_latitude DECIMAL(10, 8) NOT NULL,
+                last_longitude DECIMAL(11, 8) NOT NULL,
+                last_timestamp TIMESTAMP NOT NULL,
+                avg_speed DECIMAL(6, 2),
+                max_speed DECIMAL(6, 2),
+                distance DECIMAL(10, 3) DEFAULT 0,
+                idle_seconds INT DEFAULT 0,
+                PRIMARY KEY (vehicle_id, bucket_start),
+                FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE CASCADE
+            )
+        """)
+        print("✅ Created gps_rollups_1m table")
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS gps_rollups_15m (
+                vehicle_id INT NOT NULL,
+                bucket_start TIMESTAMP NOT NULL,
+                fix_count INT NOT NULL,
+                first_latitude DECIMAL(10, 8) NOT NULL,
+                first_longitude DECIMAL(11, 8) NOT NULL,
+                first_timestamp TIMESTAMP NOT NULL,
+                last_latitude DECIMAL(10, 8) NOT NULL,
+                last_longitude DECIMAL(11, 8) NOT NULL,
+                last_timestamp TIMESTAMP NOT NULL,
+                avg_speed DECIMAL(6, 2),
+                max_speed DECIMAL(6, 2),
+                distance DECIMAL(10, 3) DEFAULT 0,
+                idle_seconds INT DEFAULT 0,
+                PRIMARY KEY (vehicle_id, bucket_start),
+                FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE CASCADE
+            )
+        """)
+        print("✅ Created gps_rollups_15m table")
+        
+        # Create rollup_watermarks table (how far the rollup job has read gps_logs)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rollup_watermarks (
+                name VARCHAR(50) PRIMARY KEY,
+                last_log_id INT NOT NULL DEFAULT 0,
+                complete_until TIMESTAMP NULL DEFAULT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+        """)
+        print("✅ Created rollup_watermarks table")
+        
         cursor.close()
         return True
     except Exception as e:
@@ -203,7 +305,7 @@ def insert_sample_data(connection):
         # Insert sample areas
         areas_data = [
             ('คลังสินค้าหลัก', 'checkpoint', 'rectangle', '{"bounds": {"north": 13.8, "south": 13.7, "east": 100.6, "west": 100.5}}', 50.0),
-            ('พื้นที่แจ้งเตือน', 'alert', 'circle', '{"center": {"lat": 13.7563, "lng": 100.5018}, "radius": 0.01}', 100.0),
+            ('พื้นที่แจ้งเตือน', 'alert', 'circle', '{"center": {"lat": 13.7563, "lng": 100.5018}, "radius": 1000}', 100.0),
             ('พื้นที่วิกฤต', 'critical', 'polygon', '{"points": [{"lat": 13.75, "lng": 100.50}, {"lat": 13.76, "lng": 100.50}, {"lat": 13.76, "lng": 100.51}, {"lat": 13.75, "lng": 100.51}]}', 25.0),
             ('ทางเข้าหลัก', 'entrance', 'rectangle', '{"bounds": {"north": 13.77, "south": 13.74, "east": 100.52, "west": 100.49}}', 30.0)
         ]
@@ -232,6 +334,24 @@ def insert_sample_data(connection):
         """, gps_data)
         print("✅ Inserted sample GPS logs")
         
+        cursor.execute("""
+            INSERT INTO vehicle_last_position (vehicle_id, latitude, longitude, speed, heading, timestamp, is_idle, idle_duration)
+            SELECT gl.vehicle_id, gl.latitude, gl.longitude, gl.speed, gl.heading, gl.timestamp, gl.is_idle, gl.idle_duration
+            FROM gps_logs gl
+            WHERE gl.id IN (
+                SELECT MAX(id) FROM gps_logs GROUP BY vehicle_id
+            )
+            ON DUPLICATE KEY UPDATE
+                latitude = IF(VALUES(timestamp) >= timestamp, VALUES(latitude), latitude),
+                longitude = IF(VALUES(timestamp) >= timestamp, VALUES(longitude), longitude),
+                speed = IF(VALUES(timestamp) >= timestamp, VALUES(speed), speed),
+                heading = IF(VALUES(timestamp) >= timestamp, VALUES(heading), heading),
+                is_idle = IF(VALUES(timestamp) >= timestamp, VALUES(is_idle), is_idle),
+                idle_duration = IF(VALUES(timestamp) >= timestamp, VALUES(idle_duration), idle_duration),
+                timestamp = IF(VALUES(timestamp) >= timestamp, VALUES(timestamp), timestamp)
+        """)
+        print("✅ Seeded vehicle_last_position")
+        
         connection.commit()
         cursor.close()
         return True
@@ -254,19 +374,14 @@ def create_views(connection):
                 v.vehicle_type,
                 v.status,
                 v.driver_name,
-                gl.latitude,
-                gl.longitude,
-                gl.speed,
-                gl.heading,
-                gl.timestamp,
-                gl.is_idle
+                lp.latitude,
+                lp.longitude,
+                lp.speed,
+                lp.heading,
+                lp.timestamp,
+                lp.is_idle
             FROM vehicles v
-            LEFT JOIN gps_logs gl ON v.id = gl.vehicle_id
-            WHERE gl.timestamp = (
-                SELECT MAX(timestamp) 
-                FROM gps_logs gl2 
-                WHERE gl2.vehicle_id = v.id
-            )
+            JOIN vehicle_last_position lp ON lp.vehicle_id = v.id
         """)
         print("✅ Created vehicle_latest_locations view")
         
@@ -3,6 +3,9 @@ class GPSTrackingMap {
     constructor() {
         this.map = null;
         this.vehicleMarkers = new Map();
+        this.clusterLayer = null;
+        this.clustered = false;
+        this.etags = {};
         this.areaLayers = new Map();
         this.routeLayers = new Map();
         this.drawControl = null;
@@ -10,6 +13,10 @@ class GPSTrackingMap {
         this.showAreas = true;
         this.showRoutes = true;
         this.refreshInterval = null;
+        this.alerts = [];
+        this.socket = null;
+        this.liveConnected = false;
+        this.reconnectDelay = 1000;
         
         this.init();
     }
@@ -19,6 +26,7 @@ class GPSTrackingMap {
         this.initEventListeners();
         this.loadInitialData();
         this.startAutoRefresh();
+        this.connectLiveFeed();
     }
     
     initMap() {
@@ -33,6 +41,13 @@ class GPSTrackingMap {
         
         // Initialize draw control
         this.initDrawControl();
+        
+        this.clusterLayer = L.layerGroup().addTo(this.map);
+        
+        // Vehicles are requested per viewport and zoom; the server clusters them when zoomed out
+        this.map.on('moveend', () => {
+            this.loadVehicleLocations();
+        });
     }
     
     initDrawControl() {
@@ -149,19 +164,42 @@ class GPSTrackingMap {
     
     async loadVehicleLocations() {
         try {
-            const response = await fetch('/api/dashboard/vehicle-locations');
-            const locations = await response.json();
+            const bounds = this.map.getBounds().pad(0.2);
+            const params = new URLSearchParams({
+                bbox: [bounds.getSouth(), bounds.getWest(), bounds.getNorth(), bounds.getEast()].join(','),
+                zoom: this.map.getZoom()
+            });
+            const response = await fetch(`/api/dashboard/vehicle-locations?${params}`);
+            const view = await response.json();
+            
+            this.clustered = view.clustered;
+            this.updateVehicleMarkers(view.vehicles);
+            this.updateClusterMarkers(view.clusters);
             
-            this.updateVehicleMarkers(locations);
+            // The live feed only pushes individual vehicles while they are not clustered
+            this.sendViewport();
         } catch (error) {
             console.error('Error loading vehicle locations:', error);
         }
     }
     
+    async fetchIfModified(url) {
+        // Revalidate with the last ETag; resolves to null when the server answers 304
+        const headers = this.etags[url] ? { 'If-None-Match': this.etags[url] } : {};
+        const response = await fetch(url, { headers });
+        if (response.status === 304) return null;
+        
+        const etag = response.headers.get('ETag');
+        if (etag) {
+            this.etags[url] = etag;
+        }
+        return response.json();
+    }
+    
     async loadAreas() {
         try {
-            const response = await fetch('/api/areas/');
-            const data = await response.json();
+            const data = await this.fetchIfModified('/api/areas/');
+            if (!data) return;
             
             this.updateAreaLayers(data.items);
             this.updateAreaList(data.items);
@@ -173,9 +211,9 @@ class GPSTrackingMap {
     async loadAlerts() {
         try {
             const response = await fetch('/api/dashboard/alerts?limit=10');
-            const alerts = await response.json();
+            this.alerts = await response.json();
             
-            this.updateAlertsList(alerts);
+            this.updateAlertsList(this.alerts);
         } catch (error) {
             console.error('Error loading alerts:', error);
         }
@@ -183,8 +221,8 @@ class GPSTrackingMap {
     
     async loadDashboardStats() {
         try {
-            const response = await fetch('/api/dashboard/stats');
-            const stats = await response.json();
+            const stats = await this.fetchIfModified('/api/dashboard/stats');
+            if (!stats) return;
             
             this.updateDashboardStats(stats);
         } catch (error) {
@@ -193,20 +231,77 @@ class GPSTrackingMap {
     }
     
     updateVehicleMarkers(locations) {
-        // Clear existing markers
-        this.vehicleMarkers.forEach(marker => {
-            this.map.removeLayer(marker);
+        // Update markers in place and remove those no longer reported
+        const seen = new Set();
+        locations.forEach(location => {
+            this.upsertVehicleMarker(location);
+            seen.add(location.vehicle_id);
         });
-        this.vehicleMarkers.clear();
         
-        // Add new markers
-        locations.forEach(location => {
-            const marker = this.createVehicleMarker(location);
-            this.vehicleMarkers.set(location.vehicle_id, marker);
+        this.vehicleMarkers.forEach((marker, vehicleId) => {
+            if (!seen.has(vehicleId)) {
+                this.removeVehicleMarker(vehicleId);
+            }
         });
     }
     
-    createVehicleMarker(location) {
+    updateClusterMarkers(clusters) {
+        this.clusterLayer.clearLayers();
+        clusters.forEach(cluster => {
+            const size = cluster.count < 100 ? 34 : cluster.count < 1000 ? 42 : 50;
+            const className = cluster.statuses.breakdown ? 'vehicle-cluster has-breakdown' : 'vehicle-cluster';
+            const breakdown = Object.entries(cluster.statuses)
+                .map(([status, count]) => `<p><strong>${status}:</strong> ${count}</p>`)
+                .join('');
+            
+            L.marker([cluster.latitude, cluster.longitude], {
+                icon: L.divIcon({
+                    className: className,
+                    html: `<div>${cluster.count}</div>`,
+                    iconSize: [size, size],
+                    iconAnchor: [size / 2, size / 2]
+                })
+            })
+                .bindTooltip(`<div class="vehicle-popup"><h4>${cluster.count} vehicles</h4>${breakdown}</div>`)
+                .on('click', () => {
+                    const [south, west, north, east] = cluster.bounds;
+                    this.map.fitBounds([[south, west], [north, east]], { padding: [40, 40] });
+                })
+                .addTo(this.clusterLayer);
+        });
+    }
+    
+    upsertVehicleMarker(location) {
+        const marker = this.vehicleMarkers.get(location.vehicle_id);
+        if (!marker) {
+            this.vehicleMarkers.set(location.vehicle_id, this.createVehicleMarker(location));
+            return;
+        }
+        
+        const previous = marker.location;
+        if (previous.latitude !== location.latitude || previous.longitude !== location.longitude) {
+            marker.setLatLng([location.latitude, location.longitude]);
+        }
+        if (previous.status !== location.status || previous.is_idle !== location.is_idle) {
+            marker.setIcon(this.createVehicleIcon(location));
+        }
+        marker.setPopupContent(this.createVehiclePopup(location));
+        marker.location = location;
+        
+        if (this.currentVehicle && this.currentVehicle.vehicle_id === location.vehicle_id) {
+            this.showVehicleInfo(location);
+        }
+    }
+    
+    removeVehicleMarker(vehicleId) {
+        const marker = this.vehicleMarkers.get(vehicleId);
+        if (marker) {
+            this.map.removeLayer(marker);
+            this.vehicleMarkers.delete(vehicleId);
+        }
+    }
+    
+    createVehicleIcon(location) {
         const status = location.status.toLowerCase();
         const isIdle = location.is_idle;
         
@@ -217,15 +312,18 @@ class GPSTrackingMap {
             iconClass += ` ${status}`;
         }
         
-        const icon = L.divIcon({
+        return L.divIcon({
             className: iconClass,
             html: `<div style="width: 20px; height: 20px; border-radius: 50%; background: inherit; border: 3px solid white; box-shadow: 0 2px 10px rgba(0,0,0,0.3);"></div>`,
             iconSize: [26, 26],
             iconAnchor: [13, 13]
         });
-        
-        const marker = L.marker([location.latitude, location.longitude], { icon })
+    }
+    
+    createVehicleMarker(location) {
+        const marker = L.marker([location.latitude, location.longitude], { icon: this.createVehicleIcon(location) })
             .addTo(this.map);
+        marker.location = location;
         
         // Add popup
         const popupContent = this.createVehiclePopup(location);
@@ -233,7 +331,7 @@ class GPSTrackingMap {
         
         // Add click event
         marker.on('click', () => {
-            this.showVehicleInfo(location);
+            this.showVehicleInfo(marker.location);
         });
         
         return marker;
@@ -582,14 +680,66 @@ class GPSTrackingMap {
     }
     
     startAutoRefresh() {
-        // Refresh data every 30 seconds
+        // Refresh data every 30 seconds; unclustered vehicles and alerts arrive over the live feed when connected
         this.refreshInterval = setInterval(() => {
-            this.loadVehicleLocations();
-            this.loadAlerts();
+            if (!this.liveConnected || this.clustered) {
+                this.loadVehicleLocations();
+            }
+            if (!this.liveConnected) {
+                this.loadAlerts();
+            }
             this.loadDashboardStats();
         }, 30000);
     }
     
+    connectLiveFeed() {
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        this.socket = new WebSocket(`${protocol}//${window.location.host}/ws/live`);
+        
+        this.socket.addEventListener('open', () => {
+            this.liveConnected = true;
+            this.reconnectDelay = 1000;
+            this.sendViewport();
+        });
+        
+        this.socket.addEventListener('message', (event) => {
+            this.applyLiveFrame(JSON.parse(event.data));
+        });
+        
+        this.socket.addEventListener('close', () => {
+            // Fall back to polling until the feed is back
+            this.liveConnected = false;
+            setTimeout(() => this.connectLiveFeed(), this.reconnectDelay);
+            this.reconnectDelay = Math.min(this.reconnectDelay * 2, 30000);
+        });
+    }
+    
+    sendViewport() {
+        if (!this.socket || this.socket.readyState !== WebSocket.OPEN) return;
+        
+        const bounds = this.map.getBounds().pad(0.2);
+        this.socket.send(JSON.stringify({
+            type: 'subscribe',
+            bbox: [bounds.getSouth(), bounds.getWest(), bounds.getNorth(), bounds.getEast()],
+            vehicles: !this.clustered
+        }));
+    }
+    
+    applyLiveFrame(frame) {
+        // While clustered, vehicles come from the HTTP view and the feed only carries alerts
+        if (!this.clustered && frame.type === 'snapshot') {
+            this.updateVehicleMarkers(frame.vehicles);
+        } else if (!this.clustered && frame.type === 'delta') {
+            frame.vehicles.forEach(location => this.upsertVehicleMarker(location));
+            frame.removed.forEach(vehicleId => this.removeVehicleMarker(vehicleId));
+        }
+        
+        if (frame.alerts && frame.alerts.length) {
+            this.alerts = frame.alerts.slice().reverse().concat(this.alerts).slice(0, 10);
+            this.updateAlertsList(this.alerts);
+        }
+    }
+    
     showNotification(message, type = 'info') {
         // Simple notification system
         const notification = document.createElement('div');
@@ -86,7 +86,7 @@ def create_test_area():
         "shape": "circle",
         "coordinates": {
             "center": {"lat": 13.7563, "lng": 100.5018},
-            "radius": 0.01
+            "radius": 1000  # meters
         },
         "buffer_distance": 50.0
     }
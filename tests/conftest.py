@@ -0,0 +1,68 @@
+"""
+Shared test setup: a throwaway SQLite database and quiet background jobs
+
+The environment is set before any application module is imported, since
+config.settings and database.database read it at import time.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+TEST_DIR = Path(tempfile.mkdtemp(prefix="gps_tracker_tests_"))
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{TEST_DIR / 'gps_test.db'}",
+    "LOG_FILE": str(TEST_DIR / "gps_test.log"),
+    "API_DEBUG": "false",
+    "GPS_WRITE_BEHIND_ENABLED": "false",
+    "GPS_ROLLUP_INTERVAL": "3600",
+    "TRACK_STORE_DIR": str(TEST_DIR / "tracks"),
+    "GPS_ARCHIVE_DIR": str(TEST_DIR / "archive")
+})
+sys.path.insert(0, str(ROOT))
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def db(client):
+    from database.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def new_vehicle(client):
+    """Create a vehicle through the API; returns its vehicle_id"""
+    created = []
+
+    def create(vehicle_type: str = "truck") -> str:
+        vehicle_id = f"T{len(created)}-{os.urandom(4).hex()}"
+        response = client.post("/api/vehicles/", json={"vehicle_id": vehicle_id, "vehicle_type": vehicle_type})
+        assert response.status_code == 200, response.text
+        created.append(vehicle_id)
+        return vehicle_id
+
+    return create
+
+def ingest(client, vehicle_id: str, fixes):
+    """Send (timestamp, latitude, longitude, speed) fixes through the batch endpoint"""
+    response = client.post("/api/gps/batch", json=[
+        {"vehicle_id": vehicle_id, "latitude": lat, "longitude": lon, "speed": speed, "timestamp": timestamp.isoformat()}
+        for timestamp, lat, lon, speed in fixes
+    ])
+    assert response.status_code == 200, response.text
+    assert response.json()["rejected"] == 0, response.text
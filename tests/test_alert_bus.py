@@ -0,0 +1,24 @@
+from database.models import Alert, Vehicle
+from services.alert_bus import AlertBus
+
+def add_alert(db, vehicle_pk: int, alert_id=None) -> int:
+    alert = Alert(id=alert_id, vehicle_id=vehicle_pk, alert_type="idle", message="Vehicle idle")
+    db.add(alert)
+    db.commit()
+    return alert.id
+
+def test_poll_publishes_an_alert_whose_lower_id_commits_late(db, new_vehicle):
+    vehicle_pk = db.query(Vehicle.id).filter(Vehicle.vehicle_id == new_vehicle()).scalar()
+    bus = AlertBus(poll_interval=60)
+    bus.poll(db)  # the first poll only notes the newest id
+
+    first = add_alert(db, vehicle_pk)
+    # The next id was allocated by another worker whose transaction is still open
+    higher = add_alert(db, vehicle_pk, first + 2)
+    bus.poll(db)
+    assert [payload["id"] for payload in bus.since(first - 1)] == [first, higher]
+
+    late = add_alert(db, vehicle_pk, first + 1)
+    bus.poll(db)
+    bus.poll(db)
+    assert [payload["id"] for payload in bus.since(first)] == [higher, late]
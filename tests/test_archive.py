@@ -0,0 +1,36 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from database.models import GPSLog, Vehicle
+from services.archive import GPSArchive
+from conftest import ingest
+
+DAY = date(2025, 2, 3)
+
+def day_rows(db, vehicle_pk: int) -> int:
+    start = datetime.combine(DAY, datetime.min.time())
+    return db.query(GPSLog).filter(
+        GPSLog.vehicle_id == vehicle_pk, GPSLog.timestamp >= start, GPSLog.timestamp < start + timedelta(days=1)
+    ).count()
+
+def test_archive_is_rebuilt_when_rows_arrive_after_it(tmp_path, client, db, new_vehicle):
+    vehicle_id = new_vehicle()
+    vehicle_pk = db.query(Vehicle.id).filter(Vehicle.vehicle_id == vehicle_id).scalar()
+    start = datetime.combine(DAY, datetime.min.time())
+    ingest(client, vehicle_id, [(start + timedelta(hours=step), 13.7, 100.5, 20.0) for step in range(5)])
+    archive = GPSArchive(str(tmp_path))
+
+    assert archive.archive_days(DAY, DAY + timedelta(days=1), expected_rows=day_rows(db, vehicle_pk))
+    assert archive.archived_rows([DAY]) == 5
+
+    # A late upload for an archived day: the count no longer matches, so the day is rebuilt
+    ingest(client, vehicle_id, [(start + timedelta(hours=23, minutes=59), 13.7, 100.5, 20.0)])
+    assert archive.archive_days(DAY, DAY + timedelta(days=1), expected_rows=day_rows(db, vehicle_pk))
+    assert archive.archived_rows([DAY]) == 6
+
+def test_archive_refuses_when_counts_disagree(tmp_path, client):
+    archive = GPSArchive(str(tmp_path))
+    assert not archive.archive_days(DAY, DAY + timedelta(days=1), expected_rows=10 ** 6)
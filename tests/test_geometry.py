@@ -0,0 +1,49 @@
+import math
+import random
+
+import numpy as np
+
+from services.geometry import PolygonEdges, PolygonSet, points_in_polygon
+
+def scalar_contains(points, lat, lon):
+    """Plain even-odd ray cast, one edge at a time"""
+    inside = False
+    for (lat0, lon0), (lat1, lon1) in zip(points, points[1:] + points[:1]):
+        if (lat0 > lat) != (lat1 > lat):
+            crossing = lon0 + (lat - lat0) * (lon1 - lon0) / (lat1 - lat0)
+            if lon < crossing:
+                inside = not inside
+    return inside
+
+def random_polygon(rng, sides: int):
+    """Star-shaped polygon around a random centre, concave in places"""
+    lat, lon = rng.uniform(13.6, 13.9), rng.uniform(100.4, 100.7)
+    angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(sides))
+    return [
+        (lat + radius * math.sin(angle), lon + radius * math.cos(angle))
+        for angle, radius in ((angle, rng.uniform(0.005, 0.05)) for angle in angles)
+    ]
+
+def test_points_in_polygon_matches_scalar():
+    rng = random.Random(7)
+    for _ in range(20):
+        polygon = random_polygon(rng, rng.randint(3, 40))
+        lats = np.array([rng.uniform(13.55, 13.95) for _ in range(500)])
+        lons = np.array([rng.uniform(100.35, 100.75) for _ in range(500)])
+        expected = [scalar_contains(polygon, lat, lon) for lat, lon in zip(lats, lons)]
+        assert points_in_polygon(PolygonEdges(polygon), lats, lons).tolist() == expected
+
+def test_polygon_set_matches_scalar():
+    rng = random.Random(8)
+    polygons = [random_polygon(rng, rng.randint(3, 25)) for _ in range(30)]
+    packed = PolygonSet([PolygonEdges(polygon) for polygon in polygons])
+    for _ in range(300):
+        lat, lon = rng.uniform(13.55, 13.95), rng.uniform(100.35, 100.75)
+        expected = [scalar_contains(polygon, lat, lon) for polygon in polygons]
+        assert packed.contains_point(lat, lon).tolist() == expected
+
+def test_horizontal_edges_and_degenerate_polygons():
+    square = [(0.0, 0.0), (0.0, 1.0), (1.0, 1.0), (1.0, 0.0)]
+    assert points_in_polygon(PolygonEdges(square), [0.5, 0.5, 1.5], [0.5, 1.5, 0.5]).tolist() == [True, False, False]
+    assert not points_in_polygon(PolygonEdges(square[:2]), [0.0], [0.5]).any()
+    assert PolygonSet([]).contains_point(0.5, 0.5).tolist() == []
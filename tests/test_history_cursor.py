@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects.mysql import pymysql
+
+from api.gps_api import CountMode, count_rows, decode_history_cursor, encode_history_cursor
+from database.models import GPSLog
+from conftest import ingest
+
+def test_cursor_round_trip():
+    timestamp = datetime(2026, 3, 1, 8, 30, 15, 123456)
+    assert decode_history_cursor(encode_history_cursor(timestamp, 987654321)) == (timestamp, 987654321)
+
+def test_cursor_is_url_safe_and_stores_utc():
+    aware = datetime(2026, 3, 1, 15, 0, tzinfo=timezone(timedelta(hours=7)))
+    cursor = encode_history_cursor(aware, 1)
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_history_cursor(cursor) == (datetime(2026, 3, 1, 8, 0), 1)
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "bm9waXBl", encode_history_cursor(datetime(2026, 1, 1), 1)[:-3]])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_history_cursor(cursor)
+    assert error.value.status_code == 400
+
+def test_cursor_pages_cover_every_fix_once(client, new_vehicle):
+    vehicle_id = new_vehicle()
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+    # Pairs of fixes share a timestamp so pages must break ties by id
+    ingest(client, vehicle_id, [
+        (start + timedelta(seconds=10 * (index // 2)), 13.7 + index * 1e-4, 100.5, 30.0)
+        for index in range(25)
+    ])
+
+    seen, cursor = [], ""
+    while cursor is not None:
+        page = client.get(f"/api/gps/vehicle/{vehicle_id}/history", params={"cursor": cursor, "size": 4}).json()
+        seen.extend((item["timestamp"], item["id"]) for item in page["items"])
+        cursor = page["next_cursor"]
+
+    assert len(seen) == 25
+    assert len(set(seen)) == 25
+    assert seen == sorted(seen, reverse=True)
+
+class ExplainSession:
+    """Stands in for a MariaDB session and answers EXPLAIN with a fixed plan"""
+
+    def __init__(self):
+        self.dialect = pymysql.dialect()
+        self.executed = None
+
+    def get_bind(self):
+        return self
+
+    def connection(self):
+        return self
+
+    def exec_driver_sql(self, sql, params):
+        self.executed = (sql, params)
+        return self
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return [{"rows": 40}, {"rows": None}, {"rows": 2}]
+
+def test_approximate_count_passes_positional_parameters_to_explain(db):
+    since = datetime(2026, 3, 1)
+    query = db.query(GPSLog).filter(GPSLog.vehicle_id == 7, GPSLog.timestamp >= since)
+    session = ExplainSession()
+
+    assert count_rows(session, query, CountMode.APPROXIMATE) == (42, True)
+    sql, params = session.executed
+    assert sql.startswith("EXPLAIN SELECT")
+    # pymysql formats %s placeholders from a sequence, in the order they appear
+    assert sql.count("%s") == 2 and params == (7, since)
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from services.live_state import LiveStateStore
+
+T0 = datetime(2026, 6, 1, 8, 0)
+VEHICLE = 10 ** 9  # no vehicle_last_position row, so state starts from the first fix
+
+def fix(seconds: int, speed: float) -> SimpleNamespace:
+    return SimpleNamespace(timestamp=T0 + timedelta(seconds=seconds), latitude=13.7, longitude=100.5,
+                           speed=speed, heading=None)
+
+def test_state_chains_within_a_transaction_and_applies_on_commit(db):
+    store = LiveStateStore(idle_timeout=60)
+    store.update(db, VEHICLE, fix(0, 0.0))
+    store.update(db, VEHICLE, fix(30, 0.0))
+    assert len(store) == 0
+    assert store.update(db, VEHICLE, fix(90, 0.0)) == (True, 90, True)
+
+    db.commit()
+    assert store.get(db, VEHICLE).idle_alerted
+    # The alert was raised once, in the committed transaction
+    assert store.update(db, VEHICLE, fix(120, 0.0)) == (True, 120, False)
+
+def test_rolled_back_fixes_leave_the_committed_state(db):
+    store = LiveStateStore(idle_timeout=60)
+    store.update(db, VEHICLE, fix(0, 0.0))
+    db.commit()
+
+    store.update(db, VEHICLE, fix(90, 0.0))
+    db.rollback()
+    state = store.get(db, VEHICLE)
+    assert (state.timestamp, state.idle_alerted) == (T0, False)
+    assert store.update(db, VEHICLE, fix(90, 0.0), defer=False).alert_due
+    assert store.get(db, VEHICLE).idle_alerted
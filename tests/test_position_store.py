@@ -0,0 +1,77 @@
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects import mysql
+
+from database.models import Vehicle, VehicleLastPosition, VehicleType
+from services.position_store import LAST_POSITION_COLUMNS, upsert_last_positions
+
+def make_vehicle(db, vehicle_id: str) -> Vehicle:
+    vehicle = Vehicle(vehicle_id=vehicle_id, vehicle_type=VehicleType.TRUCK)
+    db.add(vehicle)
+    db.commit()
+    return vehicle
+
+def fix(vehicle: Vehicle, timestamp: datetime, latitude: float) -> dict:
+    return {"vehicle_id": vehicle.id, "latitude": latitude, "longitude": 100.5, "timestamp": timestamp}
+
+def stored(db, vehicle: Vehicle) -> VehicleLastPosition:
+    db.expire_all()
+    return db.get(VehicleLastPosition, vehicle.id)
+
+def test_older_fix_never_replaces_newer(db):
+    vehicle = make_vehicle(db, "UPSERT-1")
+    now = datetime(2026, 1, 1, 12, 0)
+    upsert_last_positions(db, [fix(vehicle, now, 13.1)])
+    db.commit()
+
+    upsert_last_positions(db, [fix(vehicle, now - timedelta(minutes=5), 13.2)])
+    db.commit()
+    assert (stored(db, vehicle).latitude, stored(db, vehicle).timestamp) == (13.1, now)
+
+    upsert_last_positions(db, [fix(vehicle, now, 13.3)])
+    db.commit()
+    assert stored(db, vehicle).latitude == 13.3
+
+    upsert_last_positions(db, [fix(vehicle, now + timedelta(seconds=1), 13.4)])
+    db.commit()
+    assert (stored(db, vehicle).latitude, stored(db, vehicle).timestamp) == (13.4, now + timedelta(seconds=1))
+
+def test_newest_fix_of_a_batch_wins_whatever_its_order(db):
+    vehicle = make_vehicle(db, "UPSERT-2")
+    now = datetime(2026, 1, 1, 12, 0)
+    upsert_last_positions(db, [
+        fix(vehicle, now + timedelta(seconds=10), 13.5),
+        fix(vehicle, now, 13.6),
+        fix(vehicle, now + timedelta(seconds=5), 13.7)
+    ])
+    db.commit()
+    assert stored(db, vehicle).latitude == 13.5
+
+class CapturingSession:
+    """Stands in for a MariaDB session and keeps the statement instead of running it"""
+
+    def __init__(self):
+        self.statement = None
+
+    def get_bind(self):
+        return self
+
+    @property
+    def dialect(self):
+        return mysql.dialect()
+
+    def execute(self, statement):
+        self.statement = statement
+
+def test_mysql_upsert_assigns_timestamp_last():
+    # MySQL applies ON DUPLICATE KEY UPDATE assignments left to right, so every
+    # other column's guard must run before timestamp is overwritten
+    assert LAST_POSITION_COLUMNS[-1] == "timestamp"
+    session = CapturingSession()
+    upsert_last_positions(session, [{
+        "vehicle_id": 1, "latitude": 13.7, "longitude": 100.5, "timestamp": datetime(2026, 1, 1)
+    }])
+    sql = str(session.statement.compile(dialect=mysql.dialect()))
+    assignments = sql.split("ON DUPLICATE KEY UPDATE", 1)[1]
+    assert re.findall(r"(\w+) = if\(", assignments, re.IGNORECASE) == list(LAST_POSITION_COLUMNS)
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from services.rollups import (
+    MINUTE, QUARTER_HOUR, choose_level, gps_rollup_job, merge_buckets, rolled_up_until, summarize_fixes
+)
+from conftest import ingest
+
+T0 = datetime(2026, 5, 1, 8, 0)
+
+def at(seconds: float) -> datetime:
+    return T0 + timedelta(seconds=seconds)
+
+@pytest.mark.parametrize("hours, max_points, expected", [
+    (1, 2000, None),  # 1.8 s per point: raw fixes
+    (24, 2000, None),  # 43 s per point
+    (24, 1000, MINUTE),  # 86 s per point
+    (24 * 10, 2000, MINUTE),  # 7.2 min per point
+    (24 * 30, 2000, QUARTER_HOUR),  # 21.6 min per point
+])
+def test_choose_level_picks_coarsest_level_within_budget(hours, max_points, expected):
+    assert choose_level(T0, T0 + timedelta(hours=hours), max_points) == expected
+
+def test_choose_level_uses_minutes_past_raw_retention():
+    assert choose_level(T0, T0 + timedelta(hours=1), 2000) is None
+    assert choose_level(T0, T0 + timedelta(hours=1), 2000, raw_since=T0 + timedelta(minutes=30)) == MINUTE
+    assert choose_level(T0, T0 + timedelta(hours=1), 2000, raw_since=T0) is None
+
+def test_summarize_fixes_buckets_legs_and_idle_time():
+    fixes = [
+        (at(10), 13.7000, 100.5, 30.0, False),
+        (at(40), 13.7010, 100.5, 50.0, False),
+        (at(70), 13.7010, 100.5, 0.0, True),
+        (at(100), 13.7010, 100.5, None, True),
+    ]
+    previous = (at(-20), 13.6990, 100.5, 20.0, False)
+    first, second = summarize_fixes(fixes, previous, MINUTE.width)
+
+    assert first["bucket_start"] == T0 and second["bucket_start"] == at(60)
+    assert (first["fix_count"], second["fix_count"]) == (2, 2)
+    assert (first["first_timestamp"], first["last_timestamp"]) == (at(10), at(40))
+    assert (first["avg_speed"], first["max_speed"]) == (40.0, 50.0)
+    # The leg from previous counts in the first bucket; roughly 111 m per 0.001 degree of latitude
+    assert first["distance"] == pytest.approx(0.2224, abs=1e-3)
+    assert second["distance"] == pytest.approx(0.0, abs=1e-9)
+    assert (second["avg_speed"], second["max_speed"]) == (0.0, 0.0)
+    # Idle only counts between two idle fixes
+    assert (first["idle_seconds"], second["idle_seconds"]) == (0, 30)
+
+def test_summarize_fixes_without_fixes():
+    assert summarize_fixes([], None, MINUTE.width) == []
+
+def test_merge_buckets_matches_summarizing_the_fixes_directly():
+    fixes = [(at(seconds), 13.7 + seconds * 1e-5, 100.5 + seconds * 1e-5, float(seconds % 70), seconds > 1500)
+             for seconds in range(0, 3600, 20)]
+    minutes = [SimpleNamespace(**bucket) for bucket in summarize_fixes(fixes, None, MINUTE.width)]
+    merged = merge_buckets(minutes, QUARTER_HOUR.width)
+    direct = summarize_fixes(fixes, None, QUARTER_HOUR.width)
+
+    assert len(merged) == len(direct) == 4
+    for merged_bucket, direct_bucket in zip(merged, direct):
+        for key in ("bucket_start", "fix_count", "first_timestamp", "last_timestamp",
+                    "first_latitude", "last_longitude", "max_speed", "idle_seconds"):
+            assert merged_bucket[key] == direct_bucket[key], key
+        assert merged_bucket["avg_speed"] == pytest.approx(direct_bucket["avg_speed"])
+        assert merged_bucket["distance"] == pytest.approx(direct_bucket["distance"])
+
+def test_merge_buckets_ignores_buckets_without_speed_in_average():
+    rows = [
+        SimpleNamespace(bucket_start=at(0), fix_count=2, avg_speed=10.0, max_speed=12.0, distance=0.1,
+                        idle_seconds=0, first_latitude=1, first_longitude=1, first_timestamp=at(0),
+                        last_latitude=2, last_longitude=2, last_timestamp=at(50)),
+        SimpleNamespace(bucket_start=at(60), fix_count=3, avg_speed=None, max_speed=None, distance=None,
+                        idle_seconds=40, first_latitude=2, first_longitude=2, first_timestamp=at(60),
+                        last_latitude=3, last_longitude=3, last_timestamp=at(110)),
+    ]
+    (bucket,) = merge_buckets(rows, QUARTER_HOUR.width)
+    assert bucket["fix_count"] == 5
+    assert (bucket["avg_speed"], bucket["max_speed"]) == (10.0, 12.0)
+    assert (bucket["distance"], bucket["idle_seconds"]) == (0.1, 40)
+    assert (bucket["first_timestamp"], bucket["last_timestamp"]) == (at(0), at(110))
+
+def rollup_history(client, vehicle_id: str, start: datetime, end: datetime) -> list:
+    response = client.get(f"/api/gps/vehicle/{vehicle_id}/history", params={
+        "resolution": "1m", "start_date": start.isoformat(), "end_date": end.isoformat(), "size": 1000
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["items"]
+
+def test_rollup_history_includes_a_fix_read_right_after_ingest(client, db, new_vehicle):
+    vehicle_id = new_vehicle()
+    start = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(minutes=30)
+    end = start + timedelta(minutes=40)
+    ingest(client, vehicle_id, [(start + timedelta(seconds=15 * step), 13.7 + step * 1e-4, 100.5, 40.0)
+                                for step in range(40)])
+
+    # Before the rollup job has run, every bucket is summarized from gps_logs
+    before = rollup_history(client, vehicle_id, start, end)
+    assert sum(bucket["fix_count"] for bucket in before) == 40
+
+    # The job only advances its watermark to ids seen by its previous run
+    gps_rollup_job.roll_up(db)
+    gps_rollup_job.roll_up(db)
+    assert rolled_up_until(db) >= start + timedelta(seconds=15 * 39)
+    assert rollup_history(client, vehicle_id, start, end) == before
+
+    # A fix ingested after the rollup is visible in the next read, not after the next job run
+    ingest(client, vehicle_id, [(start + timedelta(minutes=12), 13.71, 100.5, 60.0)])
+    after = rollup_history(client, vehicle_id, start, end)
+    assert sum(bucket["fix_count"] for bucket in after) == 41
+    assert after[0]["last_timestamp"].startswith((start + timedelta(minutes=12)).isoformat())
+
+def test_rolled_up_until_stays_before_a_late_fix_past_the_watermark(client, db, new_vehicle):
+    vehicle_id = new_vehicle()
+    now = datetime.utcnow().replace(microsecond=0)
+    ingest(client, vehicle_id, [(now - timedelta(minutes=10 - step), 13.7, 100.5, 30.0) for step in range(5)])
+    gps_rollup_job.roll_up(db)
+    gps_rollup_job.roll_up(db)
+    assert rolled_up_until(db) >= now - timedelta(minutes=6)
+
+    # A device uploads its backlog: the newest id carries the oldest timestamp
+    late = now - timedelta(hours=3)
+    ingest(client, vehicle_id, [(late, 13.7, 100.5, 30.0)])
+    gps_rollup_job.roll_up(db)  # reads the late fix, but the watermark stays below it
+    assert rolled_up_until(db) <= late
+    gps_rollup_job.roll_up(db)
+    assert rolled_up_until(db) >= now - timedelta(minutes=6)
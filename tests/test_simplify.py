@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from services.simplify import (
+    douglas_peucker, encode_polyline, project, segment_distance, stop_boundaries, visvalingam_whyatt
+)
+from conftest import ingest
+
+def wiggly_track(n: int = 400, seed: int = 21):
+    rng = np.random.default_rng(seed)
+    lat = 13.7 + np.cumsum(rng.normal(0, 1e-4, n))
+    lon = 100.5 + np.cumsum(rng.normal(1e-4, 1e-4, n))
+    return project(lat, lon)
+
+def test_douglas_peucker_keeps_endpoints_and_stays_within_tolerance():
+    x, y = wiggly_track()
+    tolerance = 15.0
+    kept = douglas_peucker(x, y, tolerance)
+
+    assert kept[0] == 0 and kept[-1] == len(x) - 1
+    assert 2 < len(kept) < len(x)
+    for start, end in zip(kept[:-1], kept[1:]):
+        if end - start > 1:
+            distance = segment_distance(x[start + 1:end], y[start + 1:end], x[start], y[start], x[end], y[end])
+            assert distance.max() <= tolerance
+
+def test_douglas_peucker_keeps_flagged_points_on_a_straight_line():
+    x, y = np.arange(50, dtype=float), np.zeros(50)
+    keep = np.zeros(50, dtype=bool)
+    keep[[17, 18, 31]] = True
+    assert douglas_peucker(x, y, 1.0).tolist() == [0, 49]
+    assert douglas_peucker(x, y, 1.0, keep).tolist() == [0, 17, 18, 31, 49]
+
+def test_visvalingam_whyatt_meets_the_budget_and_keeps_flagged_points():
+    x, y = wiggly_track()
+    kept = visvalingam_whyatt(x, y, 40)
+    assert len(kept) <= 40
+    assert kept[0] == 0 and kept[-1] == len(x) - 1
+    assert np.all(np.diff(kept) > 0)
+
+    keep = np.zeros(len(x), dtype=bool)
+    keep[[100, 101, 250]] = True
+    kept = visvalingam_whyatt(x, y, 40, keep)
+    assert {0, 100, 101, 250, len(x) - 1} <= set(kept.tolist())
+    assert len(kept) <= 40
+
+def test_visvalingam_whyatt_returns_more_than_the_budget_when_locked_points_demand_it():
+    x, y = wiggly_track(30)
+    keep = np.ones(30, dtype=bool)
+    assert len(visvalingam_whyatt(x, y, 5, keep)) == 30
+
+def test_short_tracks_are_returned_whole():
+    assert douglas_peucker(np.array([0.0, 1.0]), np.array([0.0, 5.0]), 0.1).tolist() == [0, 1]
+    assert visvalingam_whyatt(np.array([0.0, 1.0, 2.0]), np.array([0.0, 5.0, 0.0]), 10).tolist() == [0, 1, 2]
+
+def test_stop_boundaries_marks_first_and_last_idle_point():
+    idle = np.array([False, True, True, True, False, True, False, True, True])
+    assert np.flatnonzero(stop_boundaries(idle)).tolist() == [1, 3, 5, 7, 8]
+
+def test_encode_polyline_reference_example():
+    # Example from the encoded polyline format documentation
+    lat = np.array([38.5, 40.7, 43.252])
+    lon = np.array([-120.2, -120.95, -126.453])
+    assert encode_polyline(lat, lon) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+def test_track_keeps_a_short_stop_under_a_tight_point_budget(client, new_vehicle):
+    vehicle_id = new_vehicle()
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(hours=2)
+    fixes, lat = [], 13.7
+    for step in range(60):  # 30 minutes of driving
+        lat += 2e-4
+        fixes.append((start + timedelta(seconds=30 * step), lat, 100.5 + step * 1e-4, 40.0))
+    stopped_at = fixes[-1][0]
+    for step in range(1, 15):  # a seven minute stop
+        fixes.append((stopped_at + timedelta(seconds=30 * step), lat, fixes[59][2], 0.0))
+    resumed_at = fixes[-1][0]
+    for step in range(1, 60):
+        fixes.append((resumed_at + timedelta(seconds=30 * step), lat - step * 2e-4, 100.506, 40.0))
+    ingest(client, vehicle_id, fixes)
+
+    params = {"start_date": start.isoformat(), "end_date": fixes[-1][0].isoformat()}
+    history = client.get(f"/api/gps/vehicle/{vehicle_id}/history", params={**params, "size": 1000}).json()
+    idle_times = sorted(item["timestamp"] for item in history["items"] if item["is_idle"])
+    assert idle_times, "the stop should be long enough to be marked idle"
+
+    track = client.get(f"/api/gps/vehicle/{vehicle_id}/history",
+                       params={**params, "format": "track", "max_points": 10}).json()
+    assert track["resolution"] == "raw"
+    assert track["source_points"] == len(fixes)
+    timestamps = [point["timestamp"] for point in track["points"]]
+    assert timestamps[0] == start.isoformat() and timestamps[-1] == fixes[-1][0].isoformat()
+    assert {idle_times[0], idle_times[-1]} <= set(timestamps)
@@ -0,0 +1,50 @@
+import random
+
+from services.spatial_index import STRTree
+
+def random_boxes(count: int, seed: int = 6):
+    rng = random.Random(seed)
+    boxes = []
+    for index in range(count):
+        lat, lon = rng.uniform(13.5, 14.0), rng.uniform(100.3, 100.8)
+        boxes.append(((lat, lon, lat + rng.uniform(0, 0.05), lon + rng.uniform(0, 0.05)), index))
+    return boxes
+
+def brute_point(boxes, lat, lon):
+    return sorted(payload for box, payload in boxes if box[0] <= lat <= box[2] and box[1] <= lon <= box[3])
+
+def brute_bbox(boxes, query):
+    return sorted(
+        payload for box, payload in boxes
+        if not (box[2] < query[0] or box[0] > query[2] or box[3] < query[1] or box[1] > query[3])
+    )
+
+def test_point_queries_match_brute_force():
+    boxes = random_boxes(500)
+    tree = STRTree(boxes, node_capacity=8)
+    rng = random.Random(1)
+    assert tree.height > 1
+    for _ in range(300):
+        lat, lon = rng.uniform(13.45, 14.1), rng.uniform(100.25, 100.9)
+        assert sorted(tree.query_point(lat, lon)) == brute_point(boxes, lat, lon)
+
+def test_bbox_queries_match_brute_force():
+    boxes = random_boxes(500)
+    tree = STRTree(boxes)
+    rng = random.Random(2)
+    for _ in range(100):
+        lat, lon = rng.uniform(13.45, 14.1), rng.uniform(100.25, 100.9)
+        query = (lat, lon, lat + rng.uniform(0, 0.2), lon + rng.uniform(0, 0.2))
+        assert sorted(tree.query_bbox(query)) == brute_bbox(boxes, query)
+
+def test_box_edges_are_inclusive():
+    tree = STRTree([((1.0, 2.0, 3.0, 4.0), "a")])
+    assert tree.query_point(1.0, 2.0) == ["a"]
+    assert tree.query_point(3.0, 4.0) == ["a"]
+    assert tree.query_point(3.0001, 4.0) == []
+
+def test_empty_tree():
+    tree = STRTree([])
+    assert len(tree) == 0
+    assert tree.query_point(0.0, 0.0) == []
+    assert tree.query_bbox((0.0, 0.0, 1.0, 1.0)) == []
@@ -0,0 +1,149 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from database.models import GPSLog, Vehicle
+from services.track_store import (
+    TrackStore, decode_block, decode_varints, encode_block, encode_varints, to_micros
+)
+from conftest import ingest
+
+INT64 = np.iinfo(np.int64)
+
+@pytest.mark.parametrize("values", [
+    [],
+    [0],
+    [1, -1, 63, -64, 64, -65, 127, 128, -128, 300, -300],
+    [INT64.max, INT64.min, INT64.max - 1, INT64.min + 1],
+    [2 ** k for k in range(62)] + [-(2 ** k) for k in range(62)],
+])
+def test_varint_round_trip(values):
+    values = np.array(values, dtype=np.int64)
+    encoded = np.frombuffer(encode_varints(values), dtype=np.uint8)
+    assert decode_varints(encoded).tolist() == values.tolist()
+
+def test_varints_are_zigzag_and_seven_bits_a_byte():
+    assert encode_varints(np.array([0, -1, 1, -2, 2], dtype=np.int64)) == bytes([0, 1, 2, 3, 4])
+    assert encode_varints(np.array([64], dtype=np.int64)) == bytes([0x80, 0x01])
+    assert len(encode_varints(np.array([INT64.max], dtype=np.int64))) == 10
+
+def test_random_varints_round_trip():
+    rng = np.random.default_rng(25)
+    values = rng.integers(INT64.min, INT64.max, 5000, dtype=np.int64, endpoint=True)
+    values[::7] = rng.integers(-200, 200, len(values[::7]))
+    encoded = np.frombuffer(encode_varints(values), dtype=np.uint8)
+    assert np.array_equal(decode_varints(encoded), values)
+
+def fixes(start: datetime, count: int, first_id: int = 1, step: int = 5) -> list:
+    return [
+        (first_id + index, start + timedelta(seconds=step * index), 13.7 + index * 1.23e-5,
+         100.5 - index * 2.5e-6, None if index % 5 == 0 else 40.0 + index / 100,
+         None if index % 7 == 0 else float(index % 360), index % 3 == 0)
+        for index in range(count)
+    ]
+
+def test_block_round_trip_within_fixed_point_precision():
+    original = fixes(datetime(2026, 4, 1, 9, 0, 0, 250000), 200)
+    columns = decode_block(np.frombuffer(encode_block(original), dtype=np.uint8))
+
+    assert columns.id.tolist() == [fix[0] for fix in original]
+    assert columns.timestamp.tolist() == [to_micros(fix[1]) for fix in original]
+    assert np.allclose(columns.latitude, [fix[2] for fix in original], atol=5e-8)
+    assert np.allclose(columns.longitude, [fix[3] for fix in original], atol=5e-8)
+    speeds = [np.nan if fix[4] is None else fix[4] for fix in original]
+    headings = [np.nan if fix[5] is None else fix[5] for fix in original]
+    assert np.allclose(columns.speed, speeds, atol=5e-3, equal_nan=True)
+    assert np.allclose(columns.heading, headings, atol=5e-3, equal_nan=True)
+    assert columns.is_idle.tolist() == [fix[6] for fix in original]
+
+def test_store_reads_ranges_across_hours_and_days(tmp_path):
+    store = TrackStore(str(tmp_path))
+    start = datetime(2026, 4, 1, 22, 30)
+    original = fixes(start, 1000, step=10)  # about 2.8 hours, over midnight
+    store.append([(fix[0], 7, *fix[1:]) for fix in original])
+
+    everything = store.read(7, start, start + timedelta(hours=3))
+    assert everything.id.tolist() == [fix[0] for fix in original]
+    rows = everything.rows()
+    assert rows[1][2] == original[1][1] and rows[0][3] is None
+
+    middle = store.read(7, start + timedelta(hours=1), start + timedelta(hours=2))
+    assert middle.id.tolist() == [fix[0] for fix in original if start + timedelta(hours=1) <= fix[1] <= start + timedelta(hours=2)]
+    assert store.read(7, start, start + timedelta(hours=3), max_id=100).id.tolist() == list(range(1, 101))
+    assert len(store.read(8, start, start + timedelta(hours=3)).id) == 0
+
+def test_rows_appended_twice_are_read_once(tmp_path):
+    store = TrackStore(str(tmp_path))
+    original = [(fix[0], 3, *fix[1:]) for fix in fixes(datetime(2026, 4, 2, 10), 50)]
+    store.append(original)
+    store.append(original[20:])
+    assert store.read(3, datetime(2026, 4, 2), datetime(2026, 4, 3)).id.tolist() == list(range(1, 51))
+
+def test_discard_drops_segments_without_creating_the_store(tmp_path):
+    store = TrackStore(str(tmp_path / "tracks"))
+    store.discard(1)
+    assert not (tmp_path / "tracks").exists()
+
+    store.append([(fix[0], 1, *fix[1:]) for fix in fixes(datetime(2026, 4, 2, 10), 5)])
+    store.discard(1)
+    assert len(store.read(1, datetime(2026, 4, 2), datetime(2026, 4, 3)).id) == 0
+
+def test_writer_lock_is_exclusive(tmp_path):
+    first, second = TrackStore(str(tmp_path)), TrackStore(str(tmp_path))
+    with first._locked(wait=False) as held:
+        assert held
+        with second._locked(wait=False) as also_held:
+            assert not also_held
+    with second._locked(wait=False) as held:
+        assert held
+
+def test_sync_copies_committed_gps_logs(tmp_path, client, db, new_vehicle):
+    vehicle_id = new_vehicle()
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+    ingest(client, vehicle_id, [(start + timedelta(seconds=10 * step), 13.7 + step * 1e-4, 100.5, 30.0)
+                                for step in range(30)])
+    vehicle_pk = db.query(Vehicle.id).filter(Vehicle.vehicle_id == vehicle_id).scalar()
+    logged = db.query(GPSLog.id, GPSLog.latitude).filter(GPSLog.vehicle_id == vehicle_pk).order_by(GPSLog.id).all()
+
+    store = TrackStore(str(tmp_path))
+    # The first run only notes the newest id; the next appends up to it
+    assert store.sync(db)["rows_appended"] == 0
+    store.sync(db)
+    assert store.watermark() >= logged[-1][0]
+
+    stored = store.read(vehicle_pk, start, start + timedelta(hours=1))
+    assert stored.id.tolist() == [log_id for log_id, _ in logged]
+    assert np.allclose(stored.latitude, [latitude for _, latitude in logged], atol=5e-8)
+
+def test_sync_appends_an_id_that_commits_late_within_the_commit_lag(tmp_path, client, db, new_vehicle, monkeypatch):
+    vehicle_id = new_vehicle()
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+    ingest(client, vehicle_id, [(start + timedelta(seconds=10 * step), 13.7, 100.5, 30.0) for step in range(3)])
+    vehicle_pk = db.query(Vehicle.id).filter(Vehicle.vehicle_id == vehicle_id).scalar()
+    first = db.query(GPSLog.id).order_by(GPSLog.id.desc()).limit(1).scalar()
+
+    def log(log_id: int, seconds: int):
+        db.add(GPSLog(id=log_id, vehicle_id=vehicle_pk, latitude=13.7, longitude=100.5,
+                      timestamp=start + timedelta(seconds=seconds)))
+        db.commit()
+
+    clock = [1000.0]
+    monkeypatch.setattr("services.track_store.time.monotonic", lambda: clock[0])
+    store = TrackStore(str(tmp_path), commit_lag=60)
+    store.sync(db)
+
+    # Another worker allocated first + 1 but commits it after first + 2
+    log(first + 2, 50)
+    clock[0] += 30
+    assert store.sync(db)["rows_appended"] == 0  # nothing is 60 seconds old yet
+    clock[0] += 40
+    store.sync(db)
+    assert store.watermark() == first
+
+    log(first + 1, 40)
+    clock[0] += 30
+    store.sync(db)
+    assert store.watermark() == first + 2
+    stored = store.read(vehicle_pk, start, start + timedelta(minutes=1)).id.tolist()
+    assert stored[-3:] == [first, first + 1, first + 2]
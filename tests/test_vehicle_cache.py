@@ -0,0 +1,30 @@
+from database.models import Vehicle
+from services.geofence import bump_version
+from services.vehicle_cache import VEHICLES_VERSION_KEY, VehicleRegistry
+
+def rename_driver(db, vehicle_id: str, name: str, bump: bool):
+    """Change a vehicle the way another worker would, behind this registry's back"""
+    db.query(Vehicle).filter(Vehicle.vehicle_id == vehicle_id).update({Vehicle.driver_name: name})
+    if bump:
+        bump_version(db, VEHICLES_VERSION_KEY)
+    db.commit()
+
+def test_registry_drops_entries_when_the_vehicles_version_moves(db, new_vehicle):
+    vehicle_id = new_vehicle()
+    registry = VehicleRegistry(version_check_interval=0)
+    assert registry.get(db, vehicle_id).driver_name is None
+
+    rename_driver(db, vehicle_id, "Somchai", bump=False)
+    assert registry.get(db, vehicle_id).driver_name is None  # still the cached row
+
+    rename_driver(db, vehicle_id, "Somying", bump=True)
+    assert registry.get(db, vehicle_id).driver_name == "Somying"
+    assert registry.get_many(db, [vehicle_id])[vehicle_id].driver_name == "Somying"
+
+def test_registry_reads_the_version_at_most_once_per_interval(db, new_vehicle):
+    vehicle_id = new_vehicle()
+    registry = VehicleRegistry(version_check_interval=3600)
+    registry.get(db, vehicle_id)
+
+    rename_driver(db, vehicle_id, "Somchai", bump=True)
+    assert registry.get(db, vehicle_id).driver_name is None